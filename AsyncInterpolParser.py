@@ -0,0 +1,526 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from CrawlLogging import get_logger
+from InterpolParser import InterpolParser
+from Storage import ImageFile, get_image_extension
+
+try:
+    import aiohttp
+except ImportError:  # Асинхронный движок необязателен, потоковый работает и без aiohttp.
+    aiohttp = None
+
+logger = get_logger('parser')
+
+
+class AsyncInterpolParser(InterpolParser):
+    """
+    Асинхронный вариант InterpolParser.
+    Выполняет те же этапы (список стран, разделение запросов, страницы поиска, данные и изображения разыскиваемых)
+    в одном цикле событий asyncio. Количество одновременных запросов ограничивается max_in_flight,
+    а не количеством потоков, поэтому его можно поднимать до сотен.
+    Файлы результатов записываются теми же методами, что и в потоковом варианте. Блокирующие вызовы
+    (запись в хранилище, кеш и архив ответов, справочник стран, файлы состояния) выполняются в потоках
+    через asyncio.to_thread, чтобы не останавливать цикл событий.
+    Изображения, как и в потоковом варианте, загружаются по частям во временные файлы (ImageFile),
+    а расширение определяется по содержимому и Content-Type.
+    """
+
+    def __init__(self, max_in_flight: int = 200, max_retries: int = 3, backoff_factor: float = 0.5, storage=None,
+                 rate_limiter=None, metrics=None, shard_index: int = 0, shard_count: int = 1, base_dir: str = None,
+                 cache=None, notice_types=None, notice_index=None, request_policy=None, archive=None):
+        if aiohttp is None:
+            raise ImportError('Для асинхронного движка необходим пакет aiohttp (pip install aiohttp).')
+        super().__init__(max_threads=1, max_retries=max_retries, backoff_factor=backoff_factor, storage=storage,
+                         rate_limiter=rate_limiter, metrics=metrics, shard_index=shard_index,
+                         shard_count=shard_count, base_dir=base_dir, cache=cache, notice_types=notice_types,
+                         notice_index=notice_index, request_policy=request_policy, archive=archive)
+        self.max_in_flight = max_in_flight
+        self._client = None
+        self._semaphore = None
+
+    def read_response_body(self, result, temp_dir: str = None):
+        """
+        Читает тело ответа, собранного из кеша или архива (get_cached_response, get_archived_response).
+        :param result: Объект requests.Response, при temp_dir - с потоковым телом.
+        :param temp_dir: Каталог для временного файла. None - тело читается в память.
+        :return: Байтовая строка ответа или ImageFile, если задан temp_dir.
+        """
+        if temp_dir is None:
+            return result.content
+        with result:
+            return self.write_temp_file(result.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE), temp_dir,
+                                        result.headers.get('Content-Type'))
+
+    def get_archived_body(self, url: str, stage: str = 'request', temp_dir: str = None):
+        """
+        :param url: URL адрес.
+        :param stage: Этап сбора для метрик.
+        :param temp_dir: Каталог для временного файла (см. read_response_body).
+        :return: Тело ответа из архива ответов или None, если ответа нет в архиве.
+        """
+        result = self.get_archived_response(url, temp_dir is not None, stage)
+        return self.read_response_body(result, temp_dir) if result is not None else None
+
+    def get_cached_body(self, entry: dict, temp_dir: str = None):
+        """
+        :param entry: Запись кеша (ResponseCache.get).
+        :param temp_dir: Каталог для временного файла (см. read_response_body).
+        :return: Кортеж (код ответа, заголовки, тело ответа) или None, если файла тела нет.
+        """
+        cached_result = self.get_cached_response(entry, temp_dir is not None)
+        if cached_result is None:
+            return None
+        return cached_result.status_code, cached_result.headers, self.read_response_body(cached_result, temp_dir)
+
+    async def async_write_temp_file(self, chunks, temp_dir: str, content_type: str = None):
+        """
+        Асинхронный вариант write_temp_file: части тела ответа записываются во временный файл в потоке,
+        не останавливая цикл событий.
+        :param chunks: Асинхронный итератор частей тела ответа (байты).
+        :param temp_dir: Каталог для временных файлов.
+        :param content_type: Заголовок Content-Type ответа.
+        :return: ImageFile. При ошибке временный файл удаляется, а исключение передается дальше.
+        """
+        temp_dir = await asyncio.to_thread(self.check_and_create_path, temp_dir)
+        file_descriptor, temp_path = await asyncio.to_thread(tempfile.mkstemp, dir=temp_dir, suffix='.part')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                digest = hashlib.sha256()
+                head = b''
+                async for chunk in chunks:
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    await asyncio.to_thread(file.write, chunk)
+                    self.metrics.inc('bytes', len(chunk), direction='in')
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return ImageFile(temp_path, digest.hexdigest(), get_image_extension(head, content_type))
+
+    async def async_get_response_body(self, url: str, stage: str = 'request', temp_dir: str = None):
+        """
+        Получает тело ответа по заданному url (см. async_fetch_response_body).
+        Архив ответов (archive) используется так же, как в Parser.get_response: при воспроизведении ответ
+        читается из архива без сети, при записи полученный ответ дописывается в архив.
+        :param url: URL адрес.
+        :param stage: Этап сбора.
+        :param temp_dir: Каталог для временного файла: тело (изображение) загружается в него по частям.
+        :return: Байтовая строка ответа (ImageFile, если задан temp_dir) или None, если обратиться к странице
+        не удалось.
+        """
+        if self.archive is not None and self.archive.is_replaying:
+            return await asyncio.to_thread(self.get_archived_body, url, stage, temp_dir)
+        response = await self.async_fetch_response_body(url, stage, temp_dir)
+        if response is None:
+            return None
+        status, response_headers, body = response
+        if self.archive is not None and self.archive.is_recording:
+            if isinstance(body, ImageFile):
+                await asyncio.to_thread(self.archive.put, url, stage, status, response_headers,
+                                        file_path=body.temp_path)
+            else:
+                await asyncio.to_thread(self.archive.put, url, stage, status, response_headers, body=body)
+        return body
+
+    async def async_fetch_response_body(self, url: str, stage: str = 'request', temp_dir: str = None):
+        """
+        Делает асинхронный запрос по заданному url.
+        Каждый запрос ждет разрешения общего ограничителя скорости (rate_limiter) и сообщает ему результат.
+        Повторяет запрос при ошибках соединения и кодах из RETRY_STATUS_CODES с экспоненциальной паузой.
+        Кеш ответов, таймауты, общий срок сбора и дублирование запросов (request_policy) используются так же,
+        как в Parser.get_response. Загрузка во временный файл (temp_dir) не дублируется, как и потоковая
+        загрузка в Parser.download_to_temp_file.
+        :param url: URL адрес.
+        :param stage: Этап сбора для метрик.
+        :param temp_dir: Каталог для временного файла (см. async_get_response_body).
+        :return: Кортеж (код ответа, заголовки, байтовая строка ответа или ImageFile) или None, если обратиться
+        к странице не удалось.
+        """
+        entry = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry, stage):
+            cached_response = await asyncio.to_thread(self.get_cached_body, entry, temp_dir)
+            if cached_response is not None:
+                self.metrics.inc('cache', stage=stage, result='hit')
+                return cached_response
+            entry = None
+        headers = self.cache.get_validators(entry) if self.cache is not None else None
+        attempt = 0
+        while True:
+            if self.request_policy.is_expired():
+                self.metrics.inc('deadline', stage=stage)
+                return None
+            try:
+                if temp_dir is None:
+                    status, response_headers, body = await self.async_send_hedged_request(url, headers, stage)
+                else:
+                    status, response_headers, body = await self.async_send_request(url, headers, stage, temp_dir)
+            except Exception as ex:
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                    attempt += 1
+                    continue
+                get_logger(stage).warning('request failed', extra={'url': url, 'stage': stage, 'error': str(ex)})
+                return None
+            if status == 304 and entry is not None:
+                self.cache.touch(url, response_headers)
+                cached_response = await asyncio.to_thread(self.get_cached_body, entry, temp_dir)
+                if cached_response is not None:
+                    self.metrics.inc('cache', stage=stage, result='revalidated')
+                    return cached_response
+                # Тело пропало из кеша: запрос без условных заголовков не считается повтором.
+                self.metrics.inc('cache', stage=stage, result='evicted')
+                entry, headers = None, None
+                continue
+            if status < 400:
+                if self.cache is not None:
+                    self.metrics.inc('cache', stage=stage, result='miss')
+                    if self.cache.should_store(stage, response_headers):
+                        if isinstance(body, ImageFile):
+                            await asyncio.to_thread(self.cache.put, url, stage, response_headers,
+                                                    file_path=body.temp_path)
+                        else:
+                            await asyncio.to_thread(self.cache.put, url, stage, response_headers, body=body)
+                return status, response_headers, body
+            if status in self.RETRY_STATUS_CODES and attempt < self.max_retries:
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                attempt += 1
+                continue
+            get_logger(stage).warning('bad response', extra={'url': url, 'stage': stage, 'status': status})
+            return None
+
+    async def async_send_request(self, url: str, headers: dict = None, stage: str = 'request', temp_dir: str = None,
+                                 started: asyncio.Event = None):
+        """
+        Выполняет один асинхронный запрос с таймаутами этапа (request_policy.get_timeout),
+        учитывая его в ограничителе скорости и метриках.
+        :param url: URL адрес.
+        :param headers: Дополнительные заголовки.
+        :param stage: Этап сбора.
+        :param temp_dir: Каталог для временного файла: успешный ответ загружается в него по частям
+        (async_write_temp_file).
+        :param started: Событие, отмечаемое после получения разрешения ограничителя скорости (отправки запроса).
+        :return: Кортеж (код ответа, заголовки, байтовая строка ответа или ImageFile). При ошибке соединения
+        или таймауте - исключение.
+        """
+        async with self._semaphore:
+            started_at = await self.rate_limiter.async_acquire()
+            if started is not None:
+                started.set()
+            self.metrics.inc('in_flight', stage=stage)
+            connect_timeout, read_timeout = self.request_policy.get_timeout(stage)
+            timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+            try:
+                async with self._client.get(url, headers=headers, timeout=timeout) as result:
+                    if temp_dir is not None and result.status < 300:
+                        body = await self.async_write_temp_file(result.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE),
+                                                                temp_dir, result.headers.get('Content-Type'))
+                    else:
+                        body = await result.read()
+                    status = result.status
+                    response_headers = result.headers
+            except asyncio.CancelledError:
+                # Отмененный дублирующий запрос не влияет на скорость и время ответа.
+                self.rate_limiter.cancel()
+                raise
+            except Exception:
+                self.rate_limiter.release(started_at)
+                self.metrics.inc('errors', stage=stage)
+                self.request_policy.observe(stage, time.monotonic() - started_at, False)
+                raise
+            finally:
+                self.metrics.inc('in_flight', -1, stage=stage)
+            self.rate_limiter.release(started_at, status, response_headers.get('Retry-After'))
+        self.metrics.inc('requests', stage=stage, status=status)
+        if not isinstance(body, ImageFile):
+            self.metrics.inc('bytes', len(body), direction='in')
+        self.metrics.inc('bytes', len(url), direction='out')
+        self.metrics.observe(stage, time.monotonic() - started_at)
+        self.log_response(url, stage, status, started_at)
+        self.request_policy.observe(stage, time.monotonic() - started_at, status not in self.RETRY_STATUS_CODES)
+        return status, response_headers, body
+
+    async def async_send_hedged_request(self, url: str, headers: dict = None, stage: str = 'request'):
+        """
+        Асинхронный вариант Parser.send_hedged_request: если ответ не получен за request_policy.get_hedge_delay(stage)
+        и бюджет дублирования не исчерпан, отправляется второй такой же запрос, используется первый ответ
+        без ошибки, а оставшийся запрос отменяется. Время ожидания отсчитывается от отправки основного запроса,
+        ожидание разрешения ограничителя скорости и свободного места (max_in_flight) не считается.
+        :param url: URL адрес.
+        :param headers: Дополнительные заголовки.
+        :param stage: Этап сбора.
+        :return: Кортеж (код ответа, заголовки, байтовая строка ответа), как у async_send_request.
+        """
+        delay = self.request_policy.get_hedge_delay(stage)
+        if delay is None:
+            return await self.async_send_request(url, headers, stage)
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self.async_send_request(url, headers, stage, started=started))
+        started_waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait([primary, started_waiter], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            started_waiter.cancel()
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done or not self.request_policy.try_hedge():
+            return await primary
+        self.metrics.inc('hedges', stage=stage, result='sent')
+        hedge = asyncio.ensure_future(self.async_send_request(url, headers, stage))
+        tasks = {primary: False, hedge: True}
+        last_task = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    is_hedge = tasks.pop(task)
+                    last_task = task
+                    if task.exception() is None and task.result()[0] not in self.RETRY_STATUS_CODES:
+                        if is_hedge:
+                            self.metrics.inc('hedges', stage=stage, result='won')
+                        return task.result()
+            return last_task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def async_get_json_page(self, url: str, stage: str = 'request'):
+        """
+        Делает асинхронный запрос по заданному url.
+        :param url: URL адрес.
+        :param stage: Этап сбора для метрик.
+        :return: JSON строка преобразованная в словарь.
+        """
+        try:
+            return self.decode_json(await self.async_get_response_body(url, stage))
+        except Exception as ex:
+            logger.warning('Полученный ответ не в формате json.', extra={'url': url, 'error': str(ex)})
+            return {}
+
+    async def async_separate_url_with_pages(self, country_url: str):
+        """
+        Асинхронный вариант separate_url_with_pages. Использует тот же генератор разделения partition_url.
+        Проверки одной страны идут последовательно, разные страны проверяются параллельно.
+        :param country_url: Ссылка общего запроса.
+        :return: Словарь {'Ссылка запроса': словарь страницы}.
+        """
+        partitioner = self.partition_url(country_url)
+        probe_number = 0
+        try:
+            url = next(partitioner)
+            while True:
+                probe_number += 1
+                url = partitioner.send(await self.async_get_json_page(url, 'probe'))
+        except StopIteration as stop:
+            self.add_partition_probe_count(country_url, probe_number)
+            return stop.value
+
+    async def async_get_all_prepared_country_urls(self):
+        """
+        Асинхронный вариант get_all_prepared_country_urls.
+        :return: Список строк.
+        """
+        file_name = self.PREPARED_URLS_FILE_NAME
+        if self.is_prepared_urls_fixed():
+            await asyncio.to_thread(self.load_prepared_listing)
+            return list(set(await asyncio.to_thread(self.read_data_from_csv_to_list,
+                                                    f'{self.BASE_DIR_FOR_DATA}{file_name}.csv')))
+        # Список стран запрашивается один раз и кешируется в файл, поэтому берется синхронным методом.
+        all_raw_urls = self.select_shard_urls(await asyncio.to_thread(self.get_all_country_urls))
+        all_prepared_country_urls = set()
+        failed_urls = []
+        results = await asyncio.gather(*[self.async_separate_url_with_pages(url) for url in all_raw_urls],
+                                       return_exceptions=True)
+        for country_url, pages in zip(all_raw_urls, results):
+            if isinstance(pages, Exception):
+                get_logger('partition').error('failed', extra={'url': country_url, 'stage': 'country',
+                                                               'error': str(pages)})
+                failed_urls.append(country_url)
+                continue
+            for url, page in pages.items():
+                all_prepared_country_urls.add(url)
+                if page is not None:
+                    self.prepared_rednotice_listing[url] = self.get_rednotice_listing(page)
+        await asyncio.to_thread(self.save_partition_hints)
+        await asyncio.to_thread(self.save_partition_plan)
+        logger.info('Проверочных запросов: %s', sum(self.partition_probe_counts.values()))
+        self.check_failed_countries(failed_urls)
+        await asyncio.to_thread(self.write_prepared_urls, all_prepared_country_urls)
+        return list(all_prepared_country_urls)
+
+    async def async_get_full_page(self, page_url: str):
+        """
+        Асинхронный вариант get_full_page.
+        :param page_url: Ссылка на конкретный запрос.
+        :return: Словарь с данными страницы.
+        """
+        return await self.async_get_json_page(self.get_probe_url(page_url), 'listing')
+
+    async def async_get_all_rednotice_urls(self):
+        """
+        Асинхронный вариант get_all_rednotice_urls.
+        :return: Список строк.
+        """
+        file_name = 'all_collected_rednotice_urls'
+        if os.path.exists(f'{self.BASE_DIR_FOR_DATA}{file_name}.csv'):
+            return list(set(await asyncio.to_thread(self.read_data_from_csv_to_list,
+                                                    f'{self.BASE_DIR_FOR_DATA}{file_name}.csv')))
+        all_rednotice_urls = set(await self.async_get_all_rednotice_listing())
+        await asyncio.to_thread(self.write_data_into_csv, self.BASE_DIR_FOR_DATA, file_name, all_rednotice_urls)
+        return list(all_rednotice_urls)
+
+    async def async_get_all_rednotice_listing(self):
+        """
+        Асинхронный вариант get_all_rednotice_listing.
+        :return: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        """
+        country_urls = await self.async_get_all_prepared_country_urls()
+        all_rednotice_listing = {}
+        for url in country_urls:
+            all_rednotice_listing.update(self.prepared_rednotice_listing.get(url, {}))
+        not_fetched_urls = [url for url in country_urls if url not in self.prepared_rednotice_listing]
+        for page in await asyncio.gather(*[self.async_get_full_page(url) for url in not_fetched_urls]):
+            all_rednotice_listing.update(self.get_rednotice_listing(page))
+        return all_rednotice_listing
+
+    async def async_get_images_links_by_url(self, base_images_link: str):
+        """
+        Асинхронный вариант get_images_links_by_url.
+        :param base_images_link: Ссылка на страницу изображений.
+        :return: Список строк.
+        """
+        images_links = await self.async_get_json_page(base_images_link, 'image_index')
+        if '_embedded' not in images_links:
+            raise ValueError(f'Страница изображений не получена - {base_images_link}')
+        return [link['_links']['self']['href'] for link in images_links['_embedded']['images']]
+
+    async def async_save_rednotice_images(self, image_urls: list, rednotice_clean_data: dict,
+                                          overwrite: bool = False, notice_type: str = InterpolParser.NOTICE_TYPE_RED):
+        """
+        Асинхронный вариант save_rednotice_images. Изображения одного разыскиваемого загружаются параллельно
+        по частям во временные файлы и передаются в хранилище (store_rednotice_images) в потоке.
+        Если часть изображений загрузить не удалось, остальные сохраняются и выбрасывается ValueError.
+        :param image_urls: Ссылки на изображения.
+        :param rednotice_clean_data: Подготовленные данные о разыскиваемом.
+        :param overwrite: Перезаписать уже существующие изображения.
+        :param notice_type: Тип объявления из NOTICE_TYPES.
+        :return: Список строк.
+        """
+        temp_dir = f'{self.BASE_DIR_FOR_DATA}{self.IMAGE_TEMP_DIR_NAME}'
+        image_files = await asyncio.gather(*[self.async_get_response_body(url, 'image', temp_dir)
+                                             for url in image_urls])
+        return await asyncio.to_thread(self.store_rednotice_images, image_urls, image_files, rednotice_clean_data,
+                                       overwrite, notice_type)
+
+    async def async_get_rednotice_data(self, rednotice_url: str, overwrite: bool = False):
+        """
+        Асинхронный вариант get_rednotice_data. Данные записываются до загрузки изображений,
+        ошибка загрузки изображений передается вызывающему.
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param overwrite: Перезаписать уже существующие файлы.
+        :return: Словарь данных.
+        """
+        detail_logger = get_logger('detail')
+        if detail_logger.isEnabledFor(logging.DEBUG):
+            detail_logger.debug('notice', extra={'url': rednotice_url, 'stage': 'detail'})
+        red_notice_data = await self.async_get_json_page(rednotice_url, 'detail')
+        if not red_notice_data.get('entity_id'):
+            return red_notice_data
+        base_images_link = red_notice_data.get('_links', {}).get('images', {}).get('href')
+        clean_rednotice_data = self.get_rednotice_clean_data(red_notice_data)
+        notice_type = self.get_notice_type(rednotice_url)
+        await asyncio.to_thread(self.write_data_into_file, clean_rednotice_data, overwrite, notice_type)
+        if base_images_link:
+            images_urls = await self.async_get_images_links_by_url(base_images_link)
+            await self.async_save_rednotice_images(images_urls, clean_rednotice_data, overwrite, notice_type)
+        return red_notice_data
+
+    async def async_get_incremental_rednotice_data(self, rednotice_url: str, listing_item: dict):
+        """
+        Асинхронный вариант get_incremental_rednotice_data.
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param listing_item: Словарь разыскиваемого со страницы поиска.
+        :return: Словарь данных.
+        """
+        red_notice_data = await self.async_get_rednotice_data(rednotice_url, overwrite=True)
+        if red_notice_data and red_notice_data.get('entity_id'):
+            notice_type = self.get_notice_type(rednotice_url)
+            file_path = await asyncio.to_thread(self.get_path, red_notice_data, notice_type)
+            self.get_manifest(notice_type).mark_fetched(rednotice_url, listing_item, file_path)
+        return red_notice_data
+
+    def check_stored_rednotices(self, fetched: list, incremental: bool = False):
+        """
+        Проверяет запись собранных разыскиваемых в хранилище (после flush_storage), как commit_rednotices
+        в потоковом варианте. Разыскиваемые, данные или изображения которых сохранить не удалось, записываются
+        в журнал, а при инкрементальном сборе их отпечатки в манифестах сбрасываются, чтобы они собрались заново.
+        :param fetched: Список троек (ссылка на разыскиваемого, словарь со страницы поиска, путь к каталогу данных).
+        :param incremental: Инкрементальный сбор: манифесты обновляются и сохраняются.
+        :return: None.
+        """
+        failures = self.pop_storage_failures([file_path for _, _, file_path in fetched])
+        for rednotice_url, listing_item, file_path in fetched:
+            if file_path in failures:
+                get_logger('detail').error('failed', extra={'url': rednotice_url, 'stage': 'write',
+                                                            'error': str(failures[file_path])})
+                if incremental:
+                    self.get_manifest(self.get_notice_type(rednotice_url)).mark_failed(rednotice_url, listing_item)
+        if incremental:
+            self.save_manifests()
+
+    async def async_get_all_rednotice_data(self, incremental: bool = False):
+        """
+        Прогонка всех ссылок через асинхронную функцию получения данных.
+        Разыскиваемые обрабатываются max_in_flight обработчиками из общей очереди,
+        чтобы не создавать задачу на каждую из десятков тысяч ссылок сразу.
+        :param incremental: Инкрементальный сбор (см. InterpolParser.get_all_rednotice_data).
+        :return: None.
+        """
+        self.request_policy.start()
+        self.listing_complete = True
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_in_flight)
+        async with aiohttp.ClientSession(headers=self.HEADERS, connector=connector) as self._client:
+            if incremental:
+                all_rednotice_listing = await self.async_get_all_rednotice_listing()
+                all_rednotice_urls = await asyncio.to_thread(self.get_incremental_rednotice_urls,
+                                                             all_rednotice_listing)
+            else:
+                all_rednotice_urls = await self.async_get_all_rednotice_urls()
+            queue = asyncio.Queue()
+            for url in all_rednotice_urls:
+                queue.put_nowait(url)
+            fetched = []
+
+            async def worker():
+                while not queue.empty():
+                    url = queue.get_nowait()
+                    try:
+                        if incremental:
+                            listing_item = all_rednotice_listing[url]
+                            red_notice_data = await self.async_get_incremental_rednotice_data(url, listing_item)
+                        else:
+                            listing_item = None
+                            red_notice_data = await self.async_get_rednotice_data(url,
+                                                                                  overwrite=not self.use_saved_state)
+                        if red_notice_data.get('entity_id'):
+                            fetched.append((url, listing_item, await asyncio.to_thread(
+                                self.get_path, red_notice_data, self.get_notice_type(url))))
+                    except Exception as ex:
+                        get_logger('detail').error('failed', extra={'url': url, 'stage': 'notice', 'error': str(ex)})
+
+            await asyncio.gather(*[worker() for _ in range(min(self.max_in_flight, len(all_rednotice_urls)) or 1)])
+        self._client = None
+        await asyncio.to_thread(self.flush_storage)
+        await asyncio.to_thread(self.check_stored_rednotices, fetched, incremental)
+
+    def get_all_rednotice_data(self, incremental: bool = False):
+        """
+        Запускает асинхронный сбор всех данных в новом цикле событий.
+        :param incremental: Инкрементальный сбор (см. InterpolParser.get_all_rednotice_data).
+        :return: None.
+        """
+        asyncio.run(self.async_get_all_rednotice_data(incremental))
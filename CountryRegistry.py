@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from CrawlLogging import get_logger
+
+logger = get_logger('country')
+
+
+class CountryRegistry:
+    """
+    Общий для процесса справочник стран.
+    Загружается один раз (из файла или с сайта), дальше отдает название по коду и код по названию за O(1).
+    Справочник считается устаревшим через ttl секунд после получения с сайта и тогда запрашивается заново.
+    Функцию получения справочника с сайта (loader) передает каждый вызов: справочник общий для всех сборщиков
+    процесса и не должен запрашивать сайт через соединения, ограничитель скорости или архив одного из них,
+    который к тому времени может быть уже закрыт.
+    Если справочник не удалось получить с сайта и сохраненного справочника нет, возникает исключение
+    ValueError: сбор без стран не собрал бы ничего, но выглядел бы успешным.
+    """
+    DEFAULT_TTL = 30 * 24 * 60 * 60
+    RETRY_INTERVAL = 60
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    def __init__(self, file_path: str, ttl: float = DEFAULT_TTL):
+        """
+        :param file_path: Путь к json файлу справочника {'Название страны':'Код страны'}.
+        :param ttl: Время жизни справочника в секундах. None - справочник не устаревает.
+        """
+        self.file_path = file_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._codes_by_name = None
+        self._names_by_code = None
+        self._fetched_at = 0
+
+    @classmethod
+    def get_registry(cls, file_path: str, ttl: float = DEFAULT_TTL):
+        """
+        Возвращает общий справочник для указанного файла, создавая его при первом обращении.
+        :param file_path: Путь к json файлу справочника.
+        :param ttl: Время жизни справочника в секундах.
+        :return: Объект CountryRegistry.
+        """
+        key = os.path.abspath(file_path)
+        with cls._registries_lock:
+            registry = cls._registries.get(key)
+            if registry is None:
+                registry = cls(file_path, ttl)
+                cls._registries[key] = registry
+            return registry
+
+    def is_expired(self):
+        """
+        Проверяет, не устарел ли загруженный справочник.
+        :return: True, если справочник необходимо обновить.
+        """
+        return self.ttl is not None and time.time() - self._fetched_at > self.ttl
+
+    def _set_codes(self, country_codes: dict, fetched_at: float):
+        self._codes_by_name = dict(country_codes)
+        self._names_by_code = {code: name for name, code in country_codes.items()}
+        self._fetched_at = fetched_at
+
+    def _load_from_file(self):
+        if not os.path.exists(self.file_path):
+            return False
+        try:
+            with open(self.file_path, encoding='utf-8') as countries:
+                self._set_codes(json.load(countries), os.path.getmtime(self.file_path))
+            return True
+        except Exception as ex:
+            logger.warning('CountryRegistry - %s - %s', self.file_path, ex)
+            return False
+
+    def _load_from_site(self, loader):
+        country_codes = loader()
+        if not country_codes:
+            return False
+        self._set_codes(country_codes, time.time())
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(self.file_path, 'w', encoding='utf-8') as file:
+            json.dump(country_codes, file, indent=4, ensure_ascii=False)
+        return True
+
+    def _ensure_loaded(self, loader):
+        if self._codes_by_name is not None and not self.is_expired():
+            return
+        with self._lock:
+            if self._codes_by_name is None:
+                self._load_from_file()
+            if self._codes_by_name is None or self.is_expired():
+                try:
+                    loaded = self._load_from_site(loader)
+                except Exception as ex:
+                    logger.warning('CountryRegistry - не удалось обновить справочник стран - %s', ex)
+                    loaded = False
+                if not loaded:
+                    if not self._codes_by_name:
+                        raise ValueError(f'Справочник стран пуст: страны не получены с сайта, '
+                                         f'и сохраненного справочника нет ({self.file_path}).')
+                    # Устаревший справочник лучше, чем никакой. Следующая попытка - через RETRY_INTERVAL секунд,
+                    # а не при каждом обращении.
+                    retry_fetched_at = time.time() - (self.ttl or 0) + self.RETRY_INTERVAL
+                    self._set_codes(self._codes_by_name, retry_fetched_at)
+
+    def refresh(self, loader):
+        """
+        Принудительно запрашивает справочник с сайта и перезаписывает файл.
+        :param loader: Функция без аргументов, получающая справочник с сайта.
+        :return: True, если справочник обновлен.
+        """
+        with self._lock:
+            return self._load_from_site(loader)
+
+    def get_country_codes(self, loader):
+        """
+        :param loader: Функция без аргументов, получающая справочник с сайта, если он еще не загружен или устарел.
+        :return: Словарь со всеми доступными для выбора странами. {'Название страны':'Код страны'}
+        Если справочник получить не удалось - исключение ValueError.
+        """
+        self._ensure_loaded(loader)
+        return self._codes_by_name
+
+    def get_country_name(self, country_code: str, loader):
+        """
+        :param country_code: Код страны.
+        :param loader: Функция получения справочника с сайта (см. get_country_codes).
+        :return: Строка - название страны, или None, если код неизвестен.
+        """
+        self._ensure_loaded(loader)
+        return self._names_by_code.get(country_code)
+
+    def get_country_code(self, country_name: str, loader):
+        """
+        :param country_name: Название страны.
+        :param loader: Функция получения справочника с сайта (см. get_country_codes).
+        :return: Строка - код страны, или None, если название неизвестно.
+        """
+        self._ensure_loaded(loader)
+        return self._codes_by_name.get(country_name)
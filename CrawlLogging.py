@@ -0,0 +1,96 @@
+import atexit
+import datetime
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+LOGGER_NAME = 'interpol'
+# Стандартные поля LogRecord. Все остальные поля записи (переданные через extra) попадают в json строку.
+RECORD_FIELDS = set(vars(logging.LogRecord('', logging.INFO, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_logger(stage: str):
+    """
+    Логгер этапа сбора ('interpol.<этап>'), например get_logger('detail').
+    Логгеры кешируются, поэтому функцию можно вызывать в частых местах без блокировки модуля logging.
+    Пока логирование не настроено (setup_logging), сообщения от WARNING выводятся в stderr стандартным образом.
+    :param stage: Название этапа.
+    :return: Объект logging.Logger.
+    """
+    return logging.getLogger(f'{LOGGER_NAME}.{stage}')
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Форматирует запись одной json строкой: время, уровень, логгер, сообщение и поля из extra
+    (url, stage, status, duration, error и т.п.), чтобы логи можно было разбирать и агрегировать.
+    """
+
+    def format(self, record: logging.LogRecord):
+        line = {'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in RECORD_FIELDS and not key.startswith('_'):
+                line[key] = value
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=logging.INFO, file_path: str = None, stream=sys.stderr, stage_levels: dict = None):
+    """
+    Настраивает логирование сбора: потоки сбора только кладут запись в очередь (QueueHandler),
+    а форматирование и вывод в терминал и файл выполняет отдельный поток (QueueListener),
+    поэтому запись в лог не ждет терминал. Повторный вызов заменяет прежние настройки.
+    :param level: Уровень логгера 'interpol' (logging.DEBUG или 'DEBUG' - строка на каждый запрос и проверку).
+    :param file_path: Файл для json строк. None - без файла.
+    :param stream: Поток вывода json строк. None - без вывода.
+    :param stage_levels: Словарь {'Этап': уровень} для отдельных этапов, например {'detail': logging.WARNING}.
+    :return: Объект QueueListener.
+    """
+    global _listener
+    handlers = []
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    if file_path is not None:
+        handlers.append(logging.FileHandler(file_path, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(JsonLineFormatter())
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(LOGGER_NAME)
+    with _listener_lock:
+        stop_logging()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.setLevel(level)
+        logger.propagate = False
+        for stage, stage_level in (stage_levels or {}).items():
+            get_logger(stage).setLevel(stage_level)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """
+    Дожидается вывода всех записей из очереди и останавливает поток вывода.
+    :return: None.
+    """
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,101 @@
+import queue
+import threading
+from CrawlLogging import get_logger
+
+logger = get_logger('pipeline')
+
+
+class CrawlPipeline:
+    """
+    Потоковый конвейер этапов сбора, соединенных ограниченными очередями.
+    У каждого этапа свои потоки и своя очередь. Результаты этапа сразу передаются следующему,
+    поэтому этапы работают одновременно, а не по очереди.
+    Если очередь следующего этапа заполнена, передача ждет - быстрый этап не обгоняет медленный
+    и не копит в памяти все ссылки.
+    """
+    _STOP = object()
+
+    def __init__(self):
+        self._stages = []
+        self._stages_by_name = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, function, workers: int, max_queue_size: int = None):
+        """
+        Добавляет этап в конец конвейера.
+        :param name: Название этапа.
+        :param function: Функция обработки одного элемента. Возвращает список элементов для следующего этапа
+        (или None).
+        :param workers: Количество потоков этапа.
+        :param max_queue_size: Максимальное количество ожидающих элементов.
+        :return: None.
+        """
+        stage = {'name': name, 'function': function, 'workers': max(workers, 1),
+                 'queue': queue.Queue(max_queue_size or max(workers, 1) * 4),
+                 'threads': [], 'processed': 0, 'failed': 0}
+        self._stages.append(stage)
+        self._stages_by_name[name] = stage
+
+    def put(self, name: str, item):
+        """
+        Передает элемент этапу. Ждет, если очередь этапа заполнена.
+        :param name: Название этапа.
+        :param item: Элемент.
+        :return: None.
+        """
+        self._stages_by_name[name]['queue'].put(item)
+
+    def _run_stage(self, index: int):
+        stage = self._stages[index]
+        next_stage = self._stages[index + 1] if index + 1 < len(self._stages) else None
+        while True:
+            item = stage['queue'].get()
+            if item is self._STOP:
+                stage['queue'].task_done()
+                return
+            try:
+                results = stage['function'](item)
+                if results and next_stage is not None:
+                    for result in results:
+                        next_stage['queue'].put(result)
+                with self._lock:
+                    stage['processed'] += 1
+            except Exception as ex:
+                logger.error('CrawlPipeline - %s', ex, extra={'stage': stage['name'], 'error': str(ex)})
+                with self._lock:
+                    stage['failed'] += 1
+            finally:
+                stage['queue'].task_done()
+
+    def run(self, seeds: dict):
+        """
+        Запускает потоки всех этапов, передает начальные элементы и ждет, пока конвейер не опустеет.
+        Этапы завершаются по порядку: этап останавливается, когда предыдущий уже остановлен
+        и его собственная очередь обработана.
+        :param seeds: Словарь {'Название этапа': список начальных элементов}.
+        :return: Словарь {'Название этапа': {'processed': количество, 'failed': количество}}.
+        """
+        for index, stage in enumerate(self._stages):
+            for number in range(stage['workers']):
+                thread = threading.Thread(target=self._run_stage, args=(index,), daemon=True,
+                                          name=f"CrawlPipeline-{stage['name']}-{number}")
+                thread.start()
+                stage['threads'].append(thread)
+        for stage in self._stages:
+            for item in seeds.get(stage['name']) or []:
+                stage['queue'].put(item)
+        for stage in self._stages:
+            stage['queue'].join()
+            for _ in stage['threads']:
+                stage['queue'].put(self._STOP)
+            for thread in stage['threads']:
+                thread.join()
+        return self.get_stats()
+
+    def get_stats(self):
+        """
+        :return: Словарь {'Название этапа': {'processed': количество, 'failed': количество}}.
+        """
+        with self._lock:
+            return {stage['name']: {'processed': stage['processed'], 'failed': stage['failed']}
+                    for stage in self._stages}
@@ -0,0 +1,309 @@
+import argparse
+import collections
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from CrawlLogging import get_logger, setup_logging
+
+logger = get_logger('archive')
+
+
+class HttpArchive:
+    """
+    Архив ответов для записи сбора и его воспроизведения без сети.
+    В режиме записи (MODE_RECORD) каждый полученный сборщиком ответ (ссылка, код, заголовки, тело)
+    дописывается в конец файла данных (DATA_FILE_NAME), а его положение запоминается в индексе SQLite
+    (INDEX_FILE_NAME). Текстовые тела сжимаются zlib, изображения хранятся как есть.
+    Повторный ответ по той же ссылке дописывается заново и заменяет прежний в индексе.
+    Записи файла данных самодостаточны (заголовок HEADER, ссылка, служебные данные, тело), поэтому
+    индекс дописывается пачками по FLUSH_SIZE, а после аварийной остановки восстанавливается по хвосту файла.
+    В режиме воспроизведения (MODE_REPLAY) файл данных отображается в память (mmap), индекс целиком
+    держится в словаре, и ответы читаются без блокировок из любого количества потоков.
+    """
+    MODE_RECORD = 'record'
+    MODE_REPLAY = 'replay'
+    MODES = (MODE_RECORD, MODE_REPLAY)
+    DATA_FILE_NAME = 'responses.dat'
+    INDEX_FILE_NAME = 'index.sqlite3'
+    MAGIC = b'IHA1'
+    # Заголовок записи: метка, флаги, код ответа, длины ссылки, служебных данных (json) и тела.
+    HEADER = struct.Struct('<4sBHIII')
+    FLAG_COMPRESSED = 1
+    COMPRESS_LEVEL = 6
+    MIN_COMPRESS_SIZE = 256
+    FLUSH_SIZE = 1000
+    # Заголовки передачи не сохраняются: тело в архиве уже распаковано и читается целиком.
+    SKIPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive')
+
+    def __init__(self, directory: str, mode: str = MODE_REPLAY):
+        """
+        :param directory: Каталог архива.
+        :param mode: Режим: MODE_RECORD - запись ответов, MODE_REPLAY - воспроизведение.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'Неизвестный режим архива {mode}, допустимые: {", ".join(self.MODES)}.')
+        self.directory = directory
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._connection = None
+        self._entries = None
+        self._pending = []
+        self._file = None
+        self._mmap = None
+        self._end = 0
+
+    @property
+    def is_recording(self):
+        """
+        :return: True в режиме записи.
+        """
+        return self.mode == self.MODE_RECORD
+
+    @property
+    def is_replaying(self):
+        """
+        :return: True в режиме воспроизведения.
+        """
+        return self.mode == self.MODE_REPLAY
+
+    def get_data_path(self):
+        """
+        :return: Строка - путь к файлу данных.
+        """
+        return os.path.join(self.directory, self.DATA_FILE_NAME)
+
+    @property
+    def entries(self):
+        """
+        Индекс в памяти, загружается при первом обращении.
+        :return: Словарь {'Ссылка': (смещение записи, размер записи, код ответа, этап)}.
+        """
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._open()
+        return self._entries
+
+    def _open(self):
+        if self.is_replaying and not os.path.exists(self.get_data_path()):
+            raise FileNotFoundError(f'Архив ответов не найден - {self.get_data_path()}')
+        os.makedirs(self.directory, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(self.directory, self.INDEX_FILE_NAME),
+                                           check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, stage TEXT, status INTEGER NOT NULL, '
+            'offset INTEGER NOT NULL, size INTEGER NOT NULL)')
+        entries = {}
+        indexed_end = 0
+        for url, stage, status, offset, size in self._connection.execute(
+                'SELECT url, stage, status, offset, size FROM responses'):
+            entries[url] = (offset, size, status, stage)
+            indexed_end = max(indexed_end, offset + size)
+        data_path = self.get_data_path()
+        data_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        end = min(indexed_end, data_size)
+        if data_size > indexed_end:
+            # Индекс не успел записаться: недостающие записи восстанавливаются по файлу данных.
+            recovered, end = self.scan(data_path, indexed_end)
+            for url, stage, status, offset, size in recovered:
+                entries[url] = (offset, size, status, stage)
+            self._pending.extend(recovered)
+            logger.info('Восстановлено записей архива по файлу данных: %s', len(recovered))
+        self._entries = entries
+        self._end = end
+        if self.is_recording:
+            if data_size > end:
+                # Последняя запись оборвана при остановке, новые записи дописываются вместо нее.
+                with open(data_path, 'r+b') as file:
+                    file.truncate(end)
+            self._file = open(data_path, 'ab')
+        elif end:
+            self._file = open(data_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._flush()
+
+    @classmethod
+    def scan(cls, data_path: str, start: int = 0):
+        """
+        Читает заголовки записей файла данных, начиная с заданного смещения.
+        :param data_path: Путь к файлу данных.
+        :param start: Смещение первой записи.
+        :return: Пара (список кортежей (ссылка, этап, код ответа, смещение, размер), конец последней целой записи).
+        """
+        records = []
+        offset = start
+        data_size = os.path.getsize(data_path)
+        with open(data_path, 'rb') as file:
+            file.seek(start)
+            while True:
+                header = file.read(cls.HEADER.size)
+                if len(header) < cls.HEADER.size:
+                    break
+                magic, _, status, url_size, meta_size, body_size = cls.HEADER.unpack(header)
+                if magic != cls.MAGIC:
+                    logger.warning('Поврежденная запись архива', extra={'offset': offset})
+                    break
+                size = cls.HEADER.size + url_size + meta_size + body_size
+                if offset + size > data_size:
+                    break
+                url_and_meta = file.read(url_size + meta_size)
+                file.seek(body_size, os.SEEK_CUR)
+                meta = json.loads(url_and_meta[url_size:])
+                records.append((url_and_meta[:url_size].decode('utf-8'), meta.get('stage'), status, offset, size))
+                offset += size
+        return records, offset
+
+    def put(self, url: str, stage: str, status: int, headers, body: bytes = None, file_path: str = None):
+        """
+        Дописывает ответ в архив (только в режиме записи).
+        :param url: Ссылка.
+        :param stage: Этап сбора.
+        :param status: Код ответа.
+        :param headers: Заголовки ответа (словарь или объект заголовков requests/aiohttp).
+        :param body: Тело ответа.
+        :param file_path: Файл с телом ответа (загруженное по частям изображение), если body не передан.
+        :return: Смещение записи в файле данных или None, если архив не в режиме записи.
+        """
+        if not self.is_recording:
+            return None
+        if body is None:
+            with open(file_path, 'rb') as file:
+                body = file.read()
+        headers = {key: value for key, value in (headers or {}).items() if key.lower() not in self.SKIPPED_HEADERS}
+        flags = 0
+        content_type = headers.get('Content-Type') or headers.get('content-type') or ''
+        if len(body) >= self.MIN_COMPRESS_SIZE and not content_type.startswith('image/'):
+            body = zlib.compress(body, self.COMPRESS_LEVEL)
+            flags |= self.FLAG_COMPRESSED
+        url_bytes = url.encode('utf-8')
+        meta = json.dumps({'stage': stage, 'headers': headers, 'time': time.time()}, ensure_ascii=False,
+                          default=str).encode('utf-8')
+        record = self.HEADER.pack(self.MAGIC, flags, status, len(url_bytes), len(meta), len(body)) \
+            + url_bytes + meta + body
+        entries = self.entries
+        with self._lock:
+            offset = self._end
+            self._file.write(record)
+            self._end += len(record)
+            entries[url] = (offset, len(record), status, stage)
+            self._pending.append((url, stage, status, offset, len(record)))
+            if len(self._pending) >= self.FLUSH_SIZE:
+                self._flush()
+        return offset
+
+    def get(self, url: str):
+        """
+        Читает ответ из архива (в режиме воспроизведения). Блокировки не используются.
+        :param url: Ссылка.
+        :return: Словарь {'url', 'stage', 'status', 'headers', 'body'} или None, если ответа нет в архиве.
+        """
+        entry = self.entries.get(url)
+        if entry is None or self._mmap is None:
+            return None
+        offset, size, status, stage = entry
+        record = self._mmap[offset:offset + size]
+        _, flags, _, url_size, meta_size, _ = self.HEADER.unpack_from(record)
+        meta_start = self.HEADER.size + url_size
+        body = record[meta_start + meta_size:]
+        if flags & self.FLAG_COMPRESSED:
+            body = zlib.decompress(body)
+        meta = json.loads(record[meta_start:meta_start + meta_size])
+        return {'url': url, 'stage': stage, 'status': status, 'headers': meta.get('headers', {}), 'body': body}
+
+    def get_stats(self):
+        """
+        :return: Словарь {'responses', 'size', 'stages': {'Этап': количество}, 'statuses': {'Код': количество}}.
+        """
+        entries = self.entries
+        with self._lock:
+            values = list(entries.values())
+        return {'responses': len(values), 'size': self._end,
+                'stages': dict(collections.Counter(stage for _, _, _, stage in values)),
+                'statuses': dict(collections.Counter(status for _, _, status, _ in values))}
+
+    def _flush(self):
+        # Данные записываются на диск раньше индекса, чтобы индекс не указывал на недописанные записи.
+        if not self._pending:
+            return
+        if self.is_recording:
+            self._file.flush()
+        pending, self._pending = self._pending, []
+        self._connection.execute('BEGIN')
+        self._connection.executemany(
+            'INSERT OR REPLACE INTO responses (url, stage, status, offset, size) VALUES (?, ?, ?, ?, ?)', pending)
+        self._connection.execute('COMMIT')
+
+    def flush(self):
+        """
+        Записывает на диск данные и индекс.
+        :return: None.
+        """
+        with self._lock:
+            if self._entries is not None and self.is_recording:
+                self._flush()
+
+    def close(self):
+        """
+        Записывает индекс и закрывает файлы архива.
+        :return: None.
+        """
+        self.flush()
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._entries = None
+
+
+def main():
+    from InterpolParser import InterpolParser
+
+    arguments = argparse.ArgumentParser(description='Запись сбора в архив ответов и воспроизведение без сети.')
+    arguments.add_argument('mode', choices=[*HttpArchive.MODES, 'stats'],
+                           help='record - сбор с записью ответов, replay - сбор из архива, stats - состав архива.')
+    arguments.add_argument('--archive-dir', required=True, help='Каталог архива ответов.')
+    arguments.add_argument('--base-dir', default=None, help='Каталог данных (по умолчанию - BASE_DIR_FOR_DATA).')
+    arguments.add_argument('--threads', type=int, default=None,
+                           help='max_threads сборщика (по умолчанию 5 при записи и 32 при воспроизведении).')
+    arguments.add_argument('--notice-types', nargs='+', default=None, choices=list(InterpolParser.NOTICE_TYPES),
+                           help='Типы объявлений (по умолчанию - красные).')
+    arguments.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    options = arguments.parse_args()
+
+    setup_logging(options.log_level)
+    if options.mode == 'stats':
+        archive = HttpArchive(options.archive_dir, HttpArchive.MODE_REPLAY)
+        try:
+            print(json.dumps(archive.get_stats(), indent=4, ensure_ascii=False))
+        finally:
+            archive.close()
+        return
+    archive = HttpArchive(options.archive_dir, options.mode)
+    threads = options.threads or (32 if archive.is_replaying else 5)
+    # С архивом сборщик не использует кеш ответов и сохраненное состояние каталога данных (см. use_saved_state).
+    parser = InterpolParser(threads, base_dir=options.base_dir, notice_types=options.notice_types, archive=archive)
+    started_at = time.monotonic()
+    try:
+        parser.get_all_rednotice_data()
+        stats = archive.get_stats()
+    finally:
+        parser.close()
+    print(f'{options.mode}: {time.monotonic() - started_at:.1f} с, {json.dumps(stats, ensure_ascii=False)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import concurrent.futures
+import threading
+from CrawlLogging import get_logger
+
+logger = get_logger('image')
+
+
+class ImagePipeline:
+    """
+    Отдельный этап загрузки изображений со своим ограничением параллельности.
+    Обработчики данных о разыскиваемых только передают задачу и сразу переходят к следующему разыскиваемому.
+    Количество ожидающих задач ограничено max_pending: при заполнении submit ждет,
+    поэтому медленная загрузка изображений не копит в памяти неограниченную очередь.
+    Ошибки задач, переданных с ключом, запоминаются и забираются через pop_failures() после join().
+    """
+
+    def __init__(self, function, max_workers: int, max_pending: int = None):
+        """
+        :param function: Функция, выполняющая одну задачу загрузки.
+        :param max_workers: Количество потоков загрузки.
+        :param max_pending: Максимальное количество переданных и еще не выполненных задач.
+        """
+        self.function = function
+        self.failed_number = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix='ImagePipeline')
+        self._slots = threading.BoundedSemaphore(max_pending or max_workers * 4)
+        self._submitted_number = 0
+        self._pending_tickets = set()
+        self._failures = {}
+        self._condition = threading.Condition()
+
+    def submit(self, *args, key=None):
+        """
+        Передает задачу загрузки. Ждет, если ожидающих задач уже max_pending.
+        :param args: Аргументы функции загрузки.
+        :param key: Ключ задачи (например путь к каталогу разыскиваемого), под которым запоминается ошибка.
+        :return: None.
+        """
+        self._slots.acquire()
+        with self._condition:
+            self._submitted_number += 1
+            ticket = self._submitted_number
+            self._pending_tickets.add(ticket)
+        self._executor.submit(self._run, ticket, args, key)
+
+    def pop_failures(self, keys):
+        """
+        Забирает ошибки задач с указанными ключами. Вызывается после join(), чтобы учесть все переданное.
+        :param keys: Ключи задач.
+        :return: Словарь {ключ: исключение} только для неудачных задач.
+        """
+        with self._condition:
+            return {key: self._failures.pop(key) for key in set(keys) if key in self._failures}
+
+    def _run(self, ticket: int, args, key):
+        try:
+            self.function(*args)
+        except Exception as ex:
+            logger.warning('ImagePipeline - %s', ex, extra={'stage': 'image', 'error': str(ex)})
+            with self._condition:
+                self.failed_number += 1
+                if key is not None:
+                    self._failures[key] = ex
+        finally:
+            self._slots.release()
+            with self._condition:
+                self._pending_tickets.discard(ticket)
+                self._condition.notify_all()
+
+    def join(self):
+        """
+        Ждет выполнения всех задач, переданных до вызова.
+        Задачи, переданные другими потоками во время ожидания, не учитываются,
+        поэтому ожидание заканчивается и при непрерывном потоке новых задач.
+        :return: None.
+        """
+        with self._condition:
+            last_ticket = self._submitted_number
+            while self._pending_tickets and min(self._pending_tickets) <= last_ticket:
+                self._condition.wait()
+
+    def close(self):
+        """
+        Ждет выполнения всех задач и останавливает потоки загрузки.
+        :return: None.
+        """
+        self.join()
+        self._executor.shutdown()
@@ -1,29 +1,137 @@
 import concurrent.futures
+import hashlib
 import json
+import logging
 import os
-import re
-import operator
-import requests
+import threading
 from bs4 import BeautifulSoup
+
+try:
+    import ijson
+except ImportError:  # Потоковый разбор страниц поиска необязателен, без ijson страница разбирается целиком.
+    ijson = None
+
+from CountryRegistry import CountryRegistry
+from CrawlLogging import get_logger
+from CrawlPipeline import CrawlPipeline
+from ImagePipeline import ImagePipeline
+from NoticeIndex import NoticeIndex
+from NoticeManifest import NoticeManifest
+from PartitionPlan import PartitionPlan
+from ResponseCache import ResponseCache
+from WorkQueue import WorkQueue
 from Parser import Parser
 
+logger = get_logger('parser')
+probe_logger = get_logger('probe')
+partition_logger = get_logger('partition')
+detail_logger = get_logger('detail')
+
 
 class InterpolParser(Parser):
     """
     Класс собирающий данные о разыскиваемых
     на сайте интерпола (https://www.interpol.int/How-we-work/Notices/View-Red-Notices).
+    Кроме красных объявлений может собирать желтые и список ООН (notice_types, см. NOTICE_TYPES).
     """
 
     BASE_DIR_FOR_DATA = f'.{os.sep}all_data{os.sep}'
     BASE_URL = 'https://www.interpol.int/How-we-work/Notices/View-Red-Notices'
     BASE_JSON_RESPONSE_URL = 'https://ws-public.interpol.int/notices/v1/red'
+    NOTICE_TYPE_RED = 'red'
+    # Типы объявлений: путь в API (относительно каталога BASE_JSON_RESPONSE_URL), каталог данных
+    # (красные - в корне BASE_DIR_FOR_DATA, как и раньше) и поддерживает ли поиск фильтры по полу и возрасту.
+    # Список ООН ищется только по гражданству, поэтому его запросы по странам дальше не делятся.
+    NOTICE_TYPES = {'red': {'path': 'red', 'dir': '', 'split': True},
+                    'yellow': {'path': 'yellow', 'dir': 'yellow', 'split': True},
+                    'un': {'path': 'un/persons', 'dir': 'un', 'split': False}}
     MAX_SEARCH_RESULT_DISPLAY = 160
-    MAX_SEARCH_RESULT_PER_PAGE = 20
     MIN_REDNOTICE_AGE = 17
     MAX_REDNOTICE_AGE = 100
+    PARTITION_HINTS_FILE_NAME = 'partition_hints'
+    PARTITION_PLAN_FILE_NAME = 'partition_plan'
+    PREPARED_URLS_FILE_NAME = 'all_prepared_country_urls'
+    PREPARED_LISTING_FILE_NAME = 'prepared_rednotice_listing'
+    COUNTRY_CODES_TTL = CountryRegistry.DEFAULT_TTL
+    NOTICE_MANIFEST_FILE_NAME = 'notices_manifest'
+    NOTICE_INDEX_FILE_NAME = 'notice_index'
+    WORK_QUEUE_FILE_NAME = 'work_queue'
+    IMAGE_TEMP_DIR_NAME = '.tmp_images'
+    RESPONSE_CACHE_DIR_NAME = '.http_cache'
+    STAGE_COUNTRY = 'country'
+    STAGE_COMMIT = 'commit'
+    STREAM_LISTING_PAGES = False
 
-    def __init__(self, max_threads: int):
-        super().__init__(max_threads=max_threads)
+    def __init__(self, max_threads: int, max_retries: int = 3, backoff_factor: float = 0.5, storage=None,
+                 max_image_threads: int = None, stage_threads: dict = None, rate_limiter=None, metrics=None,
+                 shard_index: int = 0, shard_count: int = 1, base_dir: str = None, cache=None, notice_types=None,
+                 notice_index=None, request_policy=None, archive=None, max_task_attempts: int = 3):
+        """
+        :param max_threads: Количество потоков каждого этапа сбора по умолчанию.
+        :param max_retries: Количество повторов запроса.
+        :param backoff_factor: Множитель паузы между повторами.
+        :param storage: Хранилище данных. None - json файлы в BASE_DIR_FOR_DATA.
+        :param max_image_threads: Количество потоков загрузки изображений. None - max_threads.
+        :param stage_threads: Словарь {'Название этапа': количество потоков} для этапов 'country' (разделение
+        запросов по странам), 'partition' (страницы поиска) и 'notice' (данные о разыскиваемых).
+        :param rate_limiter: Общий ограничитель скорости запросов. None - RateLimiter с настройками по умолчанию.
+        :param metrics: Метрики сбора. None - новый объект Metrics.
+        :param shard_index: Номер шарда (от 0), который собирает этот объект.
+        :param shard_count: Количество шардов. Запросы по странам делятся между шардами (см. select_shard_urls).
+        :param base_dir: Каталог данных вместо BASE_DIR_FOR_DATA, например отдельный каталог шарда.
+        :param cache: Кеш ответов (ResponseCache), по умолчанию не используется.
+        True - ResponseCache в каталоге данных (RESPONSE_CACHE_DIR_NAME).
+        :param notice_types: Собираемые типы объявлений из NOTICE_TYPES, например ('red', 'yellow', 'un').
+        None - только красные. Все типы собираются одним конвейером с общими соединениями и ограничителем скорости.
+        :param notice_index: Индекс сохраненных объявлений. None - NoticeIndex в каталоге данных
+        (NOTICE_INDEX_FILE_NAME), False - без индекса.
+        :param request_policy: Таймауты по этапам, общий срок сбора и дублирование запросов (RequestPolicy).
+        None - таймауты по умолчанию, без срока и без дублирования.
+        :param archive: Архив ответов (HttpArchive) для записи сбора или его воспроизведения без сети,
+        например для повторной обработки ответов после изменения очистки данных. None - без архива.
+        С архивом кеш ответов не используется, а сохраненные в каталоге данных справочник стран, план разделения
+        и выученные диапазоны не учитываются (use_saved_state): запись должна содержать все запросы полного сбора,
+        а воспроизведение - повторить их и перезаписать данные.
+        :param max_task_attempts: Количество попыток задачи очереди (страны, запроса поиска, разыскиваемого),
+        после которого resume() ее больше не повторяет. Не зависит от повторов запроса (max_retries).
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f'Номер шарда {shard_index} вне диапазона 0..{shard_count - 1}.')
+        self.notice_types = tuple(notice_types or (self.NOTICE_TYPE_RED,))
+        unknown_types = [notice_type for notice_type in self.notice_types if notice_type not in self.NOTICE_TYPES]
+        if unknown_types:
+            raise ValueError(f'Неизвестные типы объявлений: {unknown_types}, доступны: {list(self.NOTICE_TYPES)}.')
+        if base_dir:
+            self.BASE_DIR_FOR_DATA = base_dir if base_dir.endswith(os.sep) else f'{base_dir}{os.sep}'
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        if archive is not None:
+            # Ответы из кеша не попали бы в архив, а при воспроизведении все ответы берутся из архива.
+            cache = None
+        elif cache is True:
+            cache = ResponseCache(f'{self.BASE_DIR_FOR_DATA}{self.RESPONSE_CACHE_DIR_NAME}')
+        super().__init__(max_threads=max_threads, max_retries=max_retries, backoff_factor=backoff_factor,
+                         storage=storage, rate_limiter=rate_limiter, metrics=metrics, cache=cache or None,
+                         request_policy=request_policy, archive=archive)
+        self.max_image_threads = max_image_threads or max_threads
+        self.stage_threads = {self.STAGE_COUNTRY: max_threads, WorkQueue.KIND_PARTITION: max_threads,
+                              WorkQueue.KIND_NOTICE: max_threads, **(stage_threads or {})}
+        self._commit_tasks = []
+        self._image_pipeline = None
+        self._image_pipeline_lock = threading.Lock()
+        self.partition_probe_counts = {}
+        self.prepared_rednotice_listing = {}
+        self.listing_complete = True
+        self._manifests = {}
+        self._manifest_lock = threading.Lock()
+        self._work_queue = None
+        self.max_task_attempts = max_task_attempts
+        self.use_saved_state = archive is None
+        self._partition_hints = None
+        self._partition_plan = None
+        self._partition_lock = threading.RLock()
+        self._notice_index = notice_index or None
+        self._notice_index_enabled = notice_index is not False
 
     @staticmethod
     def get_rednotice_search_result_number(page_data: dict):
@@ -38,58 +146,124 @@ class InterpolParser(Parser):
             total_number = int(page_data['total'])
             return total_number
         except Exception as ex:
-            print('get_rednotice_search_result_number', ex)
+            logger.warning('get_rednotice_search_result_number - %s', ex)
             return 0
 
+    def fetch_country_codes(self):
+        """
+        Находит на сайте список всех стран и их коды, для дальнейшей возможности фильтрации.
+        :return: Словарь со всеми доступными для выбора странами. {'Название страны':'Код страны'}
+        """
+        page_data = self.get_page(self.BASE_URL, stage='country')
+        soup = BeautifulSoup(page_data, 'lxml')
+        left_column = soup.find('div', class_='twoColumns__leftColumn')
+        select_nationality = left_column.find('select', id='nationality')
+        all_codes = select_nationality.find_all('option')
+        country_codes = {}
+        for code in all_codes[1:]:
+            country_name = code.text
+            country_code = code.get('value')
+            country_codes[country_name] = country_code
+        return country_codes
+
+    @property
+    def country_registry(self):
+        """
+        Общий для процесса справочник стран, сохраняемый в файл countries.json.
+        Так как список стран с большой вероятностью меняться не будет, он запрашивается с сайта
+        только если файла нет или он старше COUNTRY_CODES_TTL секунд. Справочник запрашивается
+        методом fetch_country_codes того сборщика, который к нему обращается.
+        :return: Объект CountryRegistry.
+        """
+        return CountryRegistry.get_registry(f'{self.BASE_DIR_FOR_DATA}countries.json', self.COUNTRY_CODES_TTL)
+
     def __get_all_country_codes(self):
         """
         Находит список всех стран и их коды, для дальнейшей возможности фильтрации.
-        Так как список стран с большой вероятностью меняться не будет, после первого запроса он сохраняется в файл
-        и в дальнейшем берется оттуда.
         :return: Словарь со всеми доступными для выбора странами. {'Название страны':'Код страны'}
         """
-        file_name = 'countries'
-        if os.path.exists(f'{self.BASE_DIR_FOR_DATA}{file_name}.json'):
-            with open(f'{self.BASE_DIR_FOR_DATA}{file_name}.json', encoding='utf-8') as countries:
-                return json.load(countries)
-        else:
-            page_data = self.get_page(self.BASE_URL)
-            soup = BeautifulSoup(page_data, 'lxml')
-            left_column = soup.find('div', class_='twoColumns__leftColumn')
-            select_nationality = left_column.find('select', id='nationality')
-            all_codes = select_nationality.find_all('option')
-            country_codes = {}
-            for code in all_codes[1:]:
-                country_name = code.text
-                country_code = code.get('value')
-                country_codes[country_name] = country_code
-            self.write_data_into_json(self.BASE_DIR_FOR_DATA, file_name, country_codes)
-            return country_codes
+        return self.country_registry.get_country_codes(self.fetch_country_codes)
 
     def get_all_country_urls(self):
         """
-        Составляет ссылки для запросов по каждой стране.
+        Составляет ссылки для запросов по каждой стране для каждого собираемого типа объявлений.
+        Ссылки разных типов чередуются, поэтому конвейер собирает все типы одновременно,
+        и общее время сбора близко ко времени сбора самого большого типа.
+        Без use_saved_state справочник стран запрашивается с сайта (или из архива ответов) заново.
         :return: Список строк.
         """
+        if not self.use_saved_state and not self.country_registry.refresh(self.fetch_country_codes):
+            raise ValueError('Справочник стран не получен с сайта.')
         url_postfix = '?=&nationality='
-        urls_list = [f'{self.BASE_JSON_RESPONSE_URL}{url_postfix}{code}' for code in
-                     self.__get_all_country_codes().values()]
+        type_urls = [self.get_notice_type_url(notice_type) for notice_type in self.notice_types]
+        urls_list = [f'{type_url}{url_postfix}{code}' for code in self.__get_all_country_codes().values()
+                     for type_url in type_urls]
         return urls_list
 
-    def check_for_acceptability(self, url: str, oper: operator, condition: int):
+    def get_notice_type_url(self, notice_type: str):
+        """
+        :param notice_type: Тип объявлений из NOTICE_TYPES.
+        :return: Строка - ссылка поиска объявлений этого типа.
+        """
+        if notice_type == self.NOTICE_TYPE_RED:
+            return self.BASE_JSON_RESPONSE_URL
+        return f"{self.BASE_JSON_RESPONSE_URL.rsplit('/', 1)[0]}/{self.NOTICE_TYPES[notice_type]['path']}"
+
+    def get_notice_type(self, url: str):
         """
-        Проверка количества результатов поиска на то подходит ли оно под определённое условие.
-        Частый случай - меньше ли количество чем 160. (160 - это максимум результатов, который выдаёт сайт по запросу)
+        Определяет тип объявления по ссылке запроса поиска, объявления или его изображений.
+        :param url: Ссылка.
+        :return: Строка - тип объявлений из NOTICE_TYPES (по умолчанию красные).
+        """
+        for notice_type in self.NOTICE_TYPES:
+            type_url = self.get_notice_type_url(notice_type)
+            if url == type_url or url.startswith((f'{type_url}/', f'{type_url}?')):
+                return notice_type
+        return self.NOTICE_TYPE_RED
+
+    def get_notice_type_dir(self, notice_type: str):
+        """
+        :param notice_type: Тип объявлений из NOTICE_TYPES.
+        :return: Строка - каталог данных объявлений этого типа.
+        """
+        type_dir = self.NOTICE_TYPES[notice_type]['dir']
+        return f'{self.BASE_DIR_FOR_DATA}{type_dir}{os.sep}' if type_dir else self.BASE_DIR_FOR_DATA
+
+    @classmethod
+    def iter_notice_dirs(cls, base_dir: str, skip_dirs=()):
+        """
+        Перебирает каталоги объявлений в каталоге данных: 'Страна/Имя/' для красных
+        и 'тип/Страна/Имя/' для остальных типов.
+        :param base_dir: Каталог данных.
+        :param skip_dirs: Названия каталогов верхнего уровня, которые не являются каталогами стран.
+        :return: Генератор путей к каталогам объявлений.
+        """
+        type_dirs = sorted(notice_type['dir'] for notice_type in cls.NOTICE_TYPES.values() if notice_type['dir'])
+        yield from super().iter_notice_dirs(base_dir, tuple(skip_dirs) + tuple(type_dirs))
+        for type_dir in type_dirs:
+            if os.path.isdir(os.path.join(base_dir, type_dir)):
+                yield from super().iter_notice_dirs(os.path.join(base_dir, type_dir), skip_dirs)
+
+    @staticmethod
+    def get_shard_index(url: str, shard_count: int):
+        """
+        Номер шарда для ссылки запроса. Считается по md5, а не встроенной hash(),
+        чтобы совпадать во всех процессах и на всех машинах.
         :param url: Ссылка запроса.
-        :param oper: Оператор условия.
-        :param condition: Условие для сравнения.
-        :return: Возвращает True, если условие выполняется.
+        :param shard_count: Количество шардов.
+        :return: Целое число от 0 до shard_count - 1.
         """
-        page = self.get_json_page(url)
-        result_number = self.get_rednotice_search_result_number(page)
-        print(f'{url} has {result_number} results')  # debugging line
-        if oper(result_number, condition):
-            return True
+        return int(hashlib.md5(url.encode('utf-8')).hexdigest()[:8], 16) % shard_count
+
+    def select_shard_urls(self, urls):
+        """
+        Оставляет ссылки запросов, которые относятся к шарду этого объекта.
+        :param urls: Список ссылок.
+        :return: Список строк.
+        """
+        if self.shard_count == 1:
+            return list(urls)
+        return [url for url in urls if self.get_shard_index(url, self.shard_count) == self.shard_index]
 
     @staticmethod
     def get_urls_with_gender_filter(base_url: str):
@@ -116,6 +290,200 @@ class InterpolParser(Parser):
         urls_with_gender_filter = [f'{base_url}{url_postfix_min}{i[0]}{url_postfix_max}{i[1]}' for i in age_ranges]
         return urls_with_gender_filter
 
+    def get_partition_hints(self):
+        """
+        Загружает выученные в прошлых запусках границы возрастных диапазонов.
+        Файл создается после разделения запросов и хранит для каждой ссылки с фильтром по полу
+        список диапазонов, на которых закончилось разделение. Без use_saved_state файл не читается.
+        :return: Словарь {'Ссылка с фильтром по полу': [[минимальный возраст, максимальный возраст], ...]}.
+        """
+        with self._partition_lock:
+            if self._partition_hints is None:
+                self._partition_hints = {}
+                file_path = f'{self.BASE_DIR_FOR_DATA}{self.PARTITION_HINTS_FILE_NAME}.json'
+                if os.path.exists(file_path) and self.use_saved_state:
+                    try:
+                        with open(file_path, encoding='utf-8') as hints:
+                            self._partition_hints = json.load(hints)
+                    except Exception as ex:
+                        logger.warning('get_partition_hints - %s', ex)
+            return self._partition_hints
+
+    def save_partition_hints(self):
+        """
+        Сохраняет выученные границы возрастных диапазонов для следующих запусков.
+        :return: Строка с относительной ссылкой на json файл.
+        """
+        file_path = self.check_and_create_path(self.BASE_DIR_FOR_DATA)
+        full_file_path = f'{file_path}{os.sep}{self.PARTITION_HINTS_FILE_NAME}.json'
+        with self._partition_lock:
+            hints = self.get_partition_hints()
+            with open(full_file_path, 'w', encoding='utf-8') as file:
+                json.dump(hints, file, indent=4, ensure_ascii=False)
+        return full_file_path
+
+    @property
+    def partition_plan(self):
+        """
+        План разделения запросов по странам (partition_plan.json) с количествами найденных по каждой ссылке.
+        Без use_saved_state план начинается заново.
+        :return: Объект PartitionPlan.
+        """
+        with self._partition_lock:
+            if self._partition_plan is None:
+                self._partition_plan = PartitionPlan(
+                    f'{self.BASE_DIR_FOR_DATA}{self.PARTITION_PLAN_FILE_NAME}.json', self.MAX_SEARCH_RESULT_DISPLAY,
+                    reset=not self.use_saved_state)
+            return self._partition_plan
+
+    def save_partition_plan(self):
+        """
+        Сохраняет план разделения и сообщает о переполненных запросах: по ним сайт выдает только
+        первые MAX_SEARCH_RESULT_DISPLAY результатов.
+        :return: Строка с путем к json файлу.
+        """
+        for url, total in self.partition_plan.get_truncated().items():
+            partition_logger.warning('Найдено %s, выдается только %s.', total, self.MAX_SEARCH_RESULT_DISPLAY,
+                                     extra={'url': url, 'stage': 'partition', 'total': total})
+        return self.partition_plan.save()
+
+    def partition_url(self, country_url: str):
+        """
+        Генератор разделения запроса по стране на запросы, каждый из которых выдает не больше 160 результатов.
+        Отдает (yield) ссылку, которую необходимо проверить, и принимает (send) словарь ответа на неё.
+        Проверочные запросы сразу делаются с resultPerPage=160, поэтому ответ на подходящий запрос
+        уже содержит всех найденных и повторно не запрашивается.
+        Так один и тот же алгоритм используется и потоковым, и асинхронным движком.
+        Запрос по стране делится по полу, а затем возрастной диапазон делится пополам,
+        пока количество результатов не станет <= MAX_SEARCH_RESULT_DISPLAY.
+        Запросы типов без фильтров по полу и возрасту (NOTICE_TYPES, split) не делятся.
+        Если в прошлых запусках для этой ссылки уже найдены подходящие диапазоны, деление начинается с них,
+        а не со всего диапазона возрастов.
+        Разделение сохраняется в план (partition_plan). Если количество найденных по стране или по ссылке
+        с фильтром по полу не изменилось и среди её ссылок нет переполненных, ссылки берутся из плана
+        без проверочных запросов, а их страницы (None) запрашиваются позже вместе с остальной выдачей.
+        Ссылки без результатов (пол или возрастной диапазон) тоже остаются в разделении: при неизменном
+        количестве найденных разыскиваемый мог перейти в пустую ссылку из другой, и без её выдачи он был бы потерян.
+        Поэтому ссылки плана всегда покрывают все полы и весь диапазон возрастов, а ссылка, ставшая переполненной,
+        разделяется заново при сборе выдачи (collect_partition).
+        Если проверочный запрос не удался, разделение прерывается исключением: без количества найденных
+        нельзя понять, нужно ли делить запрос дальше, и его часть выдачи была бы потеряна.
+        :param country_url: Ссылка общего запроса.
+        :return: Словарь {'Ссылка запроса': словарь страницы или None} (значение StopIteration).
+        """
+        plan = self.partition_plan
+        probe_url = self.get_probe_url(country_url)
+        page = yield probe_url
+        country_total = self.get_listing_result_number(page)
+        self.log_probe(probe_url, country_total)
+        self.check_probe_page(probe_url, page)
+        planned_urls = plan.get_country_partitions(country_url, country_total)
+        if planned_urls is not None:
+            pages = dict.fromkeys(planned_urls)
+            if probe_url in pages:
+                pages[probe_url] = page
+            return pages
+        split = self.NOTICE_TYPES[self.get_notice_type(country_url)]['split']
+        if country_total <= self.MAX_SEARCH_RESULT_DISPLAY or not split:
+            # Без фильтров по полу и возрасту запрос дальше не делится и при переполнении отмечается в плане.
+            plan.set_country(country_url, country_total, {}, {probe_url: (country_total, split)})
+            return {probe_url: page}
+
+        pages = {}
+        parents = {}
+        partitions = {}
+        hints = self.get_partition_hints()
+        for url_with_gender_filter in self.get_urls_with_gender_filter(country_url):
+            probe_url = self.get_probe_url(url_with_gender_filter)
+            page = yield probe_url
+            result_number = self.get_listing_result_number(page)
+            self.log_probe(probe_url, result_number)
+            self.check_probe_page(probe_url, page)
+            parents[url_with_gender_filter] = result_number
+            if result_number <= self.MAX_SEARCH_RESULT_DISPLAY:
+                pages[probe_url] = page
+                partitions[probe_url] = (result_number, True)
+                continue
+            planned_partitions = plan.get_parent_partitions(country_url, url_with_gender_filter, result_number)
+            if planned_partitions is not None:
+                pages.update(dict.fromkeys(planned_partitions))
+                partitions.update(planned_partitions)
+                continue
+
+            with self._partition_lock:
+                age_ranges = [tuple(i) for i in hints.get(url_with_gender_filter, [])]
+            if not age_ranges:
+                age_ranges = [(self.MIN_REDNOTICE_AGE, self.MAX_REDNOTICE_AGE)]
+            learned_ranges = []
+            while age_ranges:
+                age_range = age_ranges.pop(0)
+                url_with_age_filter = self.get_urls_with_age_filter(url_with_gender_filter, [age_range])[0]
+                probe_url = self.get_probe_url(url_with_age_filter)
+                page = yield probe_url
+                result_number = self.get_listing_result_number(page)
+                self.log_probe(probe_url, result_number)
+                self.check_probe_page(probe_url, page)
+                start_range, end_range = age_range
+                if result_number <= self.MAX_SEARCH_RESULT_DISPLAY or start_range == end_range:
+                    # Один возраст дальше не делится, даже если результатов больше 160.
+                    learned_ranges.append((start_range, end_range, result_number))
+                    pages[probe_url] = page
+                    partitions[probe_url] = (result_number, start_range != end_range)
+                    continue
+                middle = (start_range + end_range) // 2
+                age_ranges[:0] = [(start_range, middle), (middle + 1, end_range)]
+            with self._partition_lock:
+                hints[url_with_gender_filter] = self.merge_age_ranges(learned_ranges)
+        plan.set_country(country_url, country_total, parents, partitions)
+        return pages
+
+    @staticmethod
+    def check_probe_page(probe_url: str, page: dict):
+        """
+        Проверяет, что ответ на проверочный запрос получен.
+        :param probe_url: Ссылка проверочного запроса.
+        :param page: Словарь ответа.
+        :return: None. Если в ответе нет количества найденных - исключение ValueError.
+        """
+        if 'total' not in page:
+            raise ValueError(f'Проверочный запрос не выполнен - {probe_url}')
+
+    def merge_age_ranges(self, age_ranges: list):
+        """
+        Объединяет соседние возрастные диапазоны, пока их суммарное количество результатов не превышает 160.
+        Диапазоны не пересекаются, поэтому количество результатов объединенного диапазона равно сумме.
+        Пустые диапазоны поглощаются соседними, и в следующем запуске на них не тратятся запросы.
+        :param age_ranges: Список (минимальный возраст, максимальный возраст, количество результатов).
+        :return: Список пар [минимальный возраст, максимальный возраст].
+        """
+        merged = []
+        merged_number = 0
+        for start_range, end_range, result_number in sorted(age_ranges):
+            if merged and merged_number + result_number <= self.MAX_SEARCH_RESULT_DISPLAY:
+                merged[-1][1] = end_range
+                merged_number += result_number
+            else:
+                merged.append([start_range, end_range])
+                merged_number = result_number
+        return merged
+
+    def separate_url_with_pages(self, country_url: str):
+        """
+        Разделяет запрос по стране (см. separate_url) и возвращает вместе со ссылками полученные при проверке страницы.
+        :param country_url: Ссылка общего запроса.
+        :return: Словарь {'Ссылка запроса': словарь страницы}.
+        """
+        partitioner = self.partition_url(country_url)
+        probe_number = 0
+        try:
+            url = next(partitioner)
+            while True:
+                probe_number += 1
+                url = partitioner.send(self.get_json_page(url, stage='probe'))
+        except StopIteration as stop:
+            self.add_partition_probe_count(country_url, probe_number)
+            return stop.value
+
     def separate_url(self, country_url: str):
         """
         Проверяет количество полученных по запросу результатов и если необходимо,
@@ -123,72 +491,44 @@ class InterpolParser(Parser):
         Разделение необходимо для возможности получить все данные с сайта,
         так как максимальная выдача по запросу 160 результатов,
         а некоторые общие запросы подразумевают получение большего количества.
+        Количество проверочных запросов сохраняется в partition_probe_counts.
         :param country_url: Ссылка общего запроса.
         :return: Список строк.
         """
+        return list(self.separate_url_with_pages(country_url))
 
-        urls_list = set()
-        if self.check_for_acceptability(country_url, operator.le, self.MAX_SEARCH_RESULT_DISPLAY):
-            urls_list.add(country_url)
-            return list(urls_list)
-        else:
-            urls_with_gender_filter = self.get_urls_with_gender_filter(country_url)
-            for url_with_gender_filter in urls_with_gender_filter:
-                if self.check_for_acceptability(url_with_gender_filter, operator.le, self.MAX_SEARCH_RESULT_DISPLAY):
-                    urls_list.add(url_with_gender_filter)
-                else:
-                    urls_with_age_filter = self.get_urls_with_age_filter(url_with_gender_filter,
-                                                                         age_ranges=[(self.MIN_REDNOTICE_AGE, 25),
-                                                                                     (26, 29), (30, 34), (35, 38),
-                                                                                     (39, 40), (41, 55), (56, 65),
-                                                                                     (66, self.MAX_REDNOTICE_AGE)])
-                    for url_with_age_filter in urls_with_age_filter:
-                        if self.check_for_acceptability(url_with_age_filter, operator.le,
-                                                        self.MAX_SEARCH_RESULT_DISPLAY):
-                            urls_list.add(url_with_age_filter)
-                        else:
-                            start_range, end_range = map(int, re.findall(r"(\d\d)", url_with_age_filter))
-                            frequent_urls_with_age_filter = self.get_urls_with_age_filter(url_with_gender_filter,
-                                                                                          [(i, i) for i in
-                                                                                           range(start_range,
-                                                                                                 end_range + 1)])
-                            for url in frequent_urls_with_age_filter:
-                                if self.check_for_acceptability(url, operator.gt, 0):
-                                    urls_list.add(url)
-            return list(urls_list)
-
-    def get_full_search_result_page_url(self, search_url: str, search_result_number: int):
-        """
-        Составляет ссылку на полную страницу найденных данных.
-        Чтобы не бегать по ссылкам каждой страницы можно сразу получить все найденные результаты.
-        (Если результатов <= 160 само собой.)
-        :param search_url: Ссылка запроса по стране или по стране и возрасту.
-        :param search_result_number: Количество найденных.
-        :return: Строка.
+    def add_partition_probe_count(self, country_url: str, probe_number: int):
         """
-        if search_result_number <= self.MAX_SEARCH_RESULT_PER_PAGE:
-            # print(search_url, search_result_number)  # debugging line
-            return search_url
-        else:
-            full_search_result_page_url = f'{search_url}&resultPerPage={self.MAX_SEARCH_RESULT_DISPLAY}'
-            # print(search_url, search_result_number)  # debugging line
-            return full_search_result_page_url
+        Запоминает количество проверочных запросов, потраченных на разделение запроса по стране.
+        :param country_url: Ссылка общего запроса.
+        :param probe_number: Количество запросов.
+        :return: None.
+        """
+        with self._partition_lock:
+            self.partition_probe_counts[country_url] = probe_number
+        partition_logger.info('separated', extra={'url': country_url, 'stage': 'partition', 'probes': probe_number})
 
     @staticmethod
-    def __get_rednotice_url(page_data: dict, order_number: int):
+    def log_probe(probe_url: str, result_number: int):
+        """
+        Пишет в лог строку уровня DEBUG о проверочном запросе. Если DEBUG выключен, строка не собирается.
+        :param probe_url: Ссылка проверочного запроса.
+        :param result_number: Количество найденных.
+        :return: None.
+        """
+        if probe_logger.isEnabledFor(logging.DEBUG):
+            probe_logger.debug('probe', extra={'url': probe_url, 'stage': 'probe', 'total': result_number})
+
+    def get_probe_url(self, search_url: str):
         """
-        Забирает ссылку на разыскиваемого с общей страницы поиска.
-        :param page_data: Словарь с данными страницы.
-        :param order_number: Номер по порядку.
-        В получаемых данных у каждого разыскиваемого есть id от 0 до найденного максимума -1.
+        Составляет ссылку проверочного запроса сразу с максимальной выдачей на странице.
+        Ответ на неё содержит и общее количество найденных, и все найденные (если их <= 160).
+        :param search_url: Ссылка запроса.
         :return: Строка.
         """
-        try:
-            rednotice_url = str(page_data['_embedded']['notices'][order_number]['_links']['self']['href'])
-            return rednotice_url
-        except Exception as ex:
-            print(f'__get_rednotice_url {ex}')
-            return 0
+        if 'resultPerPage=' in search_url:
+            return search_url
+        return f'{search_url}&resultPerPage={self.MAX_SEARCH_RESULT_DISPLAY}'
 
     def get_rednotice_urls(self, full_page: dict):
         """
@@ -196,53 +536,177 @@ class InterpolParser(Parser):
         :param full_page: Словарь с данными страницы.
         :return: Список строк.
         """
-        result_number = self.get_rednotice_search_result_number(full_page)
-        # print(f'Ссылок для сбора: {result_number}')  # debugging line
-        if result_number > 0:
-            rednotice_urls = set()
-            for i in range(0, result_number):
-                url = self.__get_rednotice_url(full_page, i)
-                # print(f'Беру ссылку: #{i} - {url}')  # debugging line
-                if url == 0:
-                    continue
-                else:
-                    rednotice_urls.add(url)
-            # print(f'Собрано ссылок: {len(rednotice_urls)}')  # debugging line
-            return list(rednotice_urls)
-        else:
+        if self.get_rednotice_search_result_number(full_page) <= 0:
             return list()
+        rednotice_urls = set()
+        for notice in full_page.get('_embedded', {}).get('notices', []):
+            try:
+                rednotice_urls.add(str(notice['_links']['self']['href']))
+            except (KeyError, TypeError) as ex:
+                logger.warning('get_rednotice_urls - %s', ex)
+        return list(rednotice_urls)
+
+    def get_rednotice_links(self, page_body: bytes):
+        """
+        Забирает со страницы поиска только общее количество, ссылки и entity_id разыскиваемых.
+        При STREAM_LISTING_PAGES и установленном ijson страница разбирается потоково, по событиям,
+        не собирая словарь всей страницы (меньше памяти). По умолчанию страница разбирается целиком через
+        decode_json: для страниц из 160 разыскиваемых orjson быстрее ijson в несколько раз.
+        :param page_body: Байты ответа страницы поиска.
+        :return: Кортеж (количество найденных или None, если страница не получена;
+        список пар (ссылка на разыскиваемого, entity_id)).
+        """
+        if not page_body:
+            return None, []
+        if ijson is None or not self.STREAM_LISTING_PAGES:
+            page = self.decode_json(page_body)
+            links = [(str(notice['_links']['self']['href']), notice.get('entity_id'))
+                     for notice in page.get('_embedded', {}).get('notices', [])]
+            return page.get('total'), links
+        total, links, href, entity_id = None, [], None, None
+        for prefix, event, value in ijson.parse(page_body):
+            if prefix == 'total' and event == 'number':
+                total = int(value)
+            elif prefix == '_embedded.notices.item.entity_id':
+                entity_id = value
+            elif prefix == '_embedded.notices.item._links.self.href':
+                href = value
+            elif prefix == '_embedded.notices.item' and event == 'end_map':
+                if href is not None:
+                    links.append((str(href), entity_id))
+                href, entity_id = None, None
+        return total, links
+
+    def get_listing_result_number(self, page_data: dict):
+        """
+        Получает количество разыскиваемых со страницы поиска и отмечает, если страница не получена.
+        Без полной выдачи поиска нельзя считать пропавшими тех, кого в ней нет.
+        :param page_data: Словарь с данными о странице поиска.
+        :return: Целое число.
+        """
+        if 'total' not in page_data:
+            self.listing_complete = False
+        return self.get_rednotice_search_result_number(page_data)
+
+    def get_rednotice_listing(self, full_page: dict):
+        """
+        Забирает со страницы поиска ссылки на разыскиваемых вместе с их краткими данными.
+        :param full_page: Словарь с данными страницы.
+        :return: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        """
+        self.get_listing_result_number(full_page)
+        rednotice_listing = {}
+        try:
+            for notice in full_page.get('_embedded', {}).get('notices', []):
+                rednotice_listing[str(notice['_links']['self']['href'])] = notice
+        except Exception as ex:
+            logger.warning('get_rednotice_listing - %s', ex)
+        return rednotice_listing
 
     def get_full_page(self, page_url: str):
         """
         Возвращает ответ полной страницы запроса.
+        Запрос сразу делается с resultPerPage=160, отдельный запрос количества найденных не нужен.
         :param page_url: Ссылка на конкретный запрос.
         :return: Словарь с данными страницы.
         """
-        page_data = self.get_json_page(page_url)
-        search_result_number = self.get_rednotice_search_result_number(page_data)
-        full_page_url = self.get_full_search_result_page_url(page_url, search_result_number)
-        full_page = self.get_json_page(full_page_url)
+        full_page = self.get_json_page(self.get_probe_url(page_url), stage='listing')
         return full_page
 
     def get_all_prepared_country_urls(self):
         """
         Подготавливает все необходимые ссылки запросов фильтров.
+        Разыскиваемые со страниц, полученных при разделении, сразу сохраняются в prepared_rednotice_listing,
+        чтобы get_all_rednotice_listing не запрашивал эти страницы повторно.
+        При сохраненном плане разделения (partition_plan) запросы проверяются заново, но делятся только
+        изменившиеся (см. partition_url), и all_prepared_country_urls.csv перезаписывается.
+        Если разделить удалось не все страны, план и выученные диапазоны сохраняются (повторный вызов
+        проверяет заново только неразделенные страны), csv не записывается и возникает исключение ValueError.
         :return: Список строк.
         """
 
-        file_name = 'all_prepared_country_urls'
+        file_name = self.PREPARED_URLS_FILE_NAME
         all_prepared_country_urls = set()
-        if os.path.exists(f'{self.BASE_DIR_FOR_DATA}{file_name}.csv'):
+        if self.is_prepared_urls_fixed():
             all_prepared_country_urls = \
                 set(self.read_data_from_csv_to_list(f'{self.BASE_DIR_FOR_DATA}{file_name}.csv'))
+            self.load_prepared_listing()
         else:
+            failed_urls = []
             with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-                all_raw_urls = self.get_all_country_urls()
-                for url in executor.map(self.separate_url, all_raw_urls):
-                    all_prepared_country_urls.update(url)
-            self.write_data_into_csv(self.BASE_DIR_FOR_DATA, file_name, all_prepared_country_urls)
+                all_raw_urls = self.select_shard_urls(self.get_all_country_urls())
+                futures = {executor.submit(self.separate_url_with_pages, url): url for url in all_raw_urls}
+                for future in concurrent.futures.as_completed(futures):
+                    if future.exception() is not None:
+                        partition_logger.error('failed', extra={'url': futures[future], 'stage': 'country',
+                                                                'error': str(future.exception())})
+                        failed_urls.append(futures[future])
+                        continue
+                    for url, page in future.result().items():
+                        all_prepared_country_urls.add(url)
+                        if page is not None:
+                            self.prepared_rednotice_listing[url] = self.get_rednotice_listing(page)
+            self.save_partition_hints()
+            self.save_partition_plan()
+            logger.info('Проверочных запросов: %s', sum(self.partition_probe_counts.values()))
+            self.check_failed_countries(failed_urls)
+            self.write_prepared_urls(all_prepared_country_urls)
         return list(all_prepared_country_urls)
 
+    def check_failed_countries(self, failed_urls: list):
+        """
+        Прерывает подготовку ссылок запросов поиска, если часть стран разделить не удалось:
+        без них список запросов неполон, и пропавшие с сайта разыскиваемые определились бы неверно.
+        :param failed_urls: Ссылки общих запросов, разделение которых не удалось.
+        :return: None. Если список не пуст - исключение ValueError.
+        """
+        if failed_urls:
+            self.listing_complete = False
+            raise ValueError(f'Не удалось разделить запросы по странам ({len(failed_urls)}): '
+                             f'{", ".join(sorted(failed_urls)[:5])}')
+
+    def is_prepared_urls_fixed(self):
+        """
+        Готовый all_prepared_country_urls.csv без плана разделения (например, часть ссылок шарда,
+        см. Sharding.ShardedCrawl.prepare_plan) используется как есть, без проверочных запросов.
+        Чтобы начать вести план, такой файл достаточно удалить.
+        :return: True, если ссылки запросов поиска берутся из csv файла.
+        """
+        return self.use_saved_state and os.path.exists(f'{self.BASE_DIR_FOR_DATA}{self.PREPARED_URLS_FILE_NAME}.csv') \
+            and not self.partition_plan.exists()
+
+    def load_prepared_listing(self):
+        """
+        Загружает в prepared_rednotice_listing выдачу страниц поиска, полученных при разделении запросов заранее
+        (prepared_rednotice_listing.json, см. Sharding.ShardedCrawl.prepare_plan), чтобы не запрашивать их повторно.
+        Файл удаляется после загрузки: выдача годится только для сбора сразу после разделения, а запросы,
+        не выполненные до сбоя, при resume() запрашиваются заново.
+        :return: Количество загруженных ссылок запросов поиска.
+        """
+        full_file_path = f'{self.BASE_DIR_FOR_DATA}{self.PREPARED_LISTING_FILE_NAME}.json'
+        if not os.path.exists(full_file_path):
+            return 0
+        try:
+            with open(full_file_path, encoding='utf-8') as file:
+                prepared_listing = json.load(file)
+        except Exception as ex:
+            logger.warning('load_prepared_listing - %s', ex)
+            prepared_listing = {}
+        os.remove(full_file_path)
+        self.prepared_rednotice_listing.update(prepared_listing)
+        return len(prepared_listing)
+
+    def write_prepared_urls(self, urls):
+        """
+        Записывает ссылки запросов поиска в all_prepared_country_urls.csv, заменяя старый файл.
+        :param urls: Список строк.
+        :return: Строка с относительной ссылкой на csv файл.
+        """
+        full_file_path = f'{self.BASE_DIR_FOR_DATA}{self.PREPARED_URLS_FILE_NAME}.csv'
+        if os.path.exists(full_file_path):
+            os.remove(full_file_path)
+        return self.write_data_into_csv(self.BASE_DIR_FOR_DATA, self.PREPARED_URLS_FILE_NAME, urls)
+
     def get_all_rednotice_urls(self):
         """
         Подготавливает ссылки на станицу каждого разыскиваемого на сайте.
@@ -255,14 +719,130 @@ class InterpolParser(Parser):
             all_rednotice_urls = \
                 set(self.read_data_from_csv_to_list(f'{self.BASE_DIR_FOR_DATA}{file_name}.csv'))
         else:
-            country_urls = self.get_all_prepared_country_urls()
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-                for page in executor.map(self.get_full_page, country_urls):
-                    urls = self.get_rednotice_urls(page)
-                    all_rednotice_urls.update(urls)
+            all_rednotice_urls = set(self.get_all_rednotice_listing())
             self.write_data_into_csv(self.BASE_DIR_FOR_DATA, file_name, all_rednotice_urls)
         return list(all_rednotice_urls)
 
+    def get_all_rednotice_listing(self):
+        """
+        Получает свежую выдачу поиска по всем подготовленным ссылкам запросов (без файла all_collected_rednotice_urls).
+        :return: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        """
+        country_urls = self.get_all_prepared_country_urls()
+        all_rednotice_listing = {}
+        # Страницы, уже полученные при разделении запросов, повторно не запрашиваются.
+        for url in country_urls:
+            all_rednotice_listing.update(self.prepared_rednotice_listing.get(url, {}))
+        not_fetched_urls = [url for url in country_urls if url not in self.prepared_rednotice_listing]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+            for page in executor.map(self.get_full_page, not_fetched_urls):
+                all_rednotice_listing.update(self.get_rednotice_listing(page))
+        return all_rednotice_listing
+
+    def get_manifest(self, notice_type: str = NOTICE_TYPE_RED):
+        """
+        Список известных объявлений типа для инкрементального сбора (notices_manifest.json в каталоге типа).
+        У каждого типа свой список: entity_id разных типов могут совпадать, а пропавшие определяются
+        по выдаче только своего типа.
+        :param notice_type: Тип объявлений из NOTICE_TYPES.
+        :return: Объект NoticeManifest.
+        """
+        with self._manifest_lock:
+            if notice_type not in self._manifests:
+                self._manifests[notice_type] = NoticeManifest(
+                    f'{self.get_notice_type_dir(notice_type)}{self.NOTICE_MANIFEST_FILE_NAME}.json')
+            return self._manifests[notice_type]
+
+    def save_manifests(self):
+        """
+        Сохраняет загруженные списки известных объявлений.
+        :return: None.
+        """
+        with self._manifest_lock:
+            manifests = list(self._manifests.values())
+        for manifest in manifests:
+            manifest.save()
+
+    def split_by_notice_type(self, rednotice_listing: dict):
+        """
+        Делит выдачу поиска по типам объявлений.
+        :param rednotice_listing: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :return: Словарь {'Тип объявлений': часть выдачи} для всех собираемых типов.
+        """
+        listings = {notice_type: {} for notice_type in self.notice_types}
+        for url, item in rednotice_listing.items():
+            listings.setdefault(self.get_notice_type(url), {})[url] = item
+        return listings
+
+    def get_incremental_rednotice_urls(self, all_rednotice_listing: dict):
+        """
+        Сравнивает свежую выдачу поиска со списками известных объявлений её типов.
+        Пропавшие из выдачи отмечаются в списке как удаленные, если выдача получена полностью.
+        :param all_rednotice_listing: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :return: Список ссылок на новых и изменившихся разыскиваемых.
+        """
+        rednotice_urls = []
+        for notice_type, rednotice_listing in self.split_by_notice_type(all_rednotice_listing).items():
+            manifest = self.get_manifest(notice_type)
+            new_urls, changed_urls = manifest.diff_listing(rednotice_listing)
+            manifest.mark_seen(rednotice_listing)
+            removed_ids = self.mark_removed_rednotices(rednotice_listing, notice_type)
+            logger.info('%s - новых: %s, изменившихся: %s, пропавших: %s',
+                        notice_type, len(new_urls), len(changed_urls), len(removed_ids))
+            manifest.save()
+            rednotice_urls += new_urls + changed_urls
+        return rednotice_urls
+
+    def mark_removed_rednotices(self, all_rednotice_listing: dict, notice_type: str = NOTICE_TYPE_RED):
+        """
+        Отмечает в списке известных объявлений, пропавших из выдачи поиска, если выдача получена полностью.
+        :param all_rednotice_listing: Полная выдача типа {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :param notice_type: Тип объявлений из NOTICE_TYPES.
+        :return: Список entity_id пропавших.
+        """
+        manifest = self.get_manifest(notice_type)
+        removed_ids = manifest.get_missing_ids(all_rednotice_listing)
+        if removed_ids and not self.listing_complete:
+            logger.warning('Выдача поиска получена не полностью, %s пропавших не отмечены как удаленные.',
+                           len(removed_ids))
+        elif removed_ids:
+            manifest.mark_removed(removed_ids)
+            if self.notice_index is not None:
+                self.notice_index.mark_removed(notice_type, removed_ids)
+        return removed_ids
+
+    def select_incremental_rednotices(self, tasks: list):
+        """
+        Оставляет из забранных задач только новых и изменившихся разыскиваемых,
+        остальные сразу отмечаются выполненными.
+        :param tasks: Список пар (ссылка, данные со страницы поиска в формате json).
+        :return: Список пар (ссылка, данные со страницы поиска в формате json).
+        """
+        listing = {url: json.loads(payload or '{}') for url, payload in tasks}
+        selected_urls = set()
+        for notice_type, rednotice_listing in self.split_by_notice_type(listing).items():
+            manifest = self.get_manifest(notice_type)
+            new_urls, changed_urls = manifest.diff_listing(rednotice_listing)
+            manifest.mark_seen(rednotice_listing)
+            selected_urls.update(new_urls + changed_urls)
+        self.work_queue.done_many(WorkQueue.KIND_NOTICE, [url for url, _ in tasks if url not in selected_urls])
+        return [(url, payload) for url, payload in tasks if url in selected_urls]
+
+    def get_incremental_rednotice_data(self, rednotice_url: str, listing_item: dict):
+        """
+        Собирает данные нового или изменившегося разыскиваемого, перезаписывая старые файлы,
+        и после успешного сбора запоминает его в списке известных.
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param listing_item: Словарь разыскиваемого со страницы поиска.
+        :return: Словарь данных.
+        """
+        red_notice_data = self.get_rednotice_data(rednotice_url, overwrite=True)
+        if red_notice_data and red_notice_data.get('entity_id'):
+            notice_type = self.get_notice_type(rednotice_url)
+            self.get_manifest(notice_type).mark_fetched(rednotice_url, listing_item,
+                                                        self.get_path(red_notice_data, notice_type))
+        return red_notice_data
+
     def get_images_links(self, red_notice_data: dict):
         """
         Собирает все имеющиеся ссылки изображений на странице.
@@ -270,40 +850,122 @@ class InterpolParser(Parser):
         :return: Список строк.
         """
         try:
-            base_images_link = red_notice_data['_links']['images']['href']
-            images_links = self.get_json_page(base_images_link)
-            images_links_list = images_links['_embedded']['images']
-            clean_links = []
-            if len(images_links_list) == 0:
-                return []
-            else:
-                for link in images_links_list:
-                    clean_links.append(link['_links']['self']['href'])
-                return clean_links
+            return self.get_images_links_by_url(red_notice_data['_links']['images']['href'])
         except Exception as ex:
-            print(f'get_images_link - {ex}')
+            logger.warning('get_images_link - %s', ex)
+            return []
+
+    def get_images_links_by_url(self, base_images_link: str):
+        """
+        Собирает все имеющиеся ссылки изображений со страницы изображений разыскиваемого.
+        Если страница изображений не получена, выбрасывается ValueError, а не возвращается пустой список,
+        чтобы разыскиваемый не считался собранным без изображений.
+        :param base_images_link: Ссылка на страницу изображений.
+        :return: Список строк.
+        """
+        images_links = self.get_json_page(base_images_link, stage='image_index')
+        if '_embedded' not in images_links:
+            raise ValueError(f'Страница изображений не получена - {base_images_link}')
+        images_links_list = images_links['_embedded']['images']
+        clean_links = []
+        if len(images_links_list) == 0:
             return []
+        else:
+            for link in images_links_list:
+                clean_links.append(link['_links']['self']['href'])
+            return clean_links
 
-    def save_rednotice_images(self, image_urls: list, rednotice_clean_data: dict):
+    def save_rednotice_images(self, image_urls: list, rednotice_clean_data: dict, overwrite: bool = False,
+                              notice_type: str = NOTICE_TYPE_RED):
         """
         Загружает и сохраняет изображения на определенного разыскиваемого.
-        Путь сохранения: './all_data/название_страны/имя_разыскиваемого/'
-        Название файла: 'имя_разыскиваемого.png'
+        Изображение загружается по частям во временный файл и передается в хранилище,
+        расширение определяется по содержимому.
+        Путь сохранения: './all_data/название_страны/имя_разыскиваемого/' (см. get_path)
+        Название файла: 'имя_разыскиваемого_номер.расширение'
+        Если часть изображений загрузить не удалось, остальные сохраняются и выбрасывается ValueError.
         :param image_urls: Ссылки на изображения.
         :param rednotice_clean_data: Подготовленные данные о разыскиваемом.
+        :param overwrite: Перезаписать уже существующие изображения.
+        :param notice_type: Тип объявления из NOTICE_TYPES.
         :return: Список строк.
         """
 
-        full_path_to_file = []
-        try:
-            rednotice_name = self.get_rednotice_full_name(rednotice_clean_data)
-            file_path = self.get_path(rednotice_clean_data)
-            for index, url in enumerate(image_urls):
-                data = requests.get(url).content
-                full_path_to_file.append(self.save_image(file_path, f'{rednotice_name}_{index+1}', data))
-            return full_path_to_file
-        except Exception as ex:
-            print(f'save_rednotice_images - {ex}')
+        image_files = [self.download_to_temp_file(url, f'{self.BASE_DIR_FOR_DATA}{self.IMAGE_TEMP_DIR_NAME}')
+                       for url in image_urls]
+        return self.store_rednotice_images(image_urls, image_files, rednotice_clean_data, overwrite, notice_type)
+
+    def store_rednotice_images(self, image_urls: list, image_files: list, rednotice_clean_data: dict,
+                               overwrite: bool = False, notice_type: str = NOTICE_TYPE_RED):
+        """
+        Передает загруженные во временные файлы изображения разыскиваемого в хранилище.
+        Если часть изображений загрузить не удалось, остальные сохраняются и выбрасывается ValueError.
+        :param image_urls: Ссылки на изображения.
+        :param image_files: Загруженные изображения (ImageFile) в том же порядке, None - не загружено.
+        :param rednotice_clean_data: Подготовленные данные о разыскиваемом.
+        :param overwrite: Перезаписать уже существующие изображения.
+        :param notice_type: Тип объявления из NOTICE_TYPES.
+        :return: Список строк.
+        """
+        full_path_to_file, failed_urls = [], []
+        rednotice_name = self.get_rednotice_full_name(rednotice_clean_data)
+        file_path = self.get_path(rednotice_clean_data, notice_type)
+        for index, (url, image_file) in enumerate(zip(image_urls, image_files)):
+            if image_file is None:
+                failed_urls.append(url)
+                continue
+            full_path_to_file.append(self.store_image(file_path, f'{rednotice_name}_{index+1}', image_file,
+                                                      overwrite))
+        if failed_urls:
+            raise ValueError(f'Не загружено изображений: {len(failed_urls)} из {len(image_urls)} - {failed_urls[0]}')
+        return full_path_to_file
+
+    def collect_rednotice_images(self, base_images_link: str, rednotice_clean_data: dict, overwrite: bool = False):
+        """
+        Задача этапа загрузки изображений: получает ссылки на изображения разыскиваемого и сохраняет их.
+        Ошибки передаются этапу загрузки и учитываются при отметке выполненных (commit_rednotices).
+        :param base_images_link: Ссылка на страницу изображений.
+        :param rednotice_clean_data: Подготовленные данные о разыскиваемом.
+        :param overwrite: Перезаписать уже существующие изображения.
+        :return: Список строк.
+        """
+        images_urls = self.get_images_links_by_url(base_images_link)
+        return self.save_rednotice_images(images_urls, rednotice_clean_data, overwrite,
+                                          self.get_notice_type(base_images_link))
+
+    @property
+    def image_pipeline(self):
+        """
+        Этап загрузки изображений с max_image_threads потоками, создается при первом обращении.
+        :return: Объект ImagePipeline.
+        """
+        if self._image_pipeline is None:
+            with self._image_pipeline_lock:
+                if self._image_pipeline is None:
+                    self._image_pipeline = ImagePipeline(self.collect_rednotice_images, self.max_image_threads)
+        return self._image_pipeline
+
+    def wait_images(self):
+        """
+        Ждет загрузки всех переданных этапу изображений.
+        :return: None.
+        """
+        if self._image_pipeline is not None:
+            self._image_pipeline.join()
+
+    def close(self):
+        """
+        Дожидается загрузки изображений, записи в хранилище и закрывает соединения.
+        :return: None.
+        """
+        with self._image_pipeline_lock:
+            image_pipeline, self._image_pipeline = self._image_pipeline, None
+        if image_pipeline is not None:
+            image_pipeline.close()
+        super().close()
+        notice_index, self._notice_index = self._notice_index, None
+        if notice_index is not None:
+            notice_index.close()
 
     @staticmethod
     def get_clean_dict_value(rednotice_clean_data: dict, key: str):
@@ -324,7 +986,7 @@ class InterpolParser(Parser):
                 value = rednotice_clean_data.get(key).strip().replace(' ', '_').replace('/', '_')
             return value
         except Exception as ex:
-            print('get_clean_dict_value - ', ex)
+            logger.warning('get_clean_dict_value - %s', ex)
 
     def get_rednotice_full_name(self, rednotice_clean_data: dict):
         """
@@ -339,21 +1001,22 @@ class InterpolParser(Parser):
             rednotice_name = f'{name}_{forename}_{entity_id}'
             return rednotice_name
         except Exception as ex:
-            print(f'get_full_name - {ex}')
+            logger.warning('get_full_name - %s', ex)
 
-    def get_path(self, rednotice_clean_data: dict):
+    def get_path(self, rednotice_clean_data: dict, notice_type: str = NOTICE_TYPE_RED):
         """
-        Собирает путь к папке сохранения данных о разыскиваемом.
+        Собирает путь к папке сохранения данных о разыскиваемом: 'каталог типа/название_страны/имя_разыскиваемого/'.
         :param rednotice_clean_data: Подготовленные данные о разыскиваемом.
+        :param notice_type: Тип объявления из NOTICE_TYPES.
         :return: Строка.
         """
         try:
             country_name = self.get_country_name(self.get_clean_dict_value(rednotice_clean_data, 'nationalities'))
             rednotice_name = self.get_rednotice_full_name(rednotice_clean_data)
-            file_path = f'{self.BASE_DIR_FOR_DATA}{country_name}{os.sep}{rednotice_name}{os.sep}'
+            file_path = f'{self.get_notice_type_dir(notice_type)}{country_name}{os.sep}{rednotice_name}{os.sep}'
             return file_path
         except Exception as ex:
-            print(f'get_path - {ex}')
+            logger.warning('get_path - %s', ex)
 
     @staticmethod
     def get_rednotice_clean_data(rednotice_data: dict):
@@ -368,7 +1031,7 @@ class InterpolParser(Parser):
             filtered = {k: v for k, v in rednotice_data.items() if v is not None}
             return filtered
         except Exception as ex:
-            print(f'get_rednotice_clean_data - {ex}')
+            logger.warning('get_rednotice_clean_data - %s', ex)
 
     def get_country_name(self, country_code):
         """
@@ -376,44 +1039,400 @@ class InterpolParser(Parser):
         :param country_code: Код страны.
         :return: Строка - название страны.
         """
-        countries = self.__get_all_country_codes()
-        for k, v in countries.items():
-            if v == country_code:
-                return k
+        return self.country_registry.get_country_name(country_code, self.fetch_country_codes)
 
-    def write_data_into_file(self, rednotice_clean_data: dict):
+    def write_data_into_file(self, rednotice_clean_data: dict, overwrite: bool = False,
+                             notice_type: str = NOTICE_TYPE_RED):
         """
-        Записывает данные о разыскиваемом в json файл.
+        Записывает данные о разыскиваемом в хранилище (по умолчанию json файл) через поток записи.
         :param rednotice_clean_data: Подготовленные данные о разыскиваемом.
+        :param overwrite: Перезаписать уже существующий файл.
+        :param notice_type: Тип объявления из NOTICE_TYPES.
         :return: Строка - путь к файлу
         """
         try:
             rednotice_name = self.get_rednotice_full_name(rednotice_clean_data)
-            file_path = self.get_path(rednotice_clean_data)
-            full_path_to_file = self.write_data_into_json(file_path, rednotice_name, rednotice_clean_data)
+            file_path = self.get_path(rednotice_clean_data, notice_type)
+            full_path_to_file = self.store_record(file_path, rednotice_name, rednotice_clean_data, overwrite)
+            if self.notice_index is not None:
+                self.notice_index.add(rednotice_clean_data, notice_type, full_path_to_file)
             return full_path_to_file
         except Exception as ex:
-            print(f'write_data_into_file - {ex}')
+            logger.warning('write_data_into_file - %s', ex)
 
-    def get_rednotice_data(self, rednotice_url: str):
+    def get_rednotice_data(self, rednotice_url: str, overwrite: bool = False):
         """
         Получение всех найденных данных о разыскиваемом. Сохранение файла и изображений в определенный каталог.
+        Изображения передаются отдельному этапу загрузки (image_pipeline) и сохраняются без ожидания.
         :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param overwrite: Перезаписать уже существующие файлы.
         :return: Словарь данных.
         """
-        print(rednotice_url)
-        red_notice_data = self.get_json_page(rednotice_url)
-        images_urls = self.get_images_links(red_notice_data)
+        if detail_logger.isEnabledFor(logging.DEBUG):
+            detail_logger.debug('notice', extra={'url': rednotice_url, 'stage': 'detail'})
+        red_notice_data = self.get_json_page(rednotice_url, stage='detail')
+        if not red_notice_data.get('entity_id'):
+            # Страница не получена (например, после истечения общего срока сбора), пустые данные не записываются.
+            return red_notice_data
+        base_images_link = red_notice_data.get('_links', {}).get('images', {}).get('href')
         clean_rednotice_data = self.get_rednotice_clean_data(red_notice_data)
-        self.write_data_into_file(clean_rednotice_data)
-        self.save_rednotice_images(images_urls, clean_rednotice_data)
+        notice_type = self.get_notice_type(rednotice_url)
+        self.write_data_into_file(clean_rednotice_data, overwrite, notice_type)
+        if base_images_link:
+            self.image_pipeline.submit(base_images_link, clean_rednotice_data, overwrite,
+                                       key=self.get_path(clean_rednotice_data, notice_type))
         return red_notice_data
 
-    def get_all_rednotice_data(self):
+    @property
+    def work_queue(self):
+        """
+        Постоянная очередь задач сбора (work_queue.sqlite3).
+        :return: Объект WorkQueue.
+        """
+        if self._work_queue is None:
+            self._work_queue = WorkQueue(f'{self.BASE_DIR_FOR_DATA}{self.WORK_QUEUE_FILE_NAME}.sqlite3',
+                                         max_attempts=self.max_task_attempts)
+        return self._work_queue
+
+    @property
+    def notice_index(self):
+        """
+        Индекс сохраненных объявлений (notice_index.sqlite3), создается при первом обращении.
+        :return: Объект NoticeIndex или None, если индекс отключен.
+        """
+        if self._notice_index is None and self._notice_index_enabled:
+            with self._partition_lock:
+                if self._notice_index is None:
+                    self._notice_index = NoticeIndex(f'{self.BASE_DIR_FOR_DATA}{self.NOTICE_INDEX_FILE_NAME}.sqlite3')
+        return self._notice_index
+
+    def get_notice_type_by_location(self, location: str):
+        """
+        :param location: Место записи данных: путь к json файлу или ключ хранилища ('[тип/]Страна/Имя/файл').
+        :return: Тип объявления из NOTICE_TYPES.
+        """
+        parts = [part for part in location.replace(os.sep, '/').split('/') if part]
+        if len(parts) >= 4:
+            for notice_type, options in self.NOTICE_TYPES.items():
+                if options['dir'] and parts[-4] == options['dir']:
+                    return notice_type
+        return self.NOTICE_TYPE_RED
+
+    def rebuild_notice_index(self):
+        """
+        Строит индекс объявлений заново по данным в хранилище, например для данных, собранных до появления индекса,
+        или после объединения шардов.
+        :return: Количество проиндексированных объявлений.
+        """
+        self.flush_storage()
+        notice_index = self.notice_index
+        notice_index.clear()
+        notice_manifests = {notice_type: self.get_manifest(notice_type) for notice_type in self.NOTICE_TYPES}
+        removed_ids = {notice_type: [] for notice_type in self.NOTICE_TYPES}
+        for location, record in self.storage.iter_records():
+            notice_type = self.get_notice_type_by_location(location)
+            notice_index.add(record, notice_type, location)
+            known = notice_manifests[notice_type].notices.get(str(record.get('entity_id')))
+            if known is not None and known.get('status') == NoticeManifest.STATUS_REMOVED:
+                removed_ids[notice_type].append(record['entity_id'])
+        for notice_type, entity_ids in removed_ids.items():
+            if entity_ids:
+                notice_index.mark_removed(notice_type, entity_ids)
+        return notice_index.count(include_removed=True)
+
+    def collect_partition(self, partition_url: str, payload=None):
+        """
+        Задача очереди для ссылки запроса поиска: получает выдачу и добавляет в очередь ссылки на разыскиваемых.
+        Данные разыскиваемых со страницы поиска нужны только инкрементальному сбору (для сравнения),
+        в обычном сборе страница разбирается потоково и из неё берутся только ссылки.
+        :param partition_url: Ссылка запроса поиска.
+        :param payload: Данные задачи (не используются).
+        :return: Список ссылок на разыскиваемых.
+        """
+        incremental = self.work_queue.get_meta('incremental') == '1'
+        rednotice_listing = self.prepared_rednotice_listing.pop(partition_url, None)
+        if rednotice_listing is None and not incremental:
+            total, links = self.get_rednotice_links(
+                self.get_binary_page(self.get_probe_url(partition_url), stage='listing'))
+            if total is None:
+                self.listing_complete = False
+                raise ValueError('Страница поиска не получена.')
+            rednotice_urls = [url for url, _ in links]
+            self.work_queue.add(WorkQueue.KIND_NOTICE, rednotice_urls)
+            if self.partition_plan.update_partition(partition_url, total):
+                rednotice_urls += self.resplit_partition(partition_url)
+            return rednotice_urls
+        if rednotice_listing is None:
+            page = self.get_full_page(partition_url)
+            if 'total' not in page:
+                raise ValueError('Страница поиска не получена.')
+            truncated = self.partition_plan.update_partition(partition_url, self.get_listing_result_number(page))
+            rednotice_listing = self.get_rednotice_listing(page)
+        else:
+            truncated = False
+        if incremental:
+            payloads = {url: json.dumps(item, ensure_ascii=False) for url, item in rednotice_listing.items()}
+        else:
+            payloads = {}
+        self.work_queue.add(WorkQueue.KIND_NOTICE, list(rednotice_listing), payloads)
+        if truncated:
+            return list(rednotice_listing) + self.resplit_partition(partition_url)
+        return list(rednotice_listing)
+
+    def resplit_partition(self, partition_url: str):
+        """
+        Выдача запроса поиска оказалась больше MAX_SEARCH_RESULT_DISPLAY (данные на сайте изменились после
+        разделения). Запрос по стране, к которому относится ссылка, разделяется заново - делится только
+        изменившаяся часть (см. partition_url), и выдача новых ссылок запросов поиска собирается сразу.
+        :param partition_url: Переполненная ссылка запроса поиска.
+        :return: Список ссылок на разыскиваемых.
+        """
+        country_url = self.partition_plan.get_country_url(partition_url)
+        partition_logger.warning('Больше %s результатов, запрос %s разделяется заново.',
+                                 self.MAX_SEARCH_RESULT_DISPLAY, country_url,
+                                 extra={'url': partition_url, 'stage': 'partition'})
+        pages = self.separate_url_with_pages(country_url)
+        new_urls = [url for url in pages if url != partition_url]
+        for url in new_urls:
+            if pages[url] is not None:
+                self.prepared_rednotice_listing[url] = self.get_rednotice_listing(pages[url])
+        self.work_queue.add(WorkQueue.KIND_PARTITION, new_urls)
+        rednotice_urls = []
+        for url, payload in self.work_queue.claim_urls(WorkQueue.KIND_PARTITION, new_urls):
+            try:
+                rednotice_urls += self.collect_partition(url, payload)
+                self.work_queue.done(WorkQueue.KIND_PARTITION, url)
+            except Exception as ex:
+                partition_logger.error('failed', extra={'url': url, 'stage': 'partition', 'error': str(ex)})
+                self.work_queue.failed(WorkQueue.KIND_PARTITION, url, ex)
+        return rednotice_urls
+
+    def collect_rednotice(self, rednotice_url: str, payload=None):
+        """
+        Задача очереди для ссылки на разыскиваемого.
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param payload: Данные разыскиваемого со страницы поиска в формате json.
+        :return: Словарь данных.
+        """
+        if self.work_queue.get_meta('incremental') == '1':
+            red_notice_data = self.get_incremental_rednotice_data(rednotice_url, json.loads(payload or '{}'))
+        else:
+            red_notice_data = self.get_rednotice_data(rednotice_url, overwrite=not self.use_saved_state)
+        if not red_notice_data or not red_notice_data.get('entity_id'):
+            raise ValueError('Данные о разыскиваемом не получены.')
+        return red_notice_data
+
+    def run_country_stage(self, task: tuple):
+        """
+        Этап конвейера: разделяет запрос по стране и сразу передает принятые ссылки запросов поиска дальше.
+        Страницы, полученные при разделении, запоминаются в prepared_rednotice_listing и повторно не запрашиваются.
+        Если разделение не удалось (проверочный запрос не выполнен), задача страны отмечается неудачной
+        и повторяется через resume().
+        :param task: Пара (ссылка общего запроса, данные задачи).
+        :return: Список пар (ссылка запроса поиска, данные задачи).
+        """
+        country_url, _ = task
+        if self.request_policy.is_expired():
+            return []
+        try:
+            pages = self.separate_url_with_pages(country_url)
+        except Exception as ex:
+            if self.request_policy.is_expired():
+                return []
+            partition_logger.error('failed', extra={'url': country_url, 'stage': 'country', 'error': str(ex)})
+            self.work_queue.failed(WorkQueue.KIND_COUNTRY, country_url, ex)
+            return []
+        for url, page in pages.items():
+            if page is not None:
+                self.prepared_rednotice_listing[url] = self.get_rednotice_listing(page)
+        self.work_queue.add(WorkQueue.KIND_PARTITION, list(pages))
+        self.work_queue.done(WorkQueue.KIND_COUNTRY, country_url)
+        return self.work_queue.claim_urls(WorkQueue.KIND_PARTITION, list(pages))
+
+    def run_partition_stage(self, task: tuple):
+        """
+        Этап конвейера: получает выдачу запроса поиска и сразу передает найденных разыскиваемых дальше.
+        :param task: Пара (ссылка запроса поиска, данные задачи).
+        :return: Список пар (ссылка на разыскиваемого, данные со страницы поиска в формате json).
+        """
+        partition_url, payload = task
+        if self.request_policy.is_expired():
+            return []
+        try:
+            rednotice_urls = self.collect_partition(partition_url, payload)
+        except Exception as ex:
+            if self.request_policy.is_expired():
+                return []
+            partition_logger.error('failed', extra={'url': partition_url, 'stage': 'partition', 'error': str(ex)})
+            self.work_queue.failed(WorkQueue.KIND_PARTITION, partition_url, ex)
+            return []
+        if self.request_policy.is_expired():
+            # Часть страниц могла быть не получена после истечения срока, задача остается для resume().
+            return []
+        tasks = self.work_queue.claim_urls(WorkQueue.KIND_NOTICE, rednotice_urls)
+        if self.work_queue.get_meta('incremental') == '1':
+            tasks = self.select_incremental_rednotices(tasks)
+        self.work_queue.done(WorkQueue.KIND_PARTITION, partition_url)
+        return tasks
+
+    def run_notice_stage(self, task: tuple):
+        """
+        Этап конвейера: собирает данные о разыскиваемом. Изображения загружаются отдельно (image_pipeline).
+        :param task: Пара (ссылка на разыскиваемого, данные со страницы поиска в формате json).
+        :return: Список из тройки (ссылка на разыскиваемого, данные со страницы поиска, путь к каталогу данных),
+        если данные получены.
+        """
+        rednotice_url, payload = task
+        if self.request_policy.is_expired():
+            return []
+        try:
+            red_notice_data = self.collect_rednotice(rednotice_url, payload)
+            if self.request_policy.is_expired():
+                # Данные или изображения могли быть получены не полностью, задача остается для resume().
+                return []
+            return [(rednotice_url, payload, self.get_path(red_notice_data, self.get_notice_type(rednotice_url)))]
+        except Exception as ex:
+            if self.request_policy.is_expired():
+                return []
+            detail_logger.error('failed', extra={'url': rednotice_url, 'stage': 'notice', 'error': str(ex)})
+            self.work_queue.failed(WorkQueue.KIND_NOTICE, rednotice_url, ex)
+            return []
+
+    def run_commit_stage(self, task: tuple):
+        """
+        Этап конвейера (один поток): копит собранных разыскиваемых и отмечает их выполненными пачками.
+        :param task: Тройка (ссылка на разыскиваемого, данные со страницы поиска, путь к каталогу данных).
+        :return: None.
+        """
+        self._commit_tasks.append(task)
+        if len(self._commit_tasks) >= self.stage_threads[WorkQueue.KIND_NOTICE] * 20:
+            self.commit_rednotices()
+
+    def commit_rednotices(self):
+        """
+        Отмечает выполненными накопленных разыскиваемых.
+        Задача считается выполненной только после загрузки изображений и записи данных в хранилище.
+        Разыскиваемые, данные или изображения которых сохранить не удалось, отмечаются неудачными
+        и повторяются через resume().
+        :return: None.
+        """
+        tasks, self._commit_tasks = self._commit_tasks, []
+        self.wait_images()
+        self.flush_storage()
+        file_paths = [file_path for _, _, file_path in tasks]
+        failures = self.pop_storage_failures(file_paths)
+        if self._image_pipeline is not None:
+            failures.update(self._image_pipeline.pop_failures(file_paths))
+        incremental = self.work_queue.get_meta('incremental') == '1'
+        for rednotice_url, payload, file_path in tasks:
+            if file_path in failures:
+                detail_logger.error('failed', extra={'url': rednotice_url, 'stage': 'write',
+                                                     'error': str(failures[file_path])})
+                self.work_queue.failed(WorkQueue.KIND_NOTICE, rednotice_url, failures[file_path])
+                if incremental:
+                    self.get_manifest(self.get_notice_type(rednotice_url)).mark_failed(
+                        rednotice_url, json.loads(payload or '{}'))
+        self.work_queue.done_many(WorkQueue.KIND_NOTICE, [rednotice_url for rednotice_url, _, file_path in tasks
+                                                          if file_path not in failures])
+        if incremental:
+            self.save_manifests()
+
+    def run_work_queue(self):
+        """
+        Выполняет сбор по очереди задач потоковым конвейером:
+        разделение запросов по странам -> страницы поиска -> данные о разыскиваемых -> отметка выполненных.
+        Этапы работают одновременно и соединены ограниченными очередями, поэтому данные о разыскиваемых
+        начинают собираться сразу после получения первой страницы поиска.
+        Незавершенные задачи из очереди (после resume) передаются сразу своим этапам.
+        С запуска отсчитывается общий срок сбора (request_policy.run_timeout). После его истечения этапы
+        пропускают оставшиеся задачи, не отмечая их неудачными, и их можно продолжить через resume().
+        :return: Словарь {'Вид задачи': {'Статус': количество}}.
+        """
+        self.request_policy.start()
+        queue = self.work_queue
+        incremental = queue.get_meta('incremental') == '1'
+        file_name = self.PREPARED_URLS_FILE_NAME
+        fixed = self.is_prepared_urls_fixed()
+        seeds = {}
+        if fixed:
+            if not queue.has_tasks(WorkQueue.KIND_PARTITION):
+                queue.add(WorkQueue.KIND_PARTITION,
+                          set(self.read_data_from_csv_to_list(f'{self.BASE_DIR_FOR_DATA}{file_name}.csv')))
+                self.load_prepared_listing()
+        else:
+            if not queue.has_tasks(WorkQueue.KIND_COUNTRY):
+                # Запросы по странам проверяются каждый запуск, по плану делятся только изменившиеся.
+                queue.add(WorkQueue.KIND_COUNTRY, self.select_shard_urls(self.get_all_country_urls()))
+            country_tasks = queue.claim(WorkQueue.KIND_COUNTRY)
+            if country_tasks:
+                seeds[self.STAGE_COUNTRY] = country_tasks
+        seeds[WorkQueue.KIND_PARTITION] = queue.claim(WorkQueue.KIND_PARTITION)
+        seeds[WorkQueue.KIND_NOTICE] = queue.claim(WorkQueue.KIND_NOTICE)
+        if incremental:
+            seeds[WorkQueue.KIND_NOTICE] = self.select_incremental_rednotices(seeds[WorkQueue.KIND_NOTICE])
+
+        pipeline = CrawlPipeline()
+        pipeline.add_stage(self.STAGE_COUNTRY, self.run_country_stage, self.stage_threads[self.STAGE_COUNTRY])
+        for kind, function in ((WorkQueue.KIND_PARTITION, self.run_partition_stage),
+                               (WorkQueue.KIND_NOTICE, self.run_notice_stage)):
+            pipeline.add_stage(kind, function, self.stage_threads[kind], self.stage_threads[kind] * 20)
+        pipeline.add_stage(self.STAGE_COMMIT, self.run_commit_stage, 1, self.stage_threads[WorkQueue.KIND_NOTICE] * 20)
+        pipeline.run(seeds)
+        self.commit_rednotices()
+
+        if self.STAGE_COUNTRY in seeds:
+            self.save_partition_hints()
+            logger.info('Проверочных запросов: %s', sum(self.partition_probe_counts.values()))
+        if not fixed:
+            self.save_partition_plan()
+            # Переполненные ссылки, разделенные заново во время сбора, в план и в csv уже не входят.
+            self.write_prepared_urls([url for url in queue.get_urls(WorkQueue.KIND_PARTITION)
+                                      if self.partition_plan.get_country_url(url) is not None])
+        self.write_data_into_csv(self.BASE_DIR_FOR_DATA, 'all_collected_rednotice_urls',
+                                 queue.get_urls(WorkQueue.KIND_NOTICE))
+        if self.request_policy.is_expired():
+            # Выдача поиска могла быть получена не полностью, пропавшие в этом запуске не отмечаются.
+            self.listing_complete = False
+            logger.warning('Общий срок сбора истек, оставшиеся задачи можно продолжить через resume().')
+        if incremental:
+            if any(queue.get_stats(kind).get(WorkQueue.FAILED)
+                   for kind in (WorkQueue.KIND_COUNTRY, WorkQueue.KIND_PARTITION)):
+                self.listing_complete = False
+            payloads = queue.get_payloads(WorkQueue.KIND_NOTICE)
+            listing = {url: json.loads(payload or '{}') for url, payload in payloads.items()}
+            for notice_type, rednotice_listing in self.split_by_notice_type(listing).items():
+                self.mark_removed_rednotices(rednotice_listing, notice_type)
+            self.save_manifests()
+
+        stats = {kind: queue.get_stats(kind)
+                 for kind in (WorkQueue.KIND_COUNTRY, WorkQueue.KIND_PARTITION, WorkQueue.KIND_NOTICE)}
+        logger.info('Очередь задач: %s', stats)
+        return stats
+
+    def get_all_rednotice_data(self, incremental: bool = False):
         """
         Прогонка всех ссылок через функцию получения данных.
+        Начинает новый сбор: очередь задач очищается, ход сбора записывается в неё,
+        и прерванный сбор можно продолжить методом resume.
+        :param incremental: Инкрементальный сбор - выдача поиска запрашивается заново и сравнивается
+        со списком известных разыскиваемых, данные и изображения собираются только для новых и изменившихся.
         :return: None.
         """
-        all_rednotice_urls = self.get_all_rednotice_urls()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-            executor.map(self.get_rednotice_data, all_rednotice_urls)
+        queue = self.work_queue
+        queue.clear()
+        queue.set_meta('incremental', '1' if incremental else '0')
+        # Неполная выдача прошлого сбора этим объектом не мешает отмечать пропавших в новом.
+        self.listing_complete = True
+        self.run_work_queue()
+
+    def resume(self):
+        """
+        Продолжает прерванный сбор: задачи, выполнявшиеся в момент остановки, и неудачные задачи
+        с оставшимися попытками возвращаются в очередь, выполненные не повторяются.
+        :return: None.
+        """
+        returned_number = self.work_queue.resume()
+        logger.info('Возвращено в очередь задач: %s', returned_number)
+        # Полнота выдачи определяется заново по задачам очереди (см. run_work_queue).
+        self.listing_complete = True
+        self.run_work_queue()
@@ -0,0 +1,274 @@
+import bisect
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+from CrawlLogging import get_logger
+
+logger = get_logger('metrics')
+
+
+class Metrics:
+    """
+    Метрики сбора: счетчики, показатели "сейчас выполняется" и гистограммы времени по этапам.
+    Каждый поток пишет в свой шард (словарь), поэтому увеличение счетчика не требует блокировки.
+    При чтении шарды всех потоков суммируются. Значения можно периодически записывать
+    в json и в текстовый формат Prometheus из отдельного потока.
+    Счетчики: requests (stage, status), errors (stage), bytes (direction: in - получено, out - отправлено),
+    in_flight (stage), cache (stage, result: hit, revalidated, evicted, miss). Гистограмма: stage_seconds (stage).
+    """
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    GAUGES = ('in_flight',)
+    PROMETHEUS_PREFIX = 'interpol_'
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._reporter = None
+        self._reporter_stop = threading.Event()
+
+    def _get_shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = collections.defaultdict(float)
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Увеличивает счетчик (для показателей in_flight значение может быть отрицательным).
+        :param name: Название счетчика.
+        :param value: Значение.
+        :param labels: Метки, например stage='detail'.
+        :return: None.
+        """
+        self._get_shard()[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Добавляет время выполнения в гистограмму этапа.
+        :param stage: Название этапа.
+        :param seconds: Время в секундах.
+        :return: None.
+        """
+        shard = self._get_shard()
+        labels = (('stage', stage),)
+        shard[('stage_seconds_bucket', labels + (('le', bisect.bisect_left(self.LATENCY_BUCKETS, seconds)),))] += 1
+        shard[('stage_seconds_sum', labels)] += seconds
+        shard[('stage_seconds_count', labels)] += 1
+
+    @contextlib.contextmanager
+    def track(self, stage: str):
+        """
+        Учитывает выполнение блока в in_flight и в гистограмме времени этапа.
+        :param stage: Название этапа.
+        """
+        self.inc('in_flight', stage=stage)
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - started_at)
+            self.inc('in_flight', -1, stage=stage)
+
+    def get_values(self):
+        """
+        :return: Словарь {(название, метки): значение}, просуммированный по всем потокам.
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        values = collections.defaultdict(float)
+        for shard in shards:
+            for key, value in list(shard.items()):
+                values[key] += value
+        return values
+
+    def get_counter(self, name: str, **labels):
+        """
+        :param name: Название счетчика.
+        :param labels: Метки. Без меток - сумма по всем меткам.
+        :return: Значение счетчика.
+        """
+        labels = tuple(sorted(labels.items()))
+        total = 0
+        for (key_name, key_labels), value in self.get_values().items():
+            if key_name == name and set(labels) <= set(key_labels):
+                total += value
+        return total
+
+    @staticmethod
+    def _get_histograms(values: dict):
+        histograms = collections.defaultdict(lambda: {'buckets': collections.Counter(), 'sum': 0.0, 'count': 0})
+        for (name, labels), value in values.items():
+            labels = dict(labels)
+            if name == 'stage_seconds_bucket':
+                histograms[labels['stage']]['buckets'][labels['le']] += value
+            elif name == 'stage_seconds_sum':
+                histograms[labels['stage']]['sum'] += value
+            elif name == 'stage_seconds_count':
+                histograms[labels['stage']]['count'] += value
+        return histograms
+
+    def get_quantile(self, buckets: dict, count: float, quantile: float, digits: int = 4):
+        """
+        Оценивает квантиль по гистограмме (линейно внутри корзины).
+        :param buckets: Словарь {номер корзины: количество}.
+        :param count: Общее количество.
+        :param quantile: Квантиль от 0 до 1.
+        :param digits: Количество знаков после запятой.
+        :return: Время в секундах или None, если наблюдений нет.
+        """
+        if not count:
+            return None
+        rank = quantile * count
+        cumulative = 0
+        for index in range(len(self.LATENCY_BUCKETS) + 1):
+            in_bucket = buckets.get(index, 0)
+            if in_bucket and cumulative + in_bucket >= rank:
+                lower = self.LATENCY_BUCKETS[index - 1] if index else 0.0
+                if index == len(self.LATENCY_BUCKETS):
+                    return lower
+                return round(lower + (self.LATENCY_BUCKETS[index] - lower) * (rank - cumulative) / in_bucket, digits)
+            cumulative += in_bucket
+        return self.LATENCY_BUCKETS[-1]
+
+    def get_latency(self, quantile: float, stages=None):
+        """
+        Оценивает квантиль времени по объединенной гистограмме нескольких этапов.
+        :param quantile: Квантиль от 0 до 1.
+        :param stages: Список этапов. None - все этапы.
+        :return: Время в секундах или None, если наблюдений нет.
+        """
+        buckets, count = collections.Counter(), 0
+        for stage, histogram in self._get_histograms(self.get_values()).items():
+            if stages is None or stage in stages:
+                buckets.update(histogram['buckets'])
+                count += histogram['count']
+        return self.get_quantile(buckets, count, quantile)
+
+    def snapshot(self):
+        """
+        :return: Словарь со всеми метриками: общие показатели, счетчики по меткам и время этапов (p50, p99).
+        """
+        values = self.get_values()
+        uptime = time.time() - self.started_at
+        counters = collections.defaultdict(dict)
+        for (name, labels), value in sorted(values.items()):
+            if not name.startswith('stage_seconds'):
+                counters[name][','.join(f'{k}={v}' for k, v in labels) or 'total'] = value
+        stages = {}
+        for stage, histogram in sorted(self._get_histograms(values).items()):
+            count = histogram['count']
+            stages[stage] = {
+                'count': int(count), 'sum': round(histogram['sum'], 3),
+                'avg': round(histogram['sum'] / count, 4) if count else None,
+                'p50': self.get_quantile(histogram['buckets'], count, 0.5),
+                'p99': self.get_quantile(histogram['buckets'], count, 0.99)}
+        requests_number = sum(value for (name, _), value in values.items() if name == 'requests')
+        return {'uptime': round(uptime, 3), 'requests': int(requests_number),
+                'requests_per_second': round(requests_number / uptime, 2) if uptime else None,
+                'counters': dict(counters), 'stages': stages}
+
+    def to_json(self):
+        """
+        :return: Строка json со снимком метрик.
+        """
+        return json.dumps(self.snapshot(), indent=4, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """
+        :return: Строка в текстовом формате Prometheus.
+        """
+        values = self.get_values()
+        lines = []
+        counters = collections.defaultdict(list)
+        for (name, labels), value in sorted(values.items()):
+            if not name.startswith('stage_seconds'):
+                counters[name].append((labels, value))
+        for name, samples in counters.items():
+            metric_name = f'{self.PROMETHEUS_PREFIX}{name}' + ('' if name in self.GAUGES else '_total')
+            lines.append(f"# TYPE {metric_name} {'gauge' if name in self.GAUGES else 'counter'}")
+            for labels, value in samples:
+                lines.append(f'{metric_name}{self._format_labels(labels)} {self._format_value(value)}')
+        metric_name = f'{self.PROMETHEUS_PREFIX}stage_seconds'
+        histograms = self._get_histograms(values)
+        if histograms:
+            lines.append(f'# TYPE {metric_name} histogram')
+        for stage, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for index, bound in enumerate(self.LATENCY_BUCKETS + (None,)):
+                cumulative += histogram['buckets'].get(index, 0)
+                labels = (('stage', stage), ('le', '+Inf' if bound is None else f'{bound:g}'))
+                lines.append(f'{metric_name}_bucket{self._format_labels(labels)} {self._format_value(cumulative)}')
+            labels = self._format_labels((('stage', stage),))
+            lines.append(f"{metric_name}_sum{labels} {self._format_value(histogram['sum'])}")
+            lines.append(f"{metric_name}_count{labels} {self._format_value(histogram['count'])}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _format_value(value: float):
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+    def dump(self, directory: str, file_name: str = 'metrics'):
+        """
+        Записывает метрики в 'file_name.json' и 'file_name.prom' (через временный файл с заменой).
+        :param directory: Каталог.
+        :param file_name: Название файлов без расширения.
+        :return: Список путей к файлам.
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        paths = []
+        for extension, text in (('json', self.to_json()), ('prom', self.to_prometheus())):
+            path = os.path.join(directory, f'{file_name}.{extension}')
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+                file.write(text)
+            os.replace(f'{path}.tmp', path)
+            paths.append(path)
+        return paths
+
+    def start_reporter(self, directory: str, interval: float = 10.0, file_name: str = 'metrics'):
+        """
+        Запускает поток, записывающий метрики каждые interval секунд.
+        :param directory: Каталог.
+        :param interval: Интервал в секундах.
+        :param file_name: Название файлов без расширения.
+        :return: None.
+        """
+        if self._reporter is not None:
+            return
+        self._reporter_stop.clear()
+
+        def report():
+            while not self._reporter_stop.wait(interval):
+                try:
+                    self.dump(directory, file_name)
+                except Exception as ex:
+                    logger.warning('Metrics - %s', ex)
+            self.dump(directory, file_name)
+
+        self._reporter = threading.Thread(target=report, daemon=True, name='MetricsReporter')
+        self._reporter.start()
+
+    def stop_reporter(self):
+        """
+        Останавливает поток записи метрик, записав их последний раз.
+        :return: None.
+        """
+        if self._reporter is None:
+            return
+        self._reporter_stop.set()
+        self._reporter.join()
+        self._reporter = None
@@ -0,0 +1,362 @@
+import argparse
+import datetime
+import json
+import os
+
+try:
+    import numpy
+except ImportError:  # Выгрузка в столбцы и отчеты необязательны, сбор работает и без numpy.
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet необязателен, без pyarrow данные выгружаются в npz.
+    pyarrow = None
+
+from CrawlLogging import get_logger, setup_logging
+from NoticeIndex import NoticeIndex
+
+logger = get_logger('export')
+
+
+class NoticeExporter:
+    """
+    Выгрузка сохраненных объявлений в столбцы с типами: строки (entity_id, имя), столбцы со словарем
+    (тип объявления, гражданство, пол, страна ордера - коды int16 и список значений, -1 - нет значения),
+    дата рождения (datetime64[D], NaT - нет значения), год объявления из entity_id, количество ордеров, рост и вес.
+    Записи читаются из хранилища по одной и переводятся в массивы пачками по chunk_size, поэтому все записи
+    никогда не держатся в памяти словарями. Parquet (при наличии pyarrow) пишется группой строк на каждую пачку,
+    npz - одним файлом по окончании.
+    """
+    STRING_COLUMNS = ('entity_id', 'name', 'forename')
+    CATEGORY_COLUMNS = ('notice_type', 'nationality', 'sex', 'issuing_country')
+    NUMBER_COLUMNS = {'notice_year': 'int16', 'warrant_count': 'int16', 'height': 'float32', 'weight': 'float32'}
+    DATE_COLUMNS = ('birth_date',)
+    FORMAT_PARQUET = 'parquet'
+    FORMAT_NPZ = 'npz'
+    CATEGORIES_PREFIX = 'categories__'
+    DEFAULT_CHUNK_SIZE = 10000
+
+    def __init__(self, parser, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param parser: Объект InterpolParser, из хранилища которого читаются записи.
+        :param chunk_size: Количество записей в пачке.
+        """
+        if numpy is None:
+            raise ImportError('Для выгрузки в столбцы необходим пакет numpy (pip install numpy).')
+        self.parser = parser
+        self.chunk_size = chunk_size
+        self.categories = {column: {} for column in self.CATEGORY_COLUMNS}
+
+    def encode(self, column: str, value):
+        """
+        :param column: Столбец из CATEGORY_COLUMNS.
+        :param value: Значение.
+        :return: Код значения в словаре столбца, -1 - нет значения.
+        """
+        if value is None:
+            return -1
+        codes = self.categories[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def get_categories(self, column: str):
+        """
+        :param column: Столбец из CATEGORY_COLUMNS.
+        :return: Список значений столбца по порядку кодов.
+        """
+        return list(self.categories[column])
+
+    @staticmethod
+    def get_number(value):
+        """
+        :param value: Значение из данных о разыскиваемом.
+        :return: Число или numpy.nan, если значения нет.
+        """
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return numpy.nan
+
+    def get_row(self, record: dict, notice_type: str):
+        """
+        Выбирает из данных о разыскиваемом значения столбцов.
+        :param record: Подготовленные данные о разыскиваемом.
+        :param notice_type: Тип объявления.
+        :return: Кортеж значений в порядке STRING_COLUMNS, CATEGORY_COLUMNS, NUMBER_COLUMNS, DATE_COLUMNS.
+        """
+        entity_id = str(record.get('entity_id') or '')
+        year = entity_id.split('/', 1)[0]
+        warrants = record.get('arrest_warrants') or []
+        nationalities = record.get('nationalities') or [None]
+        issuing_country = next((warrant.get('issuing_country_id') for warrant in warrants
+                                if warrant.get('issuing_country_id')), None)
+        return (entity_id, record.get('name') or '', record.get('forename') or '',
+                self.encode('notice_type', notice_type), self.encode('nationality', nationalities[0]),
+                self.encode('sex', record.get('sex_id')), self.encode('issuing_country', issuing_country),
+                int(year) if year.isdigit() and len(year) == 4 else -1, len(warrants),
+                self.get_number(record.get('height')), self.get_number(record.get('weight')),
+                NoticeIndex.get_birth_date(record.get('date_of_birth'))[0] or 'NaT')
+
+    def to_columns(self, rows: list):
+        """
+        Переводит пачку строк в массивы numpy.
+        :param rows: Список кортежей (см. get_row).
+        :return: Словарь {'Столбец': массив}.
+        """
+        names = self.STRING_COLUMNS + self.CATEGORY_COLUMNS + tuple(self.NUMBER_COLUMNS) + self.DATE_COLUMNS
+        values = dict(zip(names, zip(*rows)))
+        columns = {name: numpy.array(values[name], dtype=str) for name in self.STRING_COLUMNS}
+        columns.update({name: numpy.array(values[name], dtype='int16') for name in self.CATEGORY_COLUMNS})
+        columns.update({name: numpy.array(values[name], dtype=dtype) for name, dtype in self.NUMBER_COLUMNS.items()})
+        columns.update({name: numpy.array(values[name], dtype='datetime64[D]') for name in self.DATE_COLUMNS})
+        return columns
+
+    def iter_chunks(self):
+        """
+        Читает записи хранилища и отдает их пачками столбцов.
+        :return: Генератор словарей {'Столбец': массив}.
+        """
+        self.parser.flush_storage()
+        rows = []
+        for location, record in self.parser.storage.iter_records():
+            rows.append(self.get_row(record, self.parser.get_notice_type_by_location(location)))
+            if len(rows) >= self.chunk_size:
+                yield self.to_columns(rows)
+                rows = []
+        if rows:
+            yield self.to_columns(rows)
+
+    def to_arrow(self, columns: dict):
+        """
+        :param columns: Пачка столбцов.
+        :return: Объект pyarrow.Table. Столбцы со словарем записываются как dictionary (коды int16).
+        """
+        arrays = {}
+        for name, values in columns.items():
+            if name in self.CATEGORY_COLUMNS:
+                indices = pyarrow.array(values, type=pyarrow.int16(), mask=values < 0)
+                arrays[name] = pyarrow.DictionaryArray.from_arrays(
+                    indices, pyarrow.array(self.get_categories(name), type=pyarrow.string()))
+            elif name in self.DATE_COLUMNS:
+                arrays[name] = pyarrow.array(values, type=pyarrow.date32(), mask=numpy.isnat(values))
+            else:
+                arrays[name] = pyarrow.array(values)
+        return pyarrow.table(arrays)
+
+    def export(self, file_path: str, export_format: str = None):
+        """
+        Выгружает все записи хранилища.
+        :param file_path: Путь к файлу.
+        :param export_format: FORMAT_PARQUET или FORMAT_NPZ. None - parquet, если установлен pyarrow.
+        :return: Количество выгруженных записей.
+        """
+        export_format = export_format or (self.FORMAT_PARQUET if pyarrow is not None else self.FORMAT_NPZ)
+        if export_format == self.FORMAT_PARQUET and pyarrow is None:
+            raise ImportError('Для выгрузки в parquet необходим пакет pyarrow (pip install pyarrow).')
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        number = 0
+        if export_format == self.FORMAT_PARQUET:
+            writer = None
+            try:
+                for columns in self.iter_chunks():
+                    table = self.to_arrow(columns)
+                    if writer is None:
+                        writer = pyarrow.parquet.ParquetWriter(f'{file_path}.tmp', table.schema)
+                    writer.write_table(table)
+                    number += table.num_rows
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is None:
+                return 0
+        else:
+            chunks = []
+            for columns in self.iter_chunks():
+                chunks.append(columns)
+                number += len(columns['entity_id'])
+            if not chunks:
+                return 0
+            arrays = {name: numpy.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+            arrays.update({f'{self.CATEGORIES_PREFIX}{name}': numpy.array(self.get_categories(name), dtype=str)
+                           for name in self.CATEGORY_COLUMNS})
+            with open(f'{file_path}.tmp', 'wb') as file:
+                numpy.savez_compressed(file, **arrays)
+        os.replace(f'{file_path}.tmp', file_path)
+        return number
+
+    @classmethod
+    def load(cls, file_path: str):
+        """
+        Читает выгрузку в массивы numpy.
+        :param file_path: Путь к файлу parquet или npz.
+        :return: Пара (словарь {'Столбец': массив}, словарь {'Столбец со словарем': массив значений}).
+        """
+        if numpy is None:
+            raise ImportError('Для чтения выгрузки необходим пакет numpy (pip install numpy).')
+        columns, categories = {}, {}
+        if file_path.endswith(f'.{cls.FORMAT_NPZ}'):
+            with numpy.load(file_path) as arrays:
+                for name in arrays.files:
+                    if name.startswith(cls.CATEGORIES_PREFIX):
+                        categories[name[len(cls.CATEGORIES_PREFIX):]] = arrays[name]
+                    else:
+                        columns[name] = arrays[name]
+            return columns, categories
+        if pyarrow is None:
+            raise ImportError('Для чтения parquet необходим пакет pyarrow (pip install pyarrow).')
+        table = pyarrow.parquet.read_table(file_path)
+        for name in table.column_names:
+            column = table.column(name)
+            if name in cls.CATEGORY_COLUMNS:
+                values = column.cast(pyarrow.string()).fill_null('').to_numpy(zero_copy_only=False).astype(str)
+                categories[name], codes = numpy.unique(values, return_inverse=True)
+                codes = codes.astype('int16')
+                if categories[name].size and categories[name][0] == '':
+                    categories[name], codes = categories[name][1:], codes - 1
+                columns[name] = codes
+            elif name in cls.DATE_COLUMNS:
+                columns[name] = column.to_numpy(zero_copy_only=False).astype('datetime64[D]')
+            else:
+                columns[name] = column.to_numpy(zero_copy_only=False)
+                if name in cls.STRING_COLUMNS:
+                    columns[name] = columns[name].astype(str)
+        return columns, categories
+
+
+class NoticeReport:
+    """
+    Сводный отчет по выгрузке (NoticeExporter.load): количество объявлений по странам, полу и возрастным группам,
+    их сочетаниям и по годам объявлений каждого типа. Все подсчеты выполняются над массивами целиком
+    (numpy.bincount по кодам), без цикла по записям.
+    """
+    AGE_BUCKETS = (18, 25, 35, 45, 55, 65)
+    DAYS_IN_YEAR = 365.2425
+
+    def __init__(self, columns: dict, categories: dict, today: datetime.date = None):
+        """
+        :param columns: Словарь {'Столбец': массив}.
+        :param categories: Словарь {'Столбец со словарем': массив значений}.
+        :param today: Дата, на которую считается возраст. None - сегодня.
+        """
+        if numpy is None:
+            raise ImportError('Для отчета необходим пакет numpy (pip install numpy).')
+        self.columns = columns
+        self.categories = categories
+        self.today = numpy.datetime64(today or datetime.date.today(), 'D')
+
+    def get_ages(self):
+        """
+        :return: Массив возрастов в полных годах (приблизительно, по среднему году), -1 - дата рождения неизвестна.
+        """
+        birth_dates = self.columns['birth_date']
+        days = (self.today - birth_dates).astype('int64')
+        return numpy.where(numpy.isnat(birth_dates), -1, numpy.floor(days / self.DAYS_IN_YEAR)).astype('int16')
+
+    def get_age_bucket_names(self):
+        """
+        :return: Список названий возрастных групп по порядку кодов get_age_buckets.
+        """
+        edges = (0,) + self.AGE_BUCKETS
+        names = [f'{low}-{high - 1}' for low, high in zip(edges, edges[1:])]
+        return names + [f'{self.AGE_BUCKETS[-1]}+']
+
+    def get_age_buckets(self):
+        """
+        :return: Массив кодов возрастных групп (см. get_age_bucket_names), -1 - возраст неизвестен.
+        """
+        ages = self.get_ages()
+        return numpy.where(ages < 0, -1, numpy.digitize(ages, self.AGE_BUCKETS)).astype('int16')
+
+    def count_codes(self, codes, names):
+        """
+        :param codes: Массив кодов (-1 - нет значения).
+        :param names: Значения по порядку кодов.
+        :return: Словарь {значение: количество} без нулевых, 'Unknown' - количество без значения.
+        """
+        counts = numpy.bincount(codes[codes >= 0], minlength=len(names))
+        result = {str(name): int(count) for name, count in zip(names, counts) if count}
+        unknown = int(numpy.count_nonzero(codes < 0))
+        if unknown:
+            result['Unknown'] = unknown
+        return result
+
+    def count_cross(self, first, first_names, second, second_names):
+        """
+        Считает количество по сочетаниям значений двух столбцов одним bincount.
+        :return: Словарь {значение первого: {значение второго: количество}} без нулевых.
+        """
+        known = (first >= 0) & (second >= 0)
+        size = len(second_names)
+        counts = numpy.bincount(first[known].astype('int64') * size + second[known],
+                                minlength=len(first_names) * size).reshape(len(first_names), size)
+        result = {}
+        for first_index, second_index in zip(*numpy.nonzero(counts)):
+            result.setdefault(str(first_names[first_index]), {})[str(second_names[second_index])] = \
+                int(counts[first_index, second_index])
+        return result
+
+    def build(self):
+        """
+        :return: Словарь отчета: total, by_nationality, by_sex, by_age, by_nationality_sex, by_nationality_age,
+        by_issuing_country, by_year (по типам объявлений), age_summary (минимум, медиана, максимум).
+        """
+        columns, categories = self.columns, self.categories
+        age_buckets = self.get_age_buckets()
+        age_names = self.get_age_bucket_names()
+        ages = self.get_ages()
+        known_ages = ages[ages >= 0]
+        years = columns['notice_year'].astype('int64')
+        year_min = int(years[years >= 0].min()) if numpy.any(years >= 0) else 0
+        year_codes = numpy.where(years >= 0, years - year_min, -1)
+        year_names = [str(year_min + offset) for offset in range(int(year_codes.max()) + 1 if year_codes.size else 0)]
+        return {
+            'total': int(columns['entity_id'].size),
+            'by_notice_type': self.count_codes(columns['notice_type'], categories['notice_type']),
+            'by_nationality': self.count_codes(columns['nationality'], categories['nationality']),
+            'by_sex': self.count_codes(columns['sex'], categories['sex']),
+            'by_age': self.count_codes(age_buckets, age_names),
+            'by_issuing_country': self.count_codes(columns['issuing_country'], categories['issuing_country']),
+            'by_nationality_sex': self.count_cross(columns['nationality'], categories['nationality'],
+                                                   columns['sex'], categories['sex']),
+            'by_nationality_age': self.count_cross(columns['nationality'], categories['nationality'],
+                                                   age_buckets, age_names),
+            'by_year': self.count_cross(columns['notice_type'], categories['notice_type'], year_codes, year_names),
+            'age_summary': {'min': int(known_ages.min()), 'median': float(numpy.median(known_ages)),
+                            'max': int(known_ages.max())} if known_ages.size else None}
+
+
+def main():
+    from InterpolParser import InterpolParser
+
+    arguments = argparse.ArgumentParser(description='Выгрузка объявлений в столбцы и сводный отчет.')
+    arguments.add_argument('--base-dir', default=None, help='Каталог данных (по умолчанию - BASE_DIR_FOR_DATA).')
+    arguments.add_argument('--output', default=None,
+                           help='Файл выгрузки (по умолчанию - notices.parquet или notices.npz в каталоге данных).')
+    arguments.add_argument('--format', default=None, choices=[NoticeExporter.FORMAT_PARQUET, NoticeExporter.FORMAT_NPZ])
+    arguments.add_argument('--report-only', action='store_true', help='Построить отчет по готовой выгрузке.')
+    arguments.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    options = arguments.parse_args()
+
+    # В stdout выводится только json отчета, сообщения о ходе выгрузки идут в лог (stderr).
+    setup_logging(options.log_level)
+
+    export_format = options.format or (NoticeExporter.FORMAT_PARQUET if pyarrow is not None
+                                       else NoticeExporter.FORMAT_NPZ)
+    parser = InterpolParser(1, base_dir=options.base_dir, cache=False, notice_index=False)
+    output = options.output or f'{parser.BASE_DIR_FOR_DATA}notices.{export_format}'
+    try:
+        if not options.report_only:
+            logger.info('Выгружено объявлений: %s - %s', NoticeExporter(parser).export(output, export_format), output)
+    finally:
+        parser.close()
+    print(json.dumps(NoticeReport(*NoticeExporter.load(output)).build(), indent=4, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+class NoticeIndex:
+    """
+    Индекс сохраненных объявлений на SQLite для быстрых выборок без чтения json файлов.
+    Для каждого объявления (тип, entity_id) хранит имя, пол, дату и год рождения, место записи и статус,
+    а в отдельных таблицах - гражданства, страны, выдавшие ордер, и слова из текстов обвинений.
+    Каждая вспомогательная таблица - WITHOUT ROWID с ключом (значение, id объявления), то есть сама является
+    индексом: выборка по любому сочетанию фильтров не читает лишних строк.
+    Записи добавляются в буфер при записи данных (InterpolParser.write_data_into_file) и записываются в SQLite
+    пачками по FLUSH_SIZE, перед каждой выборкой и при close.
+    """
+    STATUS_ACTIVE = 'active'
+    STATUS_REMOVED = 'removed'
+    FLUSH_SIZE = 500
+    MAX_SQL_VARIABLES = 500
+    # Поля, по которым можно считать количество объявлений (count_by).
+    GROUP_FIELDS = {'notice_type': 'n.notice_type', 'sex': 'n.sex', 'birth_year': 'n.birth_year',
+                    'status': 'n.status', 'nationality': 'nat.nationality', 'issuing_country': 'ic.issuing_country'}
+    KEYWORD_PATTERN = re.compile(r'\w{2,}')
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: Путь к файлу базы данных.
+        """
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS notices ('
+            'id INTEGER PRIMARY KEY, notice_type TEXT NOT NULL, entity_id TEXT NOT NULL, name TEXT, forename TEXT, '
+            'sex TEXT, birth_date TEXT, birth_year INTEGER, location TEXT, status TEXT NOT NULL, '
+            'updated_at REAL NOT NULL, UNIQUE (notice_type, entity_id))')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS notices_entity_id ON notices (entity_id)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS notices_sex ON notices (sex, birth_date)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS notices_birth_date ON notices (birth_date)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS notices_birth_year ON notices (birth_year)')
+        for table, column in (('nationalities', 'nationality'), ('issuing_countries', 'issuing_country'),
+                              ('keywords', 'keyword')):
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ({column} TEXT NOT NULL, notice_id INTEGER NOT NULL, '
+                f'PRIMARY KEY ({column}, notice_id)) WITHOUT ROWID')
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_notice_id ON {table} (notice_id)')
+
+    @classmethod
+    def get_keywords(cls, text: str):
+        """
+        :param text: Текст обвинения.
+        :return: Множество слов в нижнем регистре (не короче двух символов).
+        """
+        return set(cls.KEYWORD_PATTERN.findall((text or '').lower()))
+
+    @staticmethod
+    def get_birth_date(date_of_birth: str):
+        """
+        Приводит дату рождения с сайта ('1980/05/17', '1980/05' или '1980') к виду '1980-05-17'.
+        Неизвестные месяц и день заменяются на 01.
+        :param date_of_birth: Дата рождения.
+        :return: Пара (строка даты, год) или (None, None).
+        """
+        parts = re.findall(r'\d+', date_of_birth or '')
+        if not parts or len(parts[0]) != 4:
+            return None, None
+        year = int(parts[0])
+        month, day = (int(part) for part in (parts[1:3] + ['1', '1'])[:2])
+        return f'{year:04}-{month or 1:02}-{day or 1:02}', year
+
+    def get_row(self, record: dict, notice_type: str, location: str = None):
+        """
+        Выбирает из данных о разыскиваемом значения для индекса.
+        :param record: Подготовленные данные о разыскиваемом.
+        :param notice_type: Тип объявления.
+        :param location: Место записи данных.
+        :return: Кортеж (строка таблицы notices, гражданства, страны ордеров, слова обвинений).
+        """
+        birth_date, birth_year = self.get_birth_date(record.get('date_of_birth'))
+        row = (notice_type, str(record['entity_id']), record.get('name'), record.get('forename'), record.get('sex_id'),
+               birth_date, birth_year, location)
+        nationalities = {str(code).upper() for code in record.get('nationalities') or ()}
+        issuing_countries, keywords = set(), set()
+        for warrant in record.get('arrest_warrants') or ():
+            if warrant.get('issuing_country_id'):
+                issuing_countries.add(str(warrant['issuing_country_id']).upper())
+            keywords |= self.get_keywords(warrant.get('charge'))
+            keywords |= self.get_keywords(warrant.get('charge_translation'))
+        return row, nationalities, issuing_countries, keywords
+
+    def add(self, record: dict, notice_type: str, location: str = None):
+        """
+        Добавляет или обновляет объявление (в буфере). Пропавшее раньше объявление снова становится активным.
+        :param record: Подготовленные данные о разыскиваемом.
+        :param notice_type: Тип объявления.
+        :param location: Место записи данных (путь к файлу или ключ хранилища).
+        :return: None.
+        """
+        if record.get('entity_id') is None:
+            return
+        item = self.get_row(record, notice_type, location)
+        with self._lock:
+            self._pending[item[0][:2]] = item
+            flush = len(self._pending) >= self.FLUSH_SIZE
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает накопленные объявления в SQLite одной транзакцией.
+        :return: None.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            now = time.time()
+            self._connection.execute('BEGIN')
+            self._connection.executemany(
+                'INSERT INTO notices (notice_type, entity_id, name, forename, sex, birth_date, birth_year, location, '
+                'status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (notice_type, entity_id) DO UPDATE SET name = excluded.name, '
+                'forename = excluded.forename, sex = excluded.sex, birth_date = excluded.birth_date, '
+                'birth_year = excluded.birth_year, location = coalesce(excluded.location, location), '
+                'status = excluded.status, updated_at = excluded.updated_at',
+                [row + (self.STATUS_ACTIVE, now) for row, _, _, _ in pending.values()])
+            ids = {}
+            keys = list(pending)
+            for start in range(0, len(keys), self.MAX_SQL_VARIABLES // 2):
+                chunk = keys[start:start + self.MAX_SQL_VARIABLES // 2]
+                condition = ' OR '.join(['(notice_type = ? AND entity_id = ?)'] * len(chunk))
+                for notice_id, notice_type, entity_id in self._connection.execute(
+                        f'SELECT id, notice_type, entity_id FROM notices WHERE {condition}',
+                        [value for key in chunk for value in key]):
+                    ids[(notice_type, entity_id)] = notice_id
+            for table, column, position in (('nationalities', 'nationality', 1),
+                                            ('issuing_countries', 'issuing_country', 2), ('keywords', 'keyword', 3)):
+                self._connection.executemany(f'DELETE FROM {table} WHERE notice_id = ?',
+                                             [(notice_id,) for notice_id in ids.values()])
+                self._connection.executemany(
+                    f'INSERT OR IGNORE INTO {table} ({column}, notice_id) VALUES (?, ?)',
+                    [(value, ids[key]) for key, item in pending.items() for value in item[position]])
+            self._connection.execute('COMMIT')
+
+    def mark_removed(self, notice_type: str, entity_ids: list):
+        """
+        Помечает пропавшие с сайта объявления. По умолчанию выборки их не возвращают.
+        :param notice_type: Тип объявления.
+        :param entity_ids: Список entity_id.
+        :return: None.
+        """
+        self.flush()
+        with self._lock:
+            self._connection.execute('BEGIN')
+            self._connection.executemany(
+                'UPDATE notices SET status = ?, updated_at = ? WHERE notice_type = ? AND entity_id = ?',
+                [(self.STATUS_REMOVED, time.time(), notice_type, str(entity_id)) for entity_id in entity_ids])
+            self._connection.execute('COMMIT')
+
+    @staticmethod
+    def get_years_ago(years: int, today: datetime.date = None):
+        """
+        :param years: Количество лет.
+        :param today: Текущая дата. None - сегодня.
+        :return: Строка даты 'YYYY-MM-DD', на years лет раньше today (29 февраля - 28 февраля).
+        """
+        today = today or datetime.date.today()
+        try:
+            return today.replace(year=today.year - years).isoformat()
+        except ValueError:
+            return today.replace(year=today.year - years, day=28).isoformat()
+
+    def get_conditions(self, nationality: str = None, sex: str = None, age_min: int = None, age_max: int = None,
+                       birth_year: int = None, issuing_country: str = None, charge: str = None,
+                       entity_id: str = None, notice_type: str = None, include_removed: bool = False):
+        """
+        Собирает условия выборки. Все заданные фильтры объединяются через И.
+        :param nationality: Код гражданства, например 'RU'.
+        :param sex: Пол ('M', 'F', 'U').
+        :param age_min: Минимальный возраст на сегодня.
+        :param age_max: Максимальный возраст на сегодня.
+        :param birth_year: Год рождения.
+        :param issuing_country: Код страны, выдавшей ордер.
+        :param charge: Слова обвинения: объявление подходит, если в его обвинениях есть все слова.
+        Слово с '*' на конце ищется по началу ('fraud*').
+        :param entity_id: Идентификатор объявления, например '2020/12345'.
+        :param notice_type: Тип объявления.
+        :param include_removed: Учитывать пропавшие с сайта объявления.
+        :return: Пара (список условий SQL, список параметров).
+        """
+        conditions, parameters = [], []
+        for column, value in (('n.notice_type', notice_type), ('n.entity_id', entity_id), ('n.sex', sex),
+                              ('n.birth_year', birth_year)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                parameters.append(value)
+        if not include_removed:
+            conditions.append('n.status = ?')
+            parameters.append(self.STATUS_ACTIVE)
+        if age_min is not None:
+            conditions.append('n.birth_date <= ?')
+            parameters.append(self.get_years_ago(age_min))
+        if age_max is not None:
+            conditions.append('n.birth_date > ?')
+            parameters.append(self.get_years_ago(age_max + 1))
+        for table, column, value in (('nationalities', 'nationality', nationality),
+                                     ('issuing_countries', 'issuing_country', issuing_country)):
+            if value is not None:
+                conditions.append(f'n.id IN (SELECT notice_id FROM {table} WHERE {column} = ?)')
+                parameters.append(value.upper())
+        for keyword in (charge or '').lower().split():
+            if keyword.endswith('*'):
+                prefix = keyword.rstrip('*')
+                conditions.append('n.id IN (SELECT notice_id FROM keywords WHERE keyword >= ? AND keyword < ?)')
+                parameters.extend((prefix, f'{prefix}\U0010ffff'))
+            else:
+                conditions.append('n.id IN (SELECT notice_id FROM keywords WHERE keyword = ?)')
+                parameters.append(keyword)
+        return conditions, parameters
+
+    @staticmethod
+    def _get_where(conditions: list):
+        return f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    def query(self, limit: int = None, offset: int = 0, **filters):
+        """
+        Выбирает объявления по фильтрам (см. get_conditions).
+        :param limit: Максимальное количество объявлений. None - все.
+        :param offset: Сколько первых объявлений пропустить.
+        :param filters: Фильтры, например nationality='RU', sex='M', age_min=30, age_max=40, charge='murder'.
+        :return: Список словарей {'notice_type', 'entity_id', 'name', 'forename', 'sex', 'birth_date',
+        'location', 'status'}, упорядоченный по типу и entity_id.
+        """
+        self.flush()
+        conditions, parameters = self.get_conditions(**filters)
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT n.notice_type, n.entity_id, n.name, n.forename, n.sex, n.birth_date, n.location, n.status '
+                f'FROM notices n{self._get_where(conditions)} ORDER BY n.notice_type, n.entity_id LIMIT ? OFFSET ?',
+                parameters + [-1 if limit is None else limit, offset]).fetchall()
+        columns = ('notice_type', 'entity_id', 'name', 'forename', 'sex', 'birth_date', 'location', 'status')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count(self, **filters):
+        """
+        :param filters: Фильтры (см. get_conditions).
+        :return: Количество подходящих объявлений.
+        """
+        self.flush()
+        conditions, parameters = self.get_conditions(**filters)
+        with self._lock:
+            return self._connection.execute(
+                f'SELECT count(*) FROM notices n{self._get_where(conditions)}', parameters).fetchone()[0]
+
+    def count_by(self, field: str, **filters):
+        """
+        Считает подходящие объявления по значениям поля. Объявление с несколькими гражданствами
+        (странами ордеров) учитывается в каждом из них.
+        :param field: Поле из GROUP_FIELDS.
+        :param filters: Фильтры (см. get_conditions).
+        :return: Словарь {значение: количество}.
+        """
+        if field not in self.GROUP_FIELDS:
+            raise ValueError(f'Неизвестное поле {field}, доступны: {list(self.GROUP_FIELDS)}.')
+        self.flush()
+        conditions, parameters = self.get_conditions(**filters)
+        join = {'nationality': ' JOIN nationalities nat ON nat.notice_id = n.id',
+                'issuing_country': ' JOIN issuing_countries ic ON ic.notice_id = n.id'}.get(field, '')
+        column = self.GROUP_FIELDS[field]
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT {column}, count(*) FROM notices n{join}{self._get_where(conditions)} GROUP BY {column} '
+                f'ORDER BY count(*) DESC', parameters).fetchall()
+        return dict(rows)
+
+    def clear(self):
+        """
+        Удаляет все объявления из индекса.
+        :return: None.
+        """
+        with self._lock:
+            self._pending = {}
+            self._connection.execute('BEGIN')
+            for table in ('notices', 'nationalities', 'issuing_countries', 'keywords'):
+                self._connection.execute(f'DELETE FROM {table}')
+            self._connection.execute('COMMIT')
+
+    def close(self):
+        """
+        Записывает буфер и закрывает базу данных.
+        :return: None.
+        """
+        self.flush()
+        with self._lock:
+            self._connection.close()
+
+
+def main():
+    from InterpolParser import InterpolParser
+
+    arguments = argparse.ArgumentParser(description='Выборка из индекса сохраненных объявлений.')
+    arguments.add_argument('--base-dir', default=None, help='Каталог данных (по умолчанию - BASE_DIR_FOR_DATA).')
+    arguments.add_argument('--rebuild', action='store_true', help='Построить индекс заново по сохраненным данным.')
+    arguments.add_argument('--nationality', default=None, help='Код гражданства, например RU.')
+    arguments.add_argument('--sex', default=None, choices=['M', 'F', 'U'])
+    arguments.add_argument('--age-min', type=int, default=None)
+    arguments.add_argument('--age-max', type=int, default=None)
+    arguments.add_argument('--birth-year', type=int, default=None)
+    arguments.add_argument('--issuing-country', default=None, help='Код страны, выдавшей ордер.')
+    arguments.add_argument('--charge', default=None, help="Слова обвинения, например 'murder' или 'fraud*'.")
+    arguments.add_argument('--entity-id', default=None)
+    arguments.add_argument('--notice-type', default=None, choices=list(InterpolParser.NOTICE_TYPES))
+    arguments.add_argument('--include-removed', action='store_true', help='Учитывать пропавшие с сайта.')
+    arguments.add_argument('--count', action='store_true', help='Вывести только количество.')
+    arguments.add_argument('--group-by', default=None, choices=list(NoticeIndex.GROUP_FIELDS),
+                           help='Вывести количество по значениям поля.')
+    arguments.add_argument('--limit', type=int, default=None)
+    options = arguments.parse_args()
+
+    parser = InterpolParser(1, base_dir=options.base_dir, cache=False)
+    try:
+        if options.rebuild:
+            print(f'Проиндексировано объявлений: {parser.rebuild_notice_index()}')
+        filters = {'nationality': options.nationality, 'sex': options.sex, 'age_min': options.age_min,
+                   'age_max': options.age_max, 'birth_year': options.birth_year,
+                   'issuing_country': options.issuing_country, 'charge': options.charge,
+                   'entity_id': options.entity_id, 'notice_type': options.notice_type,
+                   'include_removed': options.include_removed}
+        if options.group_by:
+            print(json.dumps(parser.notice_index.count_by(options.group_by, **filters), indent=4, ensure_ascii=False))
+        elif options.count:
+            print(parser.notice_index.count(**filters))
+        elif not options.rebuild or any(value for value in filters.values()):
+            for notice in parser.notice_index.query(limit=options.limit, **filters):
+                print(json.dumps(notice, ensure_ascii=False))
+    finally:
+        parser.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class NoticeManifest:
+    """
+    Список известных разыскиваемых для инкрементального сбора.
+    Для каждого entity_id хранит ссылку, отпечаток данных из общей страницы поиска,
+    время первого и последнего появления, статус и путь к сохраненному файлу.
+    Сравнение свежей выдачи поиска со списком показывает, какие разыскиваемые новые, какие изменились,
+    а какие пропали с сайта.
+    """
+    STATUS_ACTIVE = 'active'
+    STATUS_REMOVED = 'removed'
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: Путь к json файлу списка.
+        """
+        self.file_path = file_path
+        self.notices = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Загружает список из файла, если он есть.
+        :return: None.
+        """
+        if os.path.exists(self.file_path):
+            with open(self.file_path, encoding='utf-8') as file:
+                self.notices = json.load(file)
+
+    def save(self):
+        """
+        Сохраняет список в файл. Запись идет во временный файл с последующей заменой,
+        чтобы прерванный процесс не оставил испорченный список.
+        :return: Строка с путем к файлу.
+        """
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(f'{self.file_path}.tmp', 'w', encoding='utf-8') as file:
+                json.dump(self.notices, file, indent=4, ensure_ascii=False)
+            os.replace(f'{self.file_path}.tmp', self.file_path)
+        return self.file_path
+
+    @staticmethod
+    def get_fingerprint(listing_item: dict):
+        """
+        Отпечаток данных разыскиваемого из общей страницы поиска.
+        :param listing_item: Словарь разыскиваемого со страницы поиска.
+        :return: Строка.
+        """
+        data = json.dumps(listing_item, sort_keys=True, ensure_ascii=False)
+        return hashlib.md5(data.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get_entity_id(rednotice_url: str, listing_item: dict):
+        """
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param listing_item: Словарь разыскиваемого со страницы поиска.
+        :return: Строка - entity_id.
+        """
+        entity_id = listing_item.get('entity_id')
+        if entity_id:
+            return entity_id
+        return rednotice_url.rstrip('/').rsplit('/', 1)[-1].replace('-', '/')
+
+    def diff(self, listing: dict):
+        """
+        Сравнивает свежую выдачу поиска со списком.
+        :param listing: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :return: Кортеж (ссылки новых, ссылки изменившихся, entity_id пропавших).
+        """
+        new_urls, changed_urls = self.diff_listing(listing)
+        return new_urls, changed_urls, self.get_missing_ids(listing)
+
+    def diff_listing(self, listing: dict):
+        """
+        Сравнивает часть выдачи поиска со списком, не проверяя пропавших.
+        Подходит для выдачи, которая приходит по частям.
+        :param listing: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :return: Кортеж (ссылки новых, ссылки изменившихся).
+        """
+        new_urls, changed_urls = [], []
+        with self._lock:
+            for url, item in listing.items():
+                known = self.notices.get(self.get_entity_id(url, item))
+                if known is None or known.get('fingerprint') is None:
+                    new_urls.append(url)
+                elif known['fingerprint'] != self.get_fingerprint(item) \
+                        or known.get('status') == self.STATUS_REMOVED:
+                    changed_urls.append(url)
+        return new_urls, changed_urls
+
+    def get_missing_ids(self, listing: dict):
+        """
+        :param listing: Полная выдача поиска {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :return: Список entity_id известных разыскиваемых, которых нет в выдаче.
+        """
+        seen_ids = {self.get_entity_id(url, item) for url, item in listing.items()}
+        with self._lock:
+            return [entity_id for entity_id, known in self.notices.items()
+                    if entity_id not in seen_ids and known.get('status') != self.STATUS_REMOVED]
+
+    def mark_seen(self, listing: dict):
+        """
+        Обновляет время последнего появления у всех разыскиваемых из выдачи.
+        :param listing: Словарь {'Ссылка на разыскиваемого': словарь со страницы поиска}.
+        :return: None.
+        """
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self._lock:
+            for url, item in listing.items():
+                known = self.notices.get(self.get_entity_id(url, item))
+                if known is not None:
+                    known['last_seen'] = now
+
+    def mark_fetched(self, rednotice_url: str, listing_item: dict, path=None):
+        """
+        Запоминает успешно собранного разыскиваемого. Отпечаток обновляется только после успешного сбора,
+        поэтому неудачные загрузки повторятся в следующем запуске.
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param listing_item: Словарь разыскиваемого со страницы поиска.
+        :param path: Путь к сохраненным данным.
+        :return: None.
+        """
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        entity_id = self.get_entity_id(rednotice_url, listing_item)
+        with self._lock:
+            known = self.notices.setdefault(entity_id, {'first_seen': now})
+            known.update({'url': rednotice_url, 'fingerprint': self.get_fingerprint(listing_item),
+                          'last_seen': now, 'status': self.STATUS_ACTIVE, 'path': path})
+            known.pop('removed_at', None)
+
+    def mark_failed(self, rednotice_url: str, listing_item: dict):
+        """
+        Сбрасывает отпечаток разыскиваемого, данные которого не удалось сохранить,
+        чтобы при повторе задачи он собрался заново.
+        :param rednotice_url: Ссылка на страницу разыскиваемого.
+        :param listing_item: Словарь разыскиваемого со страницы поиска.
+        :return: None.
+        """
+        with self._lock:
+            known = self.notices.get(self.get_entity_id(rednotice_url, listing_item))
+            if known is not None:
+                known['fingerprint'] = None
+
+    def mark_removed(self, entity_ids: list):
+        """
+        Помечает пропавших с сайта разыскиваемых. Сохраненные файлы не удаляются.
+        :param entity_ids: Список entity_id.
+        :return: None.
+        """
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self._lock:
+            for entity_id in entity_ids:
+                known = self.notices.get(entity_id)
+                if known is not None:
+                    known['status'] = self.STATUS_REMOVED
+                    known['removed_at'] = now
+
+    def merge(self, notices: dict):
+        """
+        Добавляет записи другого списка, например списка шарда.
+        Если разыскиваемый есть в обоих списках, остается запись со статусом active,
+        при одинаковом статусе - с более поздним last_seen. first_seen берется самый ранний.
+        :param notices: Словарь {entity_id: данные} другого списка.
+        :return: None.
+        """
+        with self._lock:
+            for entity_id, other in notices.items():
+                known = self.notices.get(entity_id)
+                if known is None:
+                    self.notices[entity_id] = dict(other)
+                    continue
+                first_seen = [value for value in (known.get('first_seen'), other.get('first_seen')) if value]
+                other_is_active = other.get('status') == self.STATUS_ACTIVE
+                known_is_active = known.get('status') == self.STATUS_ACTIVE
+                if (other_is_active, other.get('last_seen') or '') > (known_is_active, known.get('last_seen') or ''):
+                    known = self.notices[entity_id] = dict(other)
+                if first_seen:
+                    known['first_seen'] = min(first_seen)
+
+    def get_removed(self):
+        """
+        :return: Словарь {entity_id: данные} разыскиваемых, пропавших с сайта.
+        """
+        with self._lock:
+            return {entity_id: dict(known) for entity_id, known in self.notices.items()
+                    if known.get('status') == self.STATUS_REMOVED}
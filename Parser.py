@@ -1,7 +1,28 @@
+import concurrent.futures
 import csv
+import hashlib
+import io
 import json
 import os
+import tempfile
+import threading
+import time
+import logging
 import requests
+from urllib3.util.retry import Retry
+from CrawlLogging import get_logger
+from Metrics import Metrics
+from RateLimiter import RateLimiter
+from RequestHandle import AbortableHTTPAdapter, RequestHandle
+from RequestPolicy import RequestPolicy
+from Storage import DirectoryStorage, ImageFile, StorageWriter, get_image_extension
+
+try:
+    import orjson
+except ImportError:  # Быстрый разбор json необязателен, без orjson используется стандартный json.
+    orjson = None
+
+logger = get_logger('parser')
 
 
 class Parser:
@@ -18,39 +39,579 @@ class Parser:
         'User-Agent':
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv: 99.0) Gecko/20100101 Firefox/99.0'
     }
-    URL_REQUEST_COUNTER = 0
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, max_threads: int):
+    def __init__(self, max_threads: int, max_retries: int = 3, backoff_factor: float = 0.5, storage=None,
+                 rate_limiter=None, metrics=None, cache=None, request_policy=None, archive=None):
         self.max_threads = max_threads
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.cache = cache
+        self.request_policy = request_policy if request_policy is not None else RequestPolicy()
+        self.archive = archive
+        self._hedge_executor = None
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self.storage = storage if storage is not None else DirectoryStorage(self)
+        self._storage_writer = None
+        self._storage_writer_lock = threading.Lock()
+
+    @property
+    def URL_REQUEST_COUNTER(self):
+        """
+        Количество выполненных запросов (включая повторные) из метрик.
+        :return: Число.
+        """
+        return int(self.metrics.get_counter('requests'))
+
+    def create_session(self):
+        """
+        Создает сессию с пулом keep-alive соединений и политикой повторных запросов при ошибках соединения,
+        пауза между попытками растет экспоненциально (backoff_factor * 2 ** номер_попытки).
+        Повтор при кодах ответа из RETRY_STATUS_CODES выполняется в get_response,
+        чтобы каждый такой ответ учитывался ограничителем скорости.
+        :return: Объект requests.Session.
+        """
+        retry = Retry(total=self.max_retries, backoff_factor=self.backoff_factor, status=0,
+                      allowed_methods=frozenset(['GET']), raise_on_status=False)
+        # Запросы идут на два хоста (www.interpol.int и ws-public.interpol.int),
+        # каждому потоку достаточно нескольких соединений на хост.
+        adapter = AbortableHTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.HEADERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
-    def get_page(self, url: str):
+    @property
+    def session(self):
+        """
+        Сессия текущего потока. Создается при первом обращении и переиспользуется всеми запросами потока,
+        поэтому TCP и TLS рукопожатие выполняется один раз на соединение, а не на каждый запрос.
+        :return: Объект requests.Session.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.create_session()
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def get_pool_stats(self):
+        """
+        Собирает статистику пулов соединений всех созданных сессий.
+        :return: Словарь {'sessions': ..., 'pools': ..., 'connections': ..., 'requests': ...}.
+        connections - количество открытых за все время соединений, requests - количество запросов через них.
+        """
+        stats = {'sessions': 0, 'pools': 0, 'connections': 0, 'requests': 0}
+        with self._sessions_lock:
+            sessions = list(self._sessions)
+        stats['sessions'] = len(sessions)
+        for session in sessions:
+            for adapter in {id(a): a for a in session.adapters.values()}.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    stats['pools'] += 1
+                    stats['connections'] += pool.num_connections
+                    stats['requests'] += pool.num_requests
+        return stats
+
+    def close(self):
+        """
+        Дописывает данные в хранилище, закрывает все созданные сессии и их соединения.
+        :return: None.
+        """
+        with self._storage_writer_lock:
+            storage_writer, self._storage_writer = self._storage_writer, None
+        if storage_writer is not None:
+            storage_writer.close()
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+        hedge_executor, self._hedge_executor = self._hedge_executor, None
+        if hedge_executor is not None:
+            # Проигравшие дублирующие запросы не ждутся, их ответы закрываются по завершении.
+            hedge_executor.shutdown(wait=False)
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+        self.metrics.stop_reporter()
+
+    def get_response(self, url: str, stream: bool = False, stage: str = 'request'):
+        """
+        Получает ответ по заданному url (см. fetch_response).
+        Если задан архив ответов (archive) в режиме воспроизведения, ответ берется из архива без сети,
+        ограничителя скорости и кеша. В режиме записи полученный ответ дописывается в архив
+        (тело потоковой загрузки записывается в download_to_temp_file после ее завершения).
+        :param url: URL адрес.
+        :param stream: Не загружать тело ответа сразу (читается через iter_content).
+        :param stage: Этап сбора.
+        :return: Объект requests.Response или None, если обратиться к странице не удалось.
+        """
+        if self.archive is not None and self.archive.is_replaying:
+            return self.get_archived_response(url, stream, stage)
+        result = self.fetch_response(url, stream, stage)
+        if result is not None and not stream and self.archive is not None:
+            self.archive.put(url, stage, result.status_code, result.headers, body=result.content)
+        return result
+
+    def get_archived_response(self, url: str, stream: bool = False, stage: str = 'request'):
+        """
+        Собирает ответ из архива ответов (archive).
+        :param url: URL адрес.
+        :param stream: Тело читается через iter_content.
+        :param stage: Этап сбора для метрик.
+        :return: Объект requests.Response с атрибутом from_archive = True или None, если ответа нет в архиве
+        или он с ошибкой.
+        """
+        record = self.archive.get(url)
+        if record is None:
+            self.metrics.inc('archive', stage=stage, result='miss')
+            get_logger(stage).warning('not in archive', extra={'url': url, 'stage': stage})
+            return None
+        self.metrics.inc('archive', stage=stage, result='hit')
+        if record['status'] >= 400:
+            return None
+        result = requests.Response()
+        result.status_code = record['status']
+        result.url = url
+        result.headers.update(record['headers'])
+        result.encoding = requests.utils.get_encoding_from_headers(result.headers)
+        result.from_archive = True
+        if stream:
+            result.raw = io.BytesIO(record['body'])
+        else:
+            result._content = record['body']
+        return result
+
+    def fetch_response(self, url: str, stream: bool = False, stage: str = 'request'):
+        """
+        Делает запрос по заданному url через сессию текущего потока.
+        Каждый запрос ждет разрешения ограничителя скорости (rate_limiter) и сообщает ему результат.
+        При кодах из RETRY_STATUS_CODES запрос повторяется с экспоненциальной паузой,
+        ответ с ошибкой не возвращается как данные.
+        Если задан кеш ответов (cache), свежий ответ отдается из кеша без запроса, а устаревший проверяется
+        условным запросом (If-None-Match/If-Modified-Since) и при ответе 304 тоже отдается из кеша.
+        Если на 304 тело из кеша уже пропало, запрос сразу повторяется без условных заголовков,
+        не расходуя попытку повтора.
+        Таймауты, общий срок сбора и дублирование запросов задаются request_policy (см. send_hedged_request).
+        :param url: URL адрес.
+        :param stream: Не загружать тело ответа сразу (читается через iter_content).
+        :param stage: Этап сбора для метрик и срока жизни в кеше (probe, listing, detail, image_index, image...).
+        :return: Объект requests.Response или None, если обратиться к странице не удалось.
+        """
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry, stage):
+            result = self.get_cached_response(entry, stream)
+            if result is not None:
+                self.metrics.inc('cache', stage=stage, result='hit')
+                return result
+            entry = None
+        headers = self.cache.get_validators(entry) if self.cache is not None else None
+        attempt = 0
+        while True:
+            if self.request_policy.is_expired():
+                self.metrics.inc('deadline', stage=stage)
+                return None
+            try:
+                result = self.send_hedged_request(url, stream, headers, stage)
+            except Exception as ex:
+                get_logger(stage).warning('request failed', extra={'url': url, 'stage': stage, 'error': str(ex)})
+                return None
+            if result.status_code == 304 and entry is not None:
+                result.close()
+                self.cache.touch(url, result.headers)
+                cached_result = self.get_cached_response(entry, stream)
+                if cached_result is not None:
+                    self.metrics.inc('cache', stage=stage, result='revalidated')
+                    return cached_result
+                # Тело пропало из кеша: сервер ответил, поэтому запрос без условных заголовков не считается повтором.
+                self.metrics.inc('cache', stage=stage, result='evicted')
+                entry, headers = None, None
+                continue
+            if result.ok:
+                if self.cache is not None:
+                    self.metrics.inc('cache', stage=stage, result='miss')
+                    if not stream and self.cache.should_store(stage, result.headers):
+                        self.cache.put(url, stage, result.headers, body=result.content)
+                return result
+            result.close()
+            if result.status_code in self.RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(self.backoff_factor * 2 ** attempt)
+                attempt += 1
+                continue
+            get_logger(stage).warning('bad response', extra={'url': url, 'stage': stage,
+                                                             'status': result.status_code})
+            return None
+
+    def send_request(self, url: str, stream: bool = False, headers: dict = None, stage: str = 'request',
+                     handle: RequestHandle = None):
+        """
+        Выполняет один запрос через сессию текущего потока с таймаутами этапа (request_policy.get_timeout),
+        учитывая его в ограничителе скорости и метриках.
+        :param url: URL адрес.
+        :param stream: Не загружать тело ответа сразу.
+        :param headers: Дополнительные заголовки.
+        :param stage: Этап сбора.
+        :param handle: RequestHandle, через который запрос может отменить другой поток (send_hedged_request).
+        :return: Объект requests.Response. При ошибке соединения или таймауте - исключение,
+        при отмене - concurrent.futures.CancelledError.
+        """
+        started_at = self.rate_limiter.acquire()
+        if handle is not None and not handle.start():
+            self.rate_limiter.cancel()
+            raise concurrent.futures.CancelledError()
+        self.metrics.inc('in_flight', stage=stage)
+        try:
+            result = self.session.get(url=url, stream=stream, headers=headers,
+                                      timeout=self.request_policy.get_timeout(stage))
+        except Exception:
+            if handle is not None and not handle.finish():
+                # Отмененный запрос не влияет на скорость и время ответа, разрешение уже освобождено.
+                raise concurrent.futures.CancelledError()
+            self.rate_limiter.release(started_at)
+            self.metrics.inc('errors', stage=stage)
+            self.request_policy.observe(stage, time.monotonic() - started_at, False)
+            raise
+        finally:
+            self.metrics.inc('in_flight', -1, stage=stage)
+        if handle is not None and not handle.finish():
+            result.close()
+            raise concurrent.futures.CancelledError()
+        self.rate_limiter.release(started_at, result.status_code, result.headers.get('Retry-After'))
+        self.add_response_metrics(result, stage, started_at, stream)
+        self.request_policy.observe(stage, time.monotonic() - started_at,
+                                    not stream and result.status_code not in self.RETRY_STATUS_CODES)
+        return result
+
+    @property
+    def hedge_executor(self):
+        """
+        Пул потоков для дублирующих запросов (send_hedge_request), создается при первом обращении.
+        У каждого потока пула своя сессия, как и у потоков сбора.
+        :return: Объект concurrent.futures.ThreadPoolExecutor.
+        """
+        if self._hedge_executor is None:
+            with self._sessions_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.request_policy.max_hedge_workers, thread_name_prefix='Hedge')
+        return self._hedge_executor
+
+    @staticmethod
+    def close_future_response(future):
+        """
+        Закрывает ответ завершившегося дублирующего запроса, который оказался не нужен.
+        :param future: Объект concurrent.futures.Future.
+        :return: None.
+        """
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            future.result().close()
+
+    def send_hedge_request(self, url: str, headers: dict, stage: str, delay: float, primary: RequestHandle,
+                           hedge: RequestHandle):
+        """
+        Задача пула hedge_executor: ждет завершения основного запроса delay секунд с момента его отправки
+        (ожидание разрешения ограничителя скорости не считается) и, если ответа еще нет и бюджет дублирования
+        не исчерпан, отправляет дублирующий запрос. Ответ без ошибки отменяет основной запрос.
+        :param url: URL адрес.
+        :param headers: Дополнительные заголовки.
+        :param stage: Этап сбора.
+        :param delay: Время ожидания ответа основного запроса в секундах.
+        :param primary: RequestHandle основного запроса.
+        :param hedge: RequestHandle дублирующего запроса.
+        :return: Объект requests.Response или None, если дублирующий запрос не отправлен или отменен.
+        """
+        started_at = primary.wait_started()
+        if started_at is None or primary.wait(started_at + delay - time.monotonic()) or hedge.cancelled \
+                or not self.request_policy.try_hedge():
+            return None
+        self.metrics.inc('hedges', stage=stage, result='sent')
+        try:
+            result = self.send_request(url, False, headers, stage, hedge)
+        except concurrent.futures.CancelledError:
+            return None
+        if result.status_code not in self.RETRY_STATUS_CODES:
+            primary.cancel()
+        return result
+
+    def send_hedged_request(self, url: str, stream: bool = False, headers: dict = None, stage: str = 'request'):
+        """
+        Выполняет запрос с дублированием. Основной запрос выполняется в текущем потоке, а пулу hedge_executor
+        передается только дублирующий (send_hedge_request): он отправляется, если ответ не получен
+        за request_policy.get_hedge_delay(stage) от отправки основного запроса и бюджет дублирования не исчерпан.
+        Возвращается первый пришедший ответ без ошибки, оставшийся запрос отменяется (RequestHandle.cancel):
+        его разрешение ограничителя скорости освобождается сразу, а соединение закрывается.
+        Потоковые запросы и запросы этапов без дублирования выполняются без дублирования (send_request).
+        :param url: URL адрес.
+        :param stream: Не загружать тело ответа сразу.
+        :param headers: Дополнительные заголовки.
+        :param stage: Этап сбора.
+        :return: Объект requests.Response. Если оба запроса неудачны - результат основного (или исключение).
+        """
+        delay = None if stream else self.request_policy.get_hedge_delay(stage)
+        if delay is None:
+            return self.send_request(url, stream, headers, stage)
+        primary, hedge = RequestHandle(self.rate_limiter), RequestHandle(self.rate_limiter)
+        hedge_future = self.hedge_executor.submit(self.send_hedge_request, url, headers, stage, delay, primary, hedge)
+        try:
+            result = self.send_request(url, False, headers, stage, primary)
+        except concurrent.futures.CancelledError:
+            # Дублирующий запрос ответил раньше и отменил основной.
+            self.metrics.inc('hedges', stage=stage, result='won')
+            return hedge_future.result()
+        except Exception:
+            # Основной запрос мог не начаться (ошибка ожидания разрешения): дублирующий больше его не ждет.
+            primary.cancel()
+            if hedge_future.cancel() or hedge_future.exception() is not None or hedge_future.result() is None:
+                raise
+            self.metrics.inc('hedges', stage=stage, result='won')
+            return hedge_future.result()
+        if result.status_code not in self.RETRY_STATUS_CODES:
+            hedge.cancel()
+            hedge_future.cancel()
+            hedge_future.add_done_callback(self.close_future_response)
+            return result
+        # Основной ответ с ошибкой: используется ответ дублирующего запроса, если он отправлен и удачен.
+        if hedge_future.cancel() or hedge_future.exception() is not None or hedge_future.result() is None \
+                or hedge_future.result().status_code in self.RETRY_STATUS_CODES:
+            self.close_future_response(hedge_future)
+            return result
+        result.close()
+        self.metrics.inc('hedges', stage=stage, result='won')
+        return hedge_future.result()
+
+    def get_cached_response(self, entry: dict, stream: bool = False):
+        """
+        Собирает ответ из записи кеша.
+        :param entry: Запись кеша (ResponseCache.get).
+        :param stream: Тело читается из файла через iter_content.
+        :return: Объект requests.Response с атрибутом from_cache = True или None, если файла тела нет.
+        """
+        result = requests.Response()
+        result.status_code = 200
+        result.url = entry['url']
+        if entry['content_type']:
+            result.headers['Content-Type'] = entry['content_type']
+        result.encoding = requests.utils.get_encoding_from_headers(result.headers)
+        result.from_cache = True
+        try:
+            if stream:
+                result.raw = open(entry['path'], 'rb')
+            else:
+                with open(entry['path'], 'rb') as file:
+                    result._content = file.read()
+        except OSError:
+            self.cache.remove(entry['url'])
+            return None
+        return result
+
+    def add_response_metrics(self, result, stage: str, started_at: float, stream: bool = False):
+        """
+        Учитывает ответ в метриках: код ответа, байты запроса и ответа, время ответа.
+        Для потоковой загрузки байты ответа и время учитываются при чтении тела.
+        :param result: Объект requests.Response.
+        :param stage: Этап сбора.
+        :param started_at: Время начала запроса (time.monotonic).
+        :param stream: Тело ответа еще не прочитано.
+        :return: None.
+        """
+        self.metrics.inc('requests', stage=stage, status=result.status_code)
+        request = result.request
+        self.metrics.inc('bytes', len(request.url) + sum(len(k) + len(v) + 4 for k, v in request.headers.items()),
+                         direction='out')
+        if not stream:
+            self.metrics.inc('bytes', len(result.content), direction='in')
+            self.metrics.observe(stage, time.monotonic() - started_at)
+        self.log_response(request.url, stage, result.status_code, started_at)
+
+    @staticmethod
+    def log_response(url: str, stage: str, status: int, started_at: float):
+        """
+        Пишет в лог этапа строку уровня DEBUG об ответе (url, stage, status, duration).
+        Если DEBUG для этапа выключен, строка не собирается.
+        :param url: URL адрес.
+        :param stage: Этап сбора.
+        :param status: Код ответа.
+        :param started_at: Время начала запроса (time.monotonic).
+        :return: None.
+        """
+        stage_logger = get_logger(stage)
+        if stage_logger.isEnabledFor(logging.DEBUG):
+            stage_logger.debug('response', extra={'url': url, 'stage': stage, 'status': status,
+                                                  'duration': round(time.monotonic() - started_at, 4)})
+
+    def get_page(self, url: str, stage: str = 'request'):
         """
         Делает запрос по заданному url.
         :param url: URL адрес.
+        :param stage: Этап сбора для метрик.
         :return: Строка ответ.
         """
+        result = self.get_response(url, stage=stage)
+        if result is None:
+            return f'Не удалось обратиться к странице - {url}'
+        return result.text
+
+    def get_binary_page(self, url: str, stage: str = 'request'):
+        """
+        Делает запрос по заданному url и возвращает тело ответа без декодирования (например, изображение).
+        :param url: URL адрес.
+        :param stage: Этап сбора для метрик.
+        :return: Байтовая строка.
+        """
+        result = self.get_response(url, stage=stage)
+        if result is None:
+            return b''
+        return result.content
+
+    def download_to_temp_file(self, url: str, temp_dir: str, stage: str = 'image'):
+        """
+        Загружает файл (изображение) по частям во временный файл, не держа весь ответ в памяти.
+        Одновременно считается sha256 содержимого и по первым байтам и Content-Type определяется расширение.
+        :param url: URL адрес.
+        :param temp_dir: Каталог для временных файлов.
+        :param stage: Этап сбора для метрик (учитывается время загрузки целиком).
+        :return: ImageFile или None, если загрузить не удалось.
+        """
+        started_at = time.monotonic()
+        result = self.get_response(url, stream=True, stage=stage)
+        if result is None:
+            return None
+        image_file = None
         try:
-            result = requests.get(url=url, headers=self.HEADERS)
-            if not result.ok:
-                print(f'get_page - {url}', result)
-            self.URL_REQUEST_COUNTER += 1
-            return result.text
+            with result:
+                if not result.ok:
+                    raise ValueError(f'{url} - {result.status_code}')
+                image_file = self.write_temp_file(result.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE), temp_dir,
+                                                  result.headers.get('Content-Type'))
+            self.metrics.observe(stage, time.monotonic() - started_at)
+            if self.cache is not None and not getattr(result, 'from_cache', False) \
+                    and not getattr(result, 'from_archive', False) and self.cache.should_store(stage, result.headers):
+                self.cache.put(url, stage, result.headers, file_path=image_file.temp_path)
+            if self.archive is not None and self.archive.is_recording:
+                self.archive.put(url, stage, result.status_code, result.headers, file_path=image_file.temp_path)
+            return image_file
         except Exception as ex:
-            print(ex)
-            return f'Не удалось обратиться к странице - {url}'
+            logger.warning('download_to_temp_file - %s', ex, extra={'url': url, 'error': str(ex)})
+            if image_file is not None:
+                os.remove(image_file.temp_path)
+            return None
+
+    def write_temp_file(self, chunks, temp_dir: str, content_type: str = None):
+        """
+        Записывает тело ответа (изображение) по частям во временный файл.
+        Одновременно считается sha256 содержимого и по первым байтам и Content-Type определяется расширение.
+        :param chunks: Итератор частей тела ответа (байты).
+        :param temp_dir: Каталог для временных файлов.
+        :param content_type: Заголовок Content-Type ответа.
+        :return: ImageFile. При ошибке временный файл удаляется, а исключение передается дальше.
+        """
+        temp_dir = self.check_and_create_path(temp_dir)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                digest = hashlib.sha256()
+                head = b''
+                for chunk in chunks:
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    file.write(chunk)
+                    self.metrics.inc('bytes', len(chunk), direction='in')
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return ImageFile(temp_path, digest.hexdigest(), get_image_extension(head, content_type))
 
-    def get_json_page(self, url: str):
+    @staticmethod
+    def decode_json(data):
+        """
+        Разбирает json прямо из байтов ответа, без определения кодировки и декодирования в строку.
+        Если установлен orjson, разбор выполняется им.
+        :param data: Байты или строка.
+        :return: Разобранные данные.
+        """
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def get_json_page(self, url: str, stage: str = 'request'):
         """
         Делает запрос по заданному url.
         :param url: URL адрес.
+        :param stage: Этап сбора для метрик.
         :return: JSON строка преобразованная в словарь.
         """
         try:
-            result = json.loads(self.get_page(url))
+            result = self.decode_json(self.get_binary_page(url, stage))
             return result
         except Exception as ex:
-            print(ex, f'{url} - Полученный ответ не в формате json.')
+            logger.warning('Полученный ответ не в формате json.', extra={'url': url, 'error': str(ex)})
+            return {}
+
+    @property
+    def storage_writer(self):
+        """
+        Поток записи в хранилище, создается при первом обращении.
+        :return: Объект StorageWriter.
+        """
+        if self._storage_writer is None:
+            with self._storage_writer_lock:
+                if self._storage_writer is None:
+                    self._storage_writer = StorageWriter(self.storage, metrics=self.metrics)
+        return self._storage_writer
+
+    def store_record(self, file_path: str, file_name: str, data, overwrite: bool = False):
+        """
+        Передает данные потоку записи в хранилище, не дожидаясь записи на диск.
+        :param file_path: Путь к каталогу.
+        :param file_name: Желаемое имя файла без разширения.
+        :param data: Словарь данных.
+        :param overwrite: Перезаписать, если уже существует.
+        :return: Строка - место, куда будут записаны данные.
+        """
+        return self.storage_writer.put(StorageWriter.KIND_RECORD, file_path, file_name, data, overwrite)
+
+    def store_image(self, file_path: str, file_name: str, data, overwrite: bool = False):
+        """
+        Передает изображение потоку записи в хранилище, не дожидаясь записи на диск.
+        :param file_path: Путь к каталогу.
+        :param file_name: Желаемое имя файла без разширения.
+        :param data: Байты изображения.
+        :param overwrite: Перезаписать, если уже существует.
+        :return: Строка - место, куда будет записано изображение.
+        """
+        return self.storage_writer.put(StorageWriter.KIND_IMAGE, file_path, file_name, data, overwrite)
+
+    def flush_storage(self):
+        """
+        Ждет записи в хранилище всего, что уже передано потоку записи.
+        :return: None.
+        """
+        if self._storage_writer is not None:
+            self._storage_writer.flush()
+
+    def pop_storage_failures(self, file_paths):
+        """
+        Забирает ошибки записи в хранилище для указанных каталогов (после flush_storage()).
+        :param file_paths: Пути к каталогам.
+        :return: Словарь {'Путь к каталогу': исключение}.
+        """
+        if self._storage_writer is None:
             return {}
+        return self._storage_writer.pop_failures(file_paths)
 
     @staticmethod
     def check_and_create_path(path):
@@ -65,12 +626,29 @@ class Parser:
             os.makedirs(file_path)
         return file_path
 
-    def write_data_into_json(self, file_path: str, file_name: str, data):
+    @classmethod
+    def iter_notice_dirs(cls, base_dir: str, skip_dirs=()):
+        """
+        Перебирает каталоги записей 'Страна/Имя/' в каталоге данных.
+        Служебные каталоги (начинающиеся с точки) пропускаются.
+        :param base_dir: Каталог данных.
+        :param skip_dirs: Названия каталогов верхнего уровня, которые не являются каталогами стран.
+        :return: Генератор путей к каталогам записей.
+        """
+        for country in os.scandir(base_dir):
+            if not country.is_dir() or country.name.startswith('.') or country.name in skip_dirs:
+                continue
+            for notice in os.scandir(country.path):
+                if notice.is_dir():
+                    yield notice.path
+
+    def write_data_into_json(self, file_path: str, file_name: str, data, overwrite: bool = False):
         """
         Записывает собранные данные в файл формата json.
         :param file_path: Путь к файлу.
         :param file_name: Желаемое имя файла без разширения.
         :param data: Словарь или список словарей.
+        :param overwrite: Перезаписать файл, если он уже существует.
         :return: Строка с относительной ссылкой на сохраненный json файл.
         """
 
@@ -81,33 +659,13 @@ class Parser:
             try:
                 data = json.loads(data)
             except Exception as ex:
-                print(ex, 'Невозможно преобразовать строку в словарь. \n '
-                          'Может помочь заменить двойные внешние кавычки на одинарные.')
-        if not os.path.exists(full_file_path):
+                logger.error('Невозможно преобразовать строку в словарь (%s). '
+                             'Может помочь заменить двойные внешние кавычки на одинарные.', ex)
+        if overwrite or not os.path.exists(full_file_path):
             with open(full_file_path, 'w', encoding='utf-8') as file:
                 json.dump(data, file, indent=4, ensure_ascii=False)
         else:
-            print(f'Файл "{full_file_path}" уже существует.')
-
-        return full_file_path
-
-    def save_image(self, file_path, file_name, data):
-        """
-        Сохраняет изображения в формат .png в указанный каталог.
-        :param file_path: Путь к файлу.
-        :param file_name: Желаемое имя файла без разширения.
-        :param data: Список собранных данных.
-        :return: Строка с относительной ссылкой на изображение.
-        """
-
-        self.check_and_create_path(file_path)
-
-        full_file_path = f'{file_path}{os.sep}{file_name}.png'
-        if not os.path.exists(full_file_path):
-            with open(full_file_path, 'wb') as file:
-                file.write(data)
-        else:
-            print(f'Файл "{full_file_path}" уже существует.')
+            logger.debug('Файл "%s" уже существует.', full_file_path)
 
         return full_file_path
 
@@ -128,7 +686,7 @@ class Parser:
                 writer = csv.writer(file)
                 writer.writerows(zip(data))
         else:
-            print(f'Файл "{full_file_path}" уже существует.')
+            logger.debug('Файл "%s" уже существует.', full_file_path)
 
         return full_file_path
 
@@ -141,7 +699,7 @@ class Parser:
         """
 
         if not os.path.exists(file_path):
-            print(file_path, 'Неверный путь, либо такого файла не существует')
+            logger.warning('%s - Неверный путь, либо такого файла не существует', file_path)
             return []
         else:
             result_list = []
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from CrawlLogging import get_logger
+
+logger = get_logger('partition')
+
+
+class PartitionPlan:
+    """
+    План разделения запросов по странам для следующих запусков.
+    Для каждой ссылки запроса по стране хранит общее количество найденных и время проверки,
+    количества найденных по ссылкам с фильтром по полу (родительские запросы) и конечные ссылки запросов поиска
+    с количеством найденных, временем проверки и отметками truncated (найдено больше, чем сайт выдает
+    на один запрос) и splittable (запрос еще можно разделить).
+    Пока количество найденных по родительскому запросу не изменилось и среди его конечных ссылок нет переполненных,
+    его разделение берется из плана без проверочных запросов (см. InterpolParser.partition_url).
+    Конечные ссылки хранятся и без результатов, чтобы покрывать всю выдачу родительского запроса.
+    Файл хранит версию формата (VERSION): план другой версии, например сохраненный без пустых ссылок,
+    не загружается и строится заново.
+    """
+    VERSION = 2
+
+    def __init__(self, file_path: str, max_total: int, reset: bool = False):
+        """
+        :param file_path: Путь к json файлу плана.
+        :param max_total: Максимальное количество результатов, которое сайт выдает на один запрос.
+        :param reset: Начать план заново, не загружая сохраненный (файл заменяется при save).
+        """
+        self.file_path = file_path
+        self.max_total = max_total
+        self.countries = {}
+        self._country_urls = {}
+        self._lock = threading.Lock()
+        if not reset:
+            self.load()
+
+    def load(self):
+        """
+        Загружает план из файла, если он есть.
+        :return: None.
+        """
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, encoding='utf-8') as file:
+                    data = json.load(file)
+                if data.get('version') == self.VERSION:
+                    self.countries = data['countries']
+                else:
+                    logger.info('PartitionPlan.load - план другой версии, разделение строится заново.')
+            except Exception as ex:
+                logger.warning('PartitionPlan.load - %s', ex)
+                self.countries = {}
+        self._country_urls = {url: country_url for country_url, country in self.countries.items()
+                              for url in country['partitions']}
+
+    def save(self):
+        """
+        Сохраняет план в файл через временный файл с последующей заменой.
+        :return: Строка с путем к файлу.
+        """
+        directory = os.path.dirname(self.file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(f'{self.file_path}.tmp', 'w', encoding='utf-8') as file:
+                json.dump({'version': self.VERSION, 'countries': self.countries}, file, indent=4, ensure_ascii=False)
+            os.replace(f'{self.file_path}.tmp', self.file_path)
+        return self.file_path
+
+    def exists(self):
+        """
+        :return: True, если план уже сохранялся.
+        """
+        return os.path.exists(self.file_path)
+
+    @staticmethod
+    def is_stale(partitions: dict):
+        """
+        :param partitions: Словарь {'Ссылка запроса': запись плана}.
+        :return: True, если среди ссылок есть переполненная, которую еще можно разделить.
+        """
+        return any(partition['truncated'] and partition['splittable'] for partition in partitions.values())
+
+    def get_country_partitions(self, country_url: str, total: int):
+        """
+        Отдает разделение запроса по стране, если оно еще подходит, и отмечает время проверки.
+        :param country_url: Ссылка общего запроса.
+        :param total: Текущее количество найденных по запросу.
+        :return: Список ссылок запросов поиска или None, если запрос необходимо разделить заново.
+        """
+        with self._lock:
+            country = self.countries.get(country_url)
+            if country is None or country['total'] != total or self.is_stale(country['partitions']):
+                return None
+            country['checked_at'] = time.time()
+            return list(country['partitions'])
+
+    def get_parent_partitions(self, country_url: str, parent_url: str, total: int):
+        """
+        Отдает конечные ссылки родительского запроса (с фильтром по полу), если его разделение еще подходит.
+        :param country_url: Ссылка общего запроса.
+        :param parent_url: Ссылка родительского запроса.
+        :param total: Текущее количество найденных по родительскому запросу.
+        :return: Словарь {'Ссылка запроса': (количество найденных, можно ли разделить)} или None.
+        """
+        with self._lock:
+            country = self.countries.get(country_url)
+            if country is None or country['parents'].get(parent_url) != total:
+                return None
+            partitions = {url: partition for url, partition in country['partitions'].items()
+                          if url.startswith(f'{parent_url}&')}
+            if not partitions or self.is_stale(partitions):
+                return None
+            return {url: (partition['total'], partition['splittable']) for url, partition in partitions.items()}
+
+    def set_country(self, country_url: str, total: int, parents: dict, partitions: dict):
+        """
+        Запоминает новое разделение запроса по стране.
+        :param country_url: Ссылка общего запроса.
+        :param total: Количество найденных по запросу.
+        :param parents: Словарь {'Ссылка родительского запроса': количество найденных}.
+        :param partitions: Словарь {'Ссылка запроса': (количество найденных, можно ли разделить)}.
+        :return: None.
+        """
+        now = time.time()
+        with self._lock:
+            old = self.countries.get(country_url, {}).get('partitions', {})
+            for url in old:
+                self._country_urls.pop(url, None)
+            self.countries[country_url] = {
+                'total': total, 'checked_at': now, 'parents': parents,
+                'partitions': {url: {'total': partition_total,
+                                     'checked_at': old[url]['checked_at'] if url in old
+                                     and old[url]['total'] == partition_total else now,
+                                     'truncated': partition_total > self.max_total, 'splittable': splittable}
+                               for url, (partition_total, splittable) in partitions.items()}}
+            for url in partitions:
+                self._country_urls[url] = country_url
+
+    def update_partition(self, partition_url: str, total: int):
+        """
+        Запоминает количество найденных, полученное со страницы поиска.
+        :param partition_url: Ссылка запроса поиска.
+        :param total: Количество найденных.
+        :return: True, если запрос переполнен и его можно разделить.
+        """
+        with self._lock:
+            country_url = self._country_urls.get(partition_url)
+            if country_url is None:
+                return False
+            partition = self.countries[country_url]['partitions'][partition_url]
+            partition.update({'total': total, 'checked_at': time.time(), 'truncated': total > self.max_total})
+            return partition['truncated'] and partition['splittable']
+
+    def get_country_url(self, partition_url: str):
+        """
+        :param partition_url: Ссылка запроса поиска.
+        :return: Ссылка общего запроса, к которому относится ссылка, или None.
+        """
+        with self._lock:
+            return self._country_urls.get(partition_url)
+
+    def get_truncated(self):
+        """
+        :return: Словарь {'Ссылка запроса': количество найденных} переполненных запросов.
+        """
+        with self._lock:
+            return {url: partition['total'] for country in self.countries.values()
+                    for url, partition in country['partitions'].items() if partition['truncated']}
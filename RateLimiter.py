@@ -0,0 +1,210 @@
+import asyncio
+import collections
+import email.utils
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Общий для всех запросов ограничитель скорости и параллельности, подстраивающийся под ответы сервера.
+    Скорость ограничивается ведром токенов (rate запросов в секунду), параллельность - лимитом одновременных
+    запросов (limit). Оба значения растут понемногу, пока ответы быстрые и без ошибок (аддитивное увеличение),
+    и уменьшаются в decrease_factor раз при 429 (мультипликативное уменьшение), а также при 5xx, ошибках соединения
+    и медленных ответах, если их доля за последнюю секунду больше error_threshold - единичные ошибки
+    не считаются перегрузкой. Заголовок Retry-After приостанавливает все запросы на указанное время.
+    Пока сервер ни разу не ограничил запросы, скорость и параллельность не ограничиваются (rate и limit = None),
+    после первого ограничения отсчет идет от фактически достигнутых значений.
+    """
+    THROTTLE_STATUS_CODES = (429,)
+    ERROR_STATUS_CODES = (500, 502, 503, 504)
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, limit: int = None, min_limit: int = 1, max_limit: int = None, rate: float = None,
+                 min_rate: float = 1.0, max_rate: float = None, rate_increase: float = 5.0,
+                 decrease_factor: float = 0.5, latency_target: float = 5.0, cooldown: float = 1.0,
+                 error_threshold: float = 0.1):
+        """
+        :param limit: Начальное количество одновременных запросов. None - не ограничено до первого ограничения
+        сервером.
+        :param min_limit: Минимальное количество одновременных запросов.
+        :param max_limit: Максимальное количество одновременных запросов. None - без ограничения.
+        :param rate: Начальная скорость (запросов в секунду). None - не ограничена до первого ограничения сервером.
+        :param min_rate: Минимальная скорость.
+        :param max_rate: Максимальная скорость. None - без ограничения.
+        :param rate_increase: На сколько запросов в секунду растет скорость за секунду успешных ответов.
+        :param decrease_factor: Во сколько раз уменьшаются скорость и параллельность при ограничении сервером.
+        :param latency_target: Время ответа в секундах, выше которого ответ считается признаком перегрузки.
+        :param cooldown: Минимальный интервал в секундах между уменьшениями, чтобы одновременные ошибки
+        одной перегрузки не уменьшали скорость много раз подряд.
+        :param error_threshold: Доля ошибок (5xx, ошибки соединения, медленные ответы) за последнюю секунду,
+        выше которой скорость уменьшается.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_increase = rate_increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.error_threshold = error_threshold
+        self._limit = None if limit is None else float(limit)
+        self._rate = rate
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._decreased_at = 0.0
+        self._in_flight = 0
+        self._completed = collections.deque()
+        self._recent_error_number = 0
+        self._throttled_number = 0
+        self._condition = threading.Condition()
+
+    @property
+    def rate(self):
+        """
+        :return: Текущая скорость (запросов в секунду) или None, если скорость не ограничена.
+        """
+        return self._rate
+
+    @property
+    def limit(self):
+        """
+        :return: Текущее количество одновременных запросов или None, если параллельность не ограничена.
+        """
+        limit = self._limit
+        return None if limit is None else int(limit)
+
+    def get_stats(self):
+        """
+        :return: Словарь {'rate': ..., 'limit': ..., 'in_flight': ..., 'observed_rate': ..., 'throttled': ...}.
+        """
+        with self._condition:
+            return {'rate': None if self._rate is None else round(self._rate, 2), 'limit': self.limit,
+                    'in_flight': self._in_flight, 'observed_rate': self._get_observed_rate(time.monotonic()),
+                    'throttled': self._throttled_number}
+
+    def _get_observed_rate(self, now: float):
+        while self._completed and self._completed[0][0] < now - 1.0:
+            if self._completed.popleft()[1]:
+                self._recent_error_number -= 1
+        return len(self._completed)
+
+    def _try_acquire(self):
+        """
+        :return: None, если разрешение получено, иначе время ожидания в секундах (0 - до завершения запроса).
+        """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._limit is not None and self._in_flight >= max(int(self._limit), self.min_limit):
+            return 0
+        if self._rate is not None:
+            self._tokens = min(1.0, self._tokens + (now - self._refilled_at) * self._rate)
+            self._refilled_at = now
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self._rate
+            self._tokens -= 1.0
+        self._in_flight += 1
+        return None
+
+    def acquire(self):
+        """
+        Ждет разрешения на запрос. После запроса необходимо вызвать release.
+        :return: Время получения разрешения (time.monotonic) для расчета времени ответа.
+        """
+        with self._condition:
+            while True:
+                wait = self._try_acquire()
+                if wait is None:
+                    return time.monotonic()
+                self._condition.wait(wait or None)
+
+    async def async_acquire(self):
+        """
+        Асинхронный вариант acquire, не блокирующий цикл событий.
+        :return: Время получения разрешения (time.monotonic).
+        """
+        while True:
+            with self._condition:
+                wait = self._try_acquire()
+            if wait is None:
+                return time.monotonic()
+            await asyncio.sleep(wait or self.POLL_INTERVAL)
+
+    def release(self, started_at: float, status: int = None, retry_after=None):
+        """
+        Сообщает результат запроса и подстраивает скорость и параллельность.
+        :param started_at: Значение, возвращенное acquire.
+        :param status: Код ответа. None - ошибка соединения.
+        :param retry_after: Значение заголовка Retry-After (секунды или дата) или None.
+        :return: None.
+        """
+        now = time.monotonic()
+        latency = now - started_at
+        with self._condition:
+            self._in_flight -= 1
+            is_error = status is None or status in self.ERROR_STATUS_CODES or latency > self.latency_target
+            self._completed.append((now, is_error))
+            self._recent_error_number += is_error
+            completed_number = self._get_observed_rate(now)
+            retry_after = self.parse_retry_after(retry_after)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if status in self.THROTTLE_STATUS_CODES or retry_after \
+                    or (is_error and self._recent_error_number > self.error_threshold * completed_number):
+                self._throttled_number += 1
+                self._decrease(now)
+            elif not is_error and status < 400:
+                self._increase()
+            self._condition.notify_all()
+
+    def cancel(self):
+        """
+        Освобождает разрешение отмененного запроса (например, проигравшего дублирующего) без учета результата.
+        :return: None.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _decrease(self, now: float):
+        if now - self._decreased_at < self.cooldown:
+            return
+        self._decreased_at = now
+        # Первое ограничение сервером: параллельность и скорость отсчитываются от фактически достигнутых.
+        current_limit = self._limit if self._limit is not None else self._in_flight + 1
+        self._limit = max(float(self.min_limit), current_limit * self.decrease_factor)
+        current_rate = self._rate if self._rate is not None else max(self._get_observed_rate(now), self.min_rate)
+        self._rate = max(self.min_rate, current_rate * self.decrease_factor)
+        self._tokens = min(self._tokens, 0.0)
+
+    def _increase(self):
+        # За одно "окно" из limit успешных ответов параллельность растет на 1,
+        # за секунду успешных ответов скорость растет на rate_increase.
+        if self._limit is not None:
+            self._limit += 1.0 / max(self._limit, 1.0)
+            if self.max_limit is not None:
+                self._limit = min(self._limit, float(self.max_limit))
+        if self._rate is not None:
+            self._rate += self.rate_increase / max(self._rate, 1.0)
+            if self.max_rate is not None:
+                self._rate = min(self._rate, self.max_rate)
+
+    @staticmethod
+    def parse_retry_after(retry_after):
+        """
+        :param retry_after: Значение заголовка Retry-After - количество секунд или HTTP дата.
+        :return: Количество секунд ожидания или None.
+        """
+        if retry_after is None:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,140 @@
+import concurrent.futures
+import socket
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_local = threading.local()
+
+
+class RequestHandle:
+    """
+    Состояние одного запроса из пары с дублированием (Parser.send_hedged_request), позволяющее отменить его
+    из другого потока. Отмена сразу освобождает разрешение ограничителя скорости (rate_limiter.cancel),
+    а если запрос уже отправлен - закрывает его соединение (shutdown сокета), так что поток запроса
+    не ждет ответа, который уже не нужен. Соединение текущего запроса запоминает AbortableHTTPAdapter.
+    """
+
+    def __init__(self, rate_limiter):
+        """
+        :param rate_limiter: Ограничитель скорости, разрешение которого получает запрос.
+        """
+        self.rate_limiter = rate_limiter
+        self.cancelled = False
+        self.started_at = None
+        self._started = False
+        self._connection = None
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._started_or_finished = threading.Event()
+
+    @staticmethod
+    def current():
+        """
+        :return: RequestHandle запроса, выполняемого текущим потоком, или None.
+        """
+        return getattr(_local, 'handle', None)
+
+    def start(self):
+        """
+        Отмечает начало запроса в текущем потоке (после получения разрешения ограничителя скорости).
+        :return: False, если запрос уже отменен и выполнять его не нужно.
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._started = True
+            self.started_at = time.monotonic()
+            _local.handle = self
+            self._started_or_finished.set()
+            return True
+
+    def attach(self, connection):
+        """
+        Запоминает соединение, через которое отправляется запрос (в том числе при повторе после ошибки).
+        :param connection: Соединение urllib3.
+        :return: None. Если запрос отменен - исключение concurrent.futures.CancelledError.
+        """
+        with self._lock:
+            if self.cancelled:
+                raise concurrent.futures.CancelledError()
+            self._connection = connection
+
+    def finish(self):
+        """
+        Отмечает завершение запроса.
+        :return: False, если запрос был отменен: разрешение уже освобождено, а ответ нужно закрыть.
+        """
+        with self._lock:
+            _local.handle = None
+            self._connection = None
+            self._finished.set()
+            self._started_or_finished.set()
+            return not self.cancelled
+
+    def wait(self, timeout: float):
+        """
+        :param timeout: Время ожидания в секундах.
+        :return: True, если запрос завершился или отменен.
+        """
+        return self._finished.wait(max(timeout, 0.0))
+
+    def wait_started(self):
+        """
+        Ждет начала запроса (получения разрешения ограничителя скорости), отмены или завершения.
+        :return: Время начала запроса (time.monotonic) или None, если запрос завершился или отменен, не начавшись.
+        """
+        self._started_or_finished.wait()
+        return self.started_at
+
+    def cancel(self):
+        """
+        Отменяет запрос, если он еще не завершился.
+        :return: True, если запрос отменен этим вызовом.
+        """
+        with self._lock:
+            if self.cancelled or self._finished.is_set():
+                return False
+            self.cancelled = True
+            if not self._started:
+                self._finished.set()
+                self._started_or_finished.set()
+                return True
+            self.rate_limiter.cancel()
+            sock = getattr(self._connection, 'sock', None)
+            if sock is not None:
+                try:
+                    # shutdown базового сокета прерывает чтение в другом потоке, не трогая состояние TLS.
+                    socket.socket.shutdown(sock, socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            return True
+
+
+class AbortableHTTPConnectionPool(HTTPConnectionPool):
+    def _make_request(self, conn, *args, **kwargs):
+        handle = RequestHandle.current()
+        if handle is not None:
+            handle.attach(conn)
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class AbortableHTTPSConnectionPool(HTTPSConnectionPool):
+    def _make_request(self, conn, *args, **kwargs):
+        handle = RequestHandle.current()
+        if handle is not None:
+            handle.attach(conn)
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class AbortableHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter, пулы соединений которого сообщают соединение текущего запроса его RequestHandle,
+    чтобы запрос можно было прервать из другого потока.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': AbortableHTTPConnectionPool,
+                                                   'https': AbortableHTTPSConnectionPool}
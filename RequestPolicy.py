@@ -0,0 +1,141 @@
+import collections
+import threading
+import time
+
+
+class RequestPolicy:
+    """
+    Сроки запросов сбора: таймауты соединения и чтения по видам запросов (этапам), общий срок сбора
+    и дублирующие запросы (hedging) для сокращения "хвоста" времени ответа.
+    Если ответ на запрос этапа из hedge_stages не получен за время, в которое укладываются HEDGE_QUANTILE
+    последних успешных ответов этапа (не меньше min_hedge_delay), отправляется такой же второй запрос
+    и используется ответ, пришедший первым. Дублирующих запросов не больше hedge_budget от всех запросов,
+    поэтому дополнительная нагрузка на сайт ограничена (при hedge_budget = 0 дублирования нет).
+    После истечения общего срока (run_timeout) новые запросы не отправляются, а таймауты чтения
+    не выходят за оставшееся время; незавершенные задачи остаются в очереди для resume().
+    """
+    DEFAULT_TIMEOUTS = {'country': (5.0, 30.0), 'probe': (5.0, 15.0), 'listing': (5.0, 30.0), 'detail': (5.0, 15.0),
+                        'image_index': (5.0, 15.0), 'image': (5.0, 60.0)}
+    DEFAULT_TIMEOUT = (5.0, 30.0)
+    HEDGE_STAGES = ('probe', 'listing', 'detail', 'image_index')
+    HEDGE_QUANTILE = 0.95
+    HEDGE_WINDOW = 200
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, timeouts: dict = None, default_timeout: tuple = DEFAULT_TIMEOUT, run_timeout: float = None,
+                 hedge_budget: float = 0.0, hedge_stages=HEDGE_STAGES, min_hedge_delay: float = 0.05,
+                 max_hedge_workers: int = 64):
+        """
+        :param timeouts: Словарь {'Этап': (таймаут соединения, таймаут чтения)} в секундах, дополняющий
+        DEFAULT_TIMEOUTS. Этапы: country, probe, listing, detail, image_index, image.
+        :param default_timeout: Таймауты остальных этапов.
+        :param run_timeout: Общий срок сбора в секундах от start(). None - без срока.
+        :param hedge_budget: Доля дублирующих запросов от всех запросов, например 0.05 - не больше 5%.
+        :param hedge_stages: Этапы, запросы которых можно дублировать. Загрузка изображений по частям
+        не дублируется.
+        :param min_hedge_delay: Минимальное ожидание ответа перед дублирующим запросом в секундах.
+        :param max_hedge_workers: Количество потоков, выполняющих дублирующие запросы (основной - в потоке сбора).
+        """
+        self.timeouts = {**self.DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self.run_timeout = run_timeout
+        self.hedge_budget = hedge_budget
+        self.hedge_stages = tuple(hedge_stages or ())
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_workers = max_hedge_workers
+        self._deadline = None
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=self.HEDGE_WINDOW))
+        self._hedge_delays = {}
+        self._observed_numbers = collections.Counter()
+        self._request_number = 0
+        self._hedge_number = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Начинает отсчет общего срока сбора (если он задан).
+        :return: None.
+        """
+        self._deadline = None if self.run_timeout is None else time.monotonic() + self.run_timeout
+
+    def get_remaining(self):
+        """
+        :return: Оставшееся до общего срока время в секундах или None, если срока нет.
+        """
+        return None if self._deadline is None else self._deadline - time.monotonic()
+
+    def is_expired(self):
+        """
+        :return: True, если общий срок сбора истек.
+        """
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def get_timeout(self, stage: str):
+        """
+        :param stage: Этап сбора.
+        :return: Пара (таймаут соединения, таймаут чтения), не больше оставшегося до общего срока времени.
+        """
+        connect_timeout, read_timeout = self.timeouts.get(stage, self.default_timeout)
+        remaining = self.get_remaining()
+        if remaining is not None:
+            remaining = max(remaining, 0.001)
+            connect_timeout, read_timeout = min(connect_timeout, remaining), min(read_timeout, remaining)
+        return connect_timeout, read_timeout
+
+    def is_hedged(self, stage: str):
+        """
+        :param stage: Этап сбора.
+        :return: True, если запросы этапа можно дублировать.
+        """
+        return self.hedge_budget > 0 and stage in self.hedge_stages
+
+    def observe(self, stage: str, seconds: float, success: bool = True):
+        """
+        Учитывает запрос в бюджете дублирования и запоминает время успешного ответа этапа.
+        :param stage: Этап сбора.
+        :param seconds: Время ответа в секундах.
+        :param success: Ответ получен и не является ошибкой.
+        :return: None.
+        """
+        with self._lock:
+            self._request_number += 1
+            if not success or stage not in self.hedge_stages:
+                return
+            latencies = self._latencies[stage]
+            latencies.append(seconds)
+            self._observed_numbers[stage] += 1
+            # Квантиль пересчитывается раз в HEDGE_MIN_SAMPLES ответов, а не на каждый запрос.
+            if len(latencies) >= self.HEDGE_MIN_SAMPLES and self._observed_numbers[stage] % self.HEDGE_MIN_SAMPLES == 0:
+                ordered = sorted(latencies)
+                self._hedge_delays[stage] = max(self.min_hedge_delay,
+                                                ordered[min(len(ordered) - 1, int(self.HEDGE_QUANTILE * len(ordered)))])
+
+    def get_hedge_delay(self, stage: str):
+        """
+        :param stage: Этап сбора.
+        :return: Время ожидания ответа перед дублирующим запросом в секундах или None, если запрос не дублируется
+        (этап не из hedge_stages или еще мало наблюдений).
+        """
+        if not self.is_hedged(stage):
+            return None
+        return self._hedge_delays.get(stage)
+
+    def try_hedge(self):
+        """
+        Резервирует дублирующий запрос, если бюджет дублирования не исчерпан.
+        :return: True, если дублирующий запрос можно отправить.
+        """
+        with self._lock:
+            if self._hedge_number + 1 > self.hedge_budget * max(self._request_number, 1):
+                return False
+            self._hedge_number += 1
+            return True
+
+    def get_stats(self):
+        """
+        :return: Словарь {'requests', 'hedges', 'hedge_delays', 'remaining'}.
+        """
+        with self._lock:
+            return {'requests': self._request_number, 'hedges': self._hedge_number,
+                    'hedge_delays': {stage: round(delay, 4) for stage, delay in self._hedge_delays.items()},
+                    'remaining': self.get_remaining()}
@@ -0,0 +1,331 @@
+import hashlib
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from CrawlLogging import get_logger
+
+logger = get_logger('cache')
+
+
+class ResponseCache:
+    """
+    Кеш ответов на диске. Тела ответов хранятся файлами в каталоге кеша, индекс - в SQLite:
+    ссылка, этап, ETag, Last-Modified, Content-Type, время получения и последнего обращения, размер.
+    Пока не истек срок жизни этапа (ttls), ответ отдается из кеша без запроса. После этого запрос
+    повторяется с If-None-Match/If-Modified-Since, и ответ 304 продлевает запись без загрузки тела.
+    Ответы без ETag и Last-Modified сохраняются только для этапов с ненулевым сроком жизни.
+    Общий размер тел ограничен max_size, при превышении удаляются давно не использованные записи (LRU)
+    до EVICT_RATIO * max_size.
+    Индекс целиком держится в памяти, а изменения записываются в SQLite пачками по FLUSH_SIZE и при close.
+    Тела ответов записывает отдельный поток, поэтому запросы не ждут ни диска, ни базы данных.
+    """
+    DEFAULT_TTLS = {'country': 30 * 24 * 60 * 60, 'image': 30 * 24 * 60 * 60}
+    DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+    INDEX_FILE_NAME = 'index.sqlite3'
+    EVICT_RATIO = 0.9
+    FLUSH_SIZE = 500
+
+    def __init__(self, directory: str, ttls: dict = None, default_ttl: float = 0.0,
+                 max_size: int = DEFAULT_MAX_SIZE, max_queue_size: int = 1000):
+        """
+        :param directory: Каталог кеша.
+        :param ttls: Словарь {'Этап': срок жизни в секундах}, дополняющий DEFAULT_TTLS.
+        Этапы соответствуют видам запросов: country, probe, listing, detail, image_index, image.
+        :param default_ttl: Срок жизни для остальных этапов. 0 - ответ всегда проверяется на сервере.
+        :param max_size: Максимальный общий размер тел ответов в байтах.
+        :param max_queue_size: Размер очереди записи, при заполнении запросы ждут запись.
+        """
+        self.directory = directory
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.max_queue_size = max_queue_size
+        self._queue = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._connection = None
+        self._entries = None
+        self._pending = {}
+        self._size = 0
+        self._directories = set()
+
+    @property
+    def entries(self):
+        """
+        Индекс в памяти, загружается из SQLite при первом обращении (вызывать под self._lock).
+        :return: Словарь {'Ссылка': словарь записи}.
+        """
+        if self._entries is None:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self.directory, self.INDEX_FILE_NAME),
+                                               check_same_thread=False, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'url TEXT PRIMARY KEY, stage TEXT, etag TEXT, last_modified TEXT, content_type TEXT, '
+                'fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)')
+            rows = self._connection.execute(
+                'SELECT url, stage, etag, last_modified, content_type, fetched_at, accessed_at, size FROM responses')
+            self._entries = {}
+            for url, stage, etag, last_modified, content_type, fetched_at, accessed_at, size in rows:
+                self._entries[url] = {'stage': stage, 'etag': etag, 'last_modified': last_modified,
+                                      'content_type': content_type, 'fetched_at': fetched_at,
+                                      'accessed_at': accessed_at, 'size': size}
+            self._size = sum(entry['size'] for entry in self._entries.values())
+        return self._entries
+
+    def get_ttl(self, stage: str):
+        """
+        :param stage: Этап сбора.
+        :return: Срок жизни ответа этапа в секундах.
+        """
+        return self.ttls.get(stage, self.default_ttl)
+
+    def get_body_path(self, url: str):
+        """
+        :param url: URL адрес.
+        :return: Строка - путь к файлу тела ответа.
+        """
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, url: str):
+        """
+        Находит запись и отмечает обращение к ней.
+        :param url: URL адрес.
+        :return: Словарь {'url', 'etag', 'last_modified', 'content_type', 'fetched_at', 'size', 'path'} или None.
+        """
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            entry['accessed_at'] = time.time()
+            self._pending[url] = entry
+            entry = dict(entry)
+        entry.update({'url': url, 'path': self.get_body_path(url)})
+        return entry
+
+    def is_fresh(self, entry: dict, stage: str):
+        """
+        :param entry: Запись кеша.
+        :param stage: Этап сбора.
+        :return: True, если ответ можно отдать без запроса.
+        """
+        return time.time() - entry['fetched_at'] < self.get_ttl(stage)
+
+    @staticmethod
+    def get_validators(entry: dict):
+        """
+        :param entry: Запись кеша или None.
+        :return: Словарь заголовков условного запроса.
+        """
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def should_store(self, stage: str, headers):
+        """
+        :param stage: Этап сбора.
+        :param headers: Заголовки ответа.
+        :return: True, если ответ имеет смысл сохранять.
+        """
+        if 'no-store' in headers.get('Cache-Control', ''):
+            return False
+        return bool(self.get_ttl(stage) or headers.get('ETag') or headers.get('Last-Modified'))
+
+    def put(self, url: str, stage: str, headers, body: bytes = None, file_path: str = None):
+        """
+        Передает ответ потоку записи. Тело записывается во временный файл с последующей заменой,
+        запись появляется в индексе после записи тела.
+        :param url: URL адрес.
+        :param stage: Этап сбора.
+        :param headers: Заголовки ответа.
+        :param body: Тело ответа.
+        :param file_path: Файл с телом ответа вместо body. Связывается жесткой ссылкой (или копируется) сразу,
+        так как после возврата файл может быть перемещен.
+        :return: None.
+        """
+        temp_path = None
+        if body is None:
+            temp_path = self.get_temp_path(url)
+            try:
+                try:
+                    os.link(file_path, temp_path)
+                except OSError:
+                    shutil.copyfile(file_path, temp_path)
+            except Exception as ex:
+                logger.warning('ResponseCache.put - %s', ex, extra={'url': url, 'error': str(ex)})
+                return
+        with self._lock:
+            if self._writer is None:
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+                self._writer = threading.Thread(target=self._run, name='ResponseCache', daemon=True)
+                self._writer.start()
+            writer_queue = self._queue
+        writer_queue.put((url, stage, headers.get('ETag'), headers.get('Last-Modified'), headers.get('Content-Type'),
+                          body, temp_path))
+
+    def get_temp_path(self, url: str):
+        """
+        :param url: URL адрес.
+        :return: Строка - путь к временному файлу тела ответа, уникальный для потока.
+        """
+        body_path = self.get_body_path(url)
+        directory = os.path.dirname(body_path)
+        if directory not in self._directories:
+            os.makedirs(directory, exist_ok=True)
+            self._directories.add(directory)
+        return f'{body_path}.{threading.get_ident()}.part'
+
+    def _store(self, url: str, stage: str, etag, last_modified, content_type, body: bytes, temp_path: str):
+        try:
+            if temp_path is None:
+                temp_path = self.get_temp_path(url)
+                with open(temp_path, 'wb') as file:
+                    file.write(body)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self.get_body_path(url))
+        except Exception as ex:
+            logger.warning('ResponseCache.put - %s', ex, extra={'url': url, 'error': str(ex)})
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        now = time.time()
+        entry = {'stage': stage, 'etag': etag, 'last_modified': last_modified, 'content_type': content_type,
+                 'fetched_at': now, 'accessed_at': now, 'size': size}
+        with self._lock:
+            old = self.entries.get(url)
+            self.entries[url] = self._pending[url] = entry
+            self._size += size - (old['size'] if old else 0)
+            if self._size > self.max_size:
+                self._evict()
+            flush = len(self._pending) >= self.FLUSH_SIZE
+        if flush:
+            self.flush()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            self._store(*item)
+
+    def wait(self):
+        """
+        Ждет записи всего, что уже передано потоку записи.
+        :return: None.
+        """
+        with self._lock:
+            writer_queue = self._queue if self._writer is not None else None
+        if writer_queue is not None:
+            done = threading.Event()
+            writer_queue.put(done)
+            done.wait()
+
+    def touch(self, url: str, headers):
+        """
+        Продлевает запись после ответа 304 и запоминает новые ETag/Last-Modified, если сервер их прислал.
+        :param url: URL адрес.
+        :param headers: Заголовки ответа 304.
+        :return: None.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return
+            entry.update({'fetched_at': now, 'accessed_at': now,
+                          'etag': headers.get('ETag') or entry['etag'],
+                          'last_modified': headers.get('Last-Modified') or entry['last_modified']})
+            self._pending[url] = entry
+
+    def remove(self, url: str):
+        """
+        Удаляет запись (например, если файл тела ответа пропал).
+        :param url: URL адрес.
+        :return: None.
+        """
+        with self._lock:
+            entry = self.entries.pop(url, None)
+            if entry is None:
+                return
+            self._pending[url] = None
+            self._size -= entry['size']
+        if os.path.exists(self.get_body_path(url)):
+            os.remove(self.get_body_path(url))
+
+    def _evict(self):
+        # Вызывается под self._lock: удаляет давно не использованные записи, пока размер больше
+        # EVICT_RATIO * max_size, чтобы следующие записи не запускали удаление каждый раз.
+        for url, entry in sorted(self._entries.items(), key=lambda item: item[1]['accessed_at']):
+            if self._size <= self.max_size * self.EVICT_RATIO:
+                break
+            del self._entries[url]
+            self._pending[url] = None
+            self._size -= entry['size']
+            body_path = self.get_body_path(url)
+            if os.path.exists(body_path):
+                os.remove(body_path)
+
+    def flush(self):
+        """
+        Записывает накопленные изменения индекса в SQLite одной транзакцией.
+        :return: None.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._entries is None:
+                    return
+                pending, self._pending = self._pending, {}
+                pending = {url: None if entry is None else dict(entry) for url, entry in pending.items()}
+            if not pending:
+                return
+            self._connection.execute('BEGIN')
+            self._connection.executemany('DELETE FROM responses WHERE url = ?',
+                                         [(url,) for url, entry in pending.items() if entry is None])
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO responses '
+                '(url, stage, etag, last_modified, content_type, fetched_at, accessed_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(url, entry['stage'], entry['etag'], entry['last_modified'], entry['content_type'],
+                  entry['fetched_at'], entry['accessed_at'], entry['size'])
+                 for url, entry in pending.items() if entry is not None])
+            self._connection.execute('COMMIT')
+
+    def get_size(self):
+        """
+        :return: Общий размер тел ответов в байтах.
+        """
+        with self._lock:
+            return sum(entry['size'] for entry in self.entries.values())
+
+    def close(self):
+        """
+        Дожидается записи тел ответов, записывает изменения и закрывает индекс.
+        При следующем обращении он загрузится заново.
+        :return: None.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+        self.flush()
+        with self._flush_lock, self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            self._connection = None
+            self._entries = None
@@ -0,0 +1,325 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import shutil
+
+from CrawlLogging import get_logger, setup_logging
+from InterpolParser import InterpolParser
+from NoticeManifest import NoticeManifest
+from Parser import Parser
+from RateLimiter import RateLimiter
+from RequestPolicy import RequestPolicy
+from WorkQueue import WorkQueue
+
+logger = get_logger('shard')
+
+
+def run_shard(parser_class, parser_options: dict, shard_index: int, shard_count: int, shard_dir: str,
+              rate_limiter_options: dict = None, incremental: bool = False, log_options: dict = None,
+              request_policy_options: dict = None):
+    """
+    Собирает один шард в его каталог (выполняется в отдельном процессе или на отдельной машине).
+    :param parser_class: Класс сборщика (InterpolParser или наследник).
+    :param parser_options: Параметры конструктора сборщика, например {'max_threads': 5}.
+    :param shard_index: Номер шарда.
+    :param shard_count: Количество шардов.
+    :param shard_dir: Каталог данных шарда.
+    :param rate_limiter_options: Параметры RateLimiter шарда. None - настройки по умолчанию.
+    :param incremental: Инкрементальный сбор.
+    :param log_options: Параметры CrawlLogging.setup_logging для процесса шарда. None - логирование не настраивается.
+    :param request_policy_options: Параметры RequestPolicy шарда (таймауты, run_timeout, hedge_budget).
+    None - настройки по умолчанию.
+    :return: Словарь {'shard': номер, 'requests': количество запросов, 'queue': состояние очереди задач}.
+    """
+    if log_options is not None:
+        setup_logging(**log_options)
+    rate_limiter = RateLimiter(**rate_limiter_options) if rate_limiter_options else None
+    request_policy = RequestPolicy(**request_policy_options) if request_policy_options else None
+    parser = parser_class(shard_index=shard_index, shard_count=shard_count, base_dir=shard_dir,
+                          rate_limiter=rate_limiter, request_policy=request_policy, **parser_options)
+    try:
+        parser.get_all_rednotice_data(incremental=incremental)
+        stats = {kind: parser.work_queue.get_stats(kind)
+                 for kind in (WorkQueue.KIND_COUNTRY, WorkQueue.KIND_PARTITION, WorkQueue.KIND_NOTICE)}
+    finally:
+        parser.close()
+    parser.metrics.dump(parser.BASE_DIR_FOR_DATA)
+    return {'shard': shard_index, 'requests': parser.URL_REQUEST_COUNTER, 'queue': stats}
+
+
+class ShardedCrawl:
+    """
+    Сбор, разделенный на шарды: каждый шард собирает свою часть запросов в отдельном процессе
+    (или на отдельной машине) в свой каталог '<shards_dir>/<номер>_of_<количество>/', со своими очередью задач,
+    списком известных разыскиваемых и ограничителем скорости. Метод merge объединяет результаты шардов в base_dir.
+    Запросы делятся детерминированно, по md5 ссылки (InterpolParser.get_shard_index).
+    С планом (plan=True) запросы по странам один раз разделяются заранее (all_prepared_country_urls.csv),
+    и шарды делят между собой уже ссылки запросов поиска - большая страна не достается целиком одному шарду.
+    Без плана шарды делят между собой страны и разделяют свои запросы сами.
+    """
+    PREPARED_URLS_FILE_NAME = 'all_prepared_country_urls'
+    PREPARED_LISTING_FILE_NAME = 'prepared_rednotice_listing'
+    COLLECTED_URLS_FILE_NAME = 'all_collected_rednotice_urls'
+    COUNTRIES_FILE_NAME = 'countries.json'
+
+    def __init__(self, shard_count: int = None, parser_class=InterpolParser, parser_options: dict = None,
+                 base_dir: str = None, shards_dir: str = None, rate_limiter_options: dict = None,
+                 plan: bool = True, max_processes: int = None, log_options: dict = None,
+                 request_policy_options: dict = None):
+        """
+        :param shard_count: Количество шардов. None - количество ядер процессора.
+        :param parser_class: Класс сборщика (InterpolParser или наследник).
+        :param parser_options: Параметры конструктора сборщика, например {'max_threads': 5}.
+        :param base_dir: Каталог объединенных данных. None - parser_class.BASE_DIR_FOR_DATA.
+        :param shards_dir: Каталог с каталогами шардов. None - '<base_dir>_shards' рядом с base_dir.
+        :param rate_limiter_options: Параметры RateLimiter каждого шарда. Ограничители шардов независимы,
+        поэтому общий для одного адреса бюджет (например max_rate) нужно делить между шардами.
+        :param plan: Разделять запросы по странам заранее и делить между шардами ссылки запросов поиска.
+        :param max_processes: Количество одновременно работающих процессов. None - shard_count.
+        :param log_options: Параметры CrawlLogging.setup_logging для процессов шардов (в каждом процессе
+        запускается свой поток вывода). None - логирование в процессах шардов не настраивается.
+        :param request_policy_options: Параметры RequestPolicy каждого шарда. Общий срок сбора (run_timeout)
+        отсчитывается в каждом шарде от его запуска.
+        """
+        self.shard_count = shard_count or os.cpu_count() or 1
+        self.parser_class = parser_class
+        self.parser_options = dict(parser_options or {'max_threads': 5})
+        self.base_dir = base_dir or parser_class.BASE_DIR_FOR_DATA
+        if not self.base_dir.endswith(os.sep):
+            self.base_dir = f'{self.base_dir}{os.sep}'
+        self.shards_dir = shards_dir or f'{self.base_dir.rstrip(os.sep)}_shards{os.sep}'
+        self.rate_limiter_options = rate_limiter_options
+        self.plan = plan
+        self.max_processes = max_processes or self.shard_count
+        self.log_options = log_options
+        self.request_policy_options = request_policy_options
+
+    def get_shard_dir(self, shard_index: int):
+        """
+        :param shard_index: Номер шарда.
+        :return: Строка - каталог данных шарда.
+        """
+        return f'{self.shards_dir}{shard_index:03}_of_{self.shard_count:03}{os.sep}'
+
+    def prepare_plan(self):
+        """
+        Разделяет запросы по странам (с планом разделения в base_dir делятся только изменившиеся,
+        см. InterpolParser.partition_url) и записывает каждому шарду его часть ссылок запросов поиска,
+        выдачу страниц поиска, уже полученных при разделении (шард не запрашивает их повторно,
+        см. InterpolParser.load_prepared_listing), а также справочник стран.
+        Каталоги шардов с готовым планом можно скопировать на другие машины.
+        :return: Список количеств ссылок запросов поиска по шардам.
+        """
+        parser = self.parser_class(base_dir=self.base_dir, **self.parser_options)
+        try:
+            prepared_urls = sorted(parser.get_all_prepared_country_urls())
+            prepared_listing = parser.prepared_rednotice_listing
+        finally:
+            parser.close()
+        shard_urls = [[] for _ in range(self.shard_count)]
+        for url in prepared_urls:
+            shard_urls[InterpolParser.get_shard_index(url, self.shard_count)].append(url)
+        countries_path = f'{self.base_dir}{self.COUNTRIES_FILE_NAME}'
+        for shard_index, urls in enumerate(shard_urls):
+            shard_dir = Parser.check_and_create_path(self.get_shard_dir(shard_index))
+            self.write_csv(f'{shard_dir}{self.PREPARED_URLS_FILE_NAME}.csv', urls)
+            self.write_json(f'{shard_dir}{self.PREPARED_LISTING_FILE_NAME}.json',
+                            {url: prepared_listing[url] for url in urls if url in prepared_listing})
+            if os.path.exists(countries_path):
+                shutil.copy2(countries_path, f'{shard_dir}{self.COUNTRIES_FILE_NAME}')
+        logger.info('План шардов: %s', [len(urls) for urls in shard_urls])
+        return [len(urls) for urls in shard_urls]
+
+    def run_shard(self, shard_index: int, incremental: bool = False):
+        """
+        Собирает один шард в текущем процессе (например, на отдельной машине).
+        :param shard_index: Номер шарда.
+        :param incremental: Инкрементальный сбор.
+        :return: Словарь с итогами шарда (см. run_shard).
+        """
+        return run_shard(self.parser_class, self.parser_options, shard_index, self.shard_count,
+                         self.get_shard_dir(shard_index), self.rate_limiter_options, incremental,
+                         request_policy_options=self.request_policy_options)
+
+    def run(self, incremental: bool = False, merge: bool = True):
+        """
+        Собирает все шарды в отдельных процессах на этой машине и объединяет результаты.
+        :param incremental: Инкрементальный сбор.
+        :param merge: Объединить результаты шардов в base_dir.
+        :return: Список итогов шардов.
+        """
+        if self.plan:
+            self.prepare_plan()
+        results = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(self.max_processes, self.shard_count)) as executor:
+            futures = [executor.submit(run_shard, self.parser_class, self.parser_options, shard_index,
+                                       self.shard_count, self.get_shard_dir(shard_index), self.rate_limiter_options,
+                                       incremental, self.log_options, self.request_policy_options)
+                       for shard_index in range(self.shard_count)]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as ex:
+                    logger.error('run_shard - %s', ex)
+        logger.info('Шарды: %s', results)
+        if merge:
+            self.merge()
+        return results
+
+    @staticmethod
+    def write_csv(file_path: str, data):
+        """
+        Записывает список строк в csv файл (в том же формате, что Parser.write_data_into_csv), заменяя старый.
+        :param file_path: Путь к файлу.
+        :param data: Список строк.
+        :return: Строка с путем к файлу.
+        """
+        with open(f'{file_path}.tmp', 'w', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerows(zip(data))
+        os.replace(f'{file_path}.tmp', file_path)
+        return file_path
+
+    @staticmethod
+    def write_json(file_path: str, data):
+        """
+        Записывает данные в json файл, заменяя старый.
+        :param file_path: Путь к файлу.
+        :param data: Данные.
+        :return: Строка с путем к файлу.
+        """
+        with open(f'{file_path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(f'{file_path}.tmp', file_path)
+        return file_path
+
+    @staticmethod
+    def merge_notice_dir(source_dir: str, target_dir: str):
+        """
+        Копирует файлы разыскиваемого, заменяя только более старые.
+        :param source_dir: Каталог разыскиваемого в шарде.
+        :param target_dir: Каталог разыскиваемого в объединенных данных.
+        :return: None.
+        """
+        Parser.check_and_create_path(target_dir)
+        for file in os.scandir(source_dir):
+            if not file.is_file():
+                continue
+            target_path = os.path.join(target_dir, file.name)
+            if os.path.exists(target_path) and os.path.getmtime(target_path) >= file.stat().st_mtime:
+                continue
+            shutil.copy2(file.path, target_path)
+
+    def get_merged_path(self, path: str, shard_dir: str):
+        """
+        :param path: Путь к каталогу разыскиваемого в шарде ('<каталог шарда>/[тип/]Страна/Имя/').
+        :param shard_dir: Каталог шарда.
+        :return: Строка - путь к тому же каталогу в объединенных данных.
+        """
+        return f'{self.base_dir}{os.path.relpath(path, shard_dir)}{os.sep}'
+
+    def merge(self, shard_dirs: list = None):
+        """
+        Объединяет результаты шардов в base_dir: каталоги разыскиваемых всех типов объявлений (разыскиваемый,
+        собранный несколькими шардами, записывается один раз, из файлов с одинаковым именем остается более новый),
+        списки известных разыскиваемых (notices_manifest.json каждого типа) и csv файлы ссылок,
+        после чего индекс объявлений base_dir строится заново (InterpolParser.rebuild_notice_index).
+        Данные шардов читаются в формате по умолчанию (DirectoryStorage).
+        :param shard_dirs: Каталоги шардов. None - каталоги всех шардов в shards_dir.
+        :return: Словарь {'notices': количество разыскиваемых, 'duplicates': количество повторов}.
+        """
+        if shard_dirs is None:
+            shard_dirs = [self.get_shard_dir(shard_index) for shard_index in range(self.shard_count)]
+        Parser.check_and_create_path(self.base_dir)
+        merged_dirs = set()
+        duplicate_number = 0
+        type_dirs = {notice_type['dir'] for notice_type in self.parser_class.NOTICE_TYPES.values()}
+        manifests = {type_dir: NoticeManifest(f'{os.path.join(self.base_dir, type_dir, "")}'
+                                              f'{InterpolParser.NOTICE_MANIFEST_FILE_NAME}.json')
+                     for type_dir in type_dirs}
+        collected_urls = {file_name: set() for file_name in (self.PREPARED_URLS_FILE_NAME,
+                                                             self.COLLECTED_URLS_FILE_NAME)}
+        for shard_dir in shard_dirs:
+            if not os.path.exists(shard_dir):
+                logger.warning('merge - каталог шарда "%s" не найден.', shard_dir)
+                continue
+            for notice_dir in self.parser_class.iter_notice_dirs(shard_dir):
+                target_dir = os.path.join(self.base_dir, os.path.relpath(notice_dir, shard_dir))
+                if target_dir in merged_dirs:
+                    duplicate_number += 1
+                merged_dirs.add(target_dir)
+                self.merge_notice_dir(notice_dir, target_dir)
+            for type_dir, manifest in manifests.items():
+                shard_manifest = NoticeManifest(f'{os.path.join(shard_dir, type_dir, "")}'
+                                                f'{InterpolParser.NOTICE_MANIFEST_FILE_NAME}.json')
+                for known in shard_manifest.notices.values():
+                    if known.get('path'):
+                        known['path'] = self.get_merged_path(known['path'], shard_dir)
+                manifest.merge(shard_manifest.notices)
+            for file_name, urls in collected_urls.items():
+                urls.update(Parser.read_data_from_csv_to_list(f'{shard_dir}{file_name}.csv')
+                            if os.path.exists(f'{shard_dir}{file_name}.csv') else [])
+            countries_path = f'{self.base_dir}{self.COUNTRIES_FILE_NAME}'
+            if not os.path.exists(countries_path) and os.path.exists(f'{shard_dir}{self.COUNTRIES_FILE_NAME}'):
+                shutil.copy2(f'{shard_dir}{self.COUNTRIES_FILE_NAME}', countries_path)
+        for manifest in manifests.values():
+            if manifest.notices:
+                manifest.save()
+        for file_name, urls in collected_urls.items():
+            if urls:
+                self.write_csv(f'{self.base_dir}{file_name}.csv', sorted(urls))
+        parser = self.parser_class(base_dir=self.base_dir, **{**self.parser_options, 'cache': False})
+        try:
+            parser.rebuild_notice_index()
+        finally:
+            parser.close()
+        result = {'notices': len(merged_dirs), 'duplicates': duplicate_number}
+        logger.info('Объединение шардов: %s', result)
+        return result
+
+
+def main():
+    arguments = argparse.ArgumentParser(description='Сбор, разделенный на шарды.')
+    arguments.add_argument('--shards', type=int, default=None, help='Количество шардов (по умолчанию - ядер).')
+    arguments.add_argument('--threads', type=int, default=5, help='max_threads каждого шарда.')
+    arguments.add_argument('--processes', type=int, default=None, help='Одновременно работающих процессов.')
+    arguments.add_argument('--shard-index', type=int, default=None,
+                           help='Собрать только этот шард в текущем процессе (на отдельной машине).')
+    arguments.add_argument('--plan-only', action='store_true',
+                           help='Только разделить запросы и записать план в каталоги шардов.')
+    arguments.add_argument('--merge', action='store_true', help='Только объединить результаты шардов.')
+    arguments.add_argument('--no-plan', action='store_true', help='Делить между шардами страны, а не запросы.')
+    arguments.add_argument('--incremental', action='store_true', help='Инкрементальный сбор.')
+    arguments.add_argument('--notice-types', nargs='+', default=None, choices=list(InterpolParser.NOTICE_TYPES),
+                           help='Типы объявлений (по умолчанию - красные).')
+    arguments.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                           help='Уровень логирования (DEBUG - строка на каждый запрос).')
+    arguments.add_argument('--log-file', default=None, help='Файл для json строк лога.')
+    arguments.add_argument('--run-timeout', type=float, default=None,
+                           help='Общий срок сбора шарда в секундах, остаток можно продолжить через resume().')
+    arguments.add_argument('--hedge-budget', type=float, default=0.0,
+                           help='Доля дублирующих запросов для медленных ответов, например 0.05.')
+    arguments.add_argument('--cache', action='store_true',
+                           help='Кеш ответов в каталоге данных шарда для повторных запусков.')
+    options = arguments.parse_args()
+
+    log_options = {'level': options.log_level, 'file_path': options.log_file}
+    setup_logging(**log_options)
+    parser_options = {'max_threads': options.threads, 'notice_types': options.notice_types, 'cache': options.cache}
+    request_policy_options = {'run_timeout': options.run_timeout, 'hedge_budget': options.hedge_budget}
+    sharded_crawl = ShardedCrawl(shard_count=options.shards, parser_options=parser_options,
+                                 plan=not options.no_plan, max_processes=options.processes, log_options=log_options,
+                                 request_policy_options=request_policy_options)
+    if options.plan_only:
+        sharded_crawl.prepare_plan()
+    elif options.merge:
+        sharded_crawl.merge()
+    elif options.shard_index is not None:
+        print(sharded_crawl.run_shard(options.shard_index, options.incremental))
+    else:
+        sharded_crawl.run(options.incremental)
+
+
+if __name__ == '__main__':
+    main()
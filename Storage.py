@@ -0,0 +1,490 @@
+import collections
+import hashlib
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from CrawlLogging import get_logger
+
+# Изображение, уже загруженное во временный файл: путь, sha256 содержимого, расширение.
+ImageFile = collections.namedtuple('ImageFile', ['temp_path', 'digest', 'extension'])
+
+IMAGE_SIGNATURES = ((b'\xff\xd8\xff', 'jpg'), (b'\x89PNG\r\n\x1a\n', 'png'), (b'GIF87a', 'gif'), (b'GIF89a', 'gif'),
+                    (b'BM', 'bmp'))
+IMAGE_CONTENT_TYPES = {'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/pjpeg': 'jpg', 'image/png': 'png',
+                       'image/gif': 'gif', 'image/webp': 'webp', 'image/bmp': 'bmp'}
+DEFAULT_IMAGE_EXTENSION = 'png'
+
+logger = get_logger('storage')
+
+
+def get_image_extension(head: bytes, content_type: str = None):
+    """
+    Определяет расширение изображения по первым байтам, а если они не узнаны - по Content-Type.
+    :param head: Первые байты файла (достаточно 16).
+    :param content_type: Значение заголовка Content-Type.
+    :return: Строка - расширение без точки.
+    """
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if content_type:
+        extension = IMAGE_CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+        if extension:
+            return extension
+    return DEFAULT_IMAGE_EXTENSION
+
+
+def read_image(data):
+    """
+    Приводит изображение (байты или ImageFile) к байтам, sha256 и расширению. Временный файл удаляется.
+    :param data: Байты или ImageFile.
+    :return: Кортеж (байты, sha256, расширение).
+    """
+    if isinstance(data, ImageFile):
+        with open(data.temp_path, 'rb') as file:
+            content = file.read()
+        discard_image(data)
+        return content, data.digest, data.extension
+    return data, hashlib.sha256(data).hexdigest(), get_image_extension(data[:16])
+
+
+def discard_image(data):
+    """
+    Удаляет временный файл изображения, если он есть.
+    :param data: Байты или ImageFile.
+    :return: None.
+    """
+    if isinstance(data, ImageFile) and os.path.exists(data.temp_path):
+        os.remove(data.temp_path)
+
+
+class DirectoryStorage:
+    """
+    Хранилище в виде каталогов: './all_data/название_страны/имя_разыскиваемого/' с json файлом и изображениями.
+    Json файлы записываются методом write_data_into_json. Изображение сохраняется с расширением по его формату,
+    одинаковые по содержимому изображения разных разыскиваемых хранятся одной жесткой ссылкой.
+    """
+
+    def __init__(self, parser, base_dir: str = None):
+        """
+        :param parser: Объект Parser, методами которого записываются файлы.
+        :param base_dir: Корневой каталог данных (для чтения записей).
+        """
+        self.parser = parser
+        self.base_dir = base_dir
+        self._paths_by_digest = {}
+
+    def get_record_location(self, file_path: str, file_name: str):
+        """
+        :param file_path: Путь к каталогу.
+        :param file_name: Имя файла без расширения.
+        :return: Строка - путь, по которому будет записан json файл.
+        """
+        return f'{file_path}{os.sep}{file_name}.json'
+
+    def get_image_location(self, file_path: str, file_name: str, extension: str = DEFAULT_IMAGE_EXTENSION):
+        """
+        :param file_path: Путь к каталогу.
+        :param file_name: Имя файла без расширения.
+        :param extension: Расширение изображения.
+        :return: Строка - путь, по которому будет записано изображение.
+        """
+        return f'{file_path}{os.sep}{file_name}.{extension}'
+
+    def write_image(self, file_path: str, file_name: str, data, overwrite: bool = False):
+        """
+        Сохраняет изображение. Если такое же по содержимому уже сохранено, создается жесткая ссылка на него.
+        Файл всегда заменяется целиком (os.replace), поэтому перезапись не меняет связанные ссылками копии.
+        :param file_path: Путь к каталогу.
+        :param file_name: Имя файла без расширения.
+        :param data: Байты или ImageFile.
+        :param overwrite: Перезаписать файл, если он уже существует.
+        :return: Строка - путь к изображению.
+        """
+        if isinstance(data, ImageFile):
+            digest, extension = data.digest, data.extension
+        else:
+            digest, extension = hashlib.sha256(data).hexdigest(), get_image_extension(data[:16])
+        self.parser.check_and_create_path(file_path)
+        full_file_path = self.get_image_location(file_path, file_name, extension)
+        if os.path.exists(full_file_path) and not overwrite:
+            logger.debug('Файл "%s" уже существует.', full_file_path)
+            discard_image(data)
+            return full_file_path
+        temp_path = f'{full_file_path}.tmp'
+        existing_path = self._paths_by_digest.get(digest)
+        if existing_path is not None and existing_path != full_file_path and os.path.exists(existing_path):
+            discard_image(data)
+            try:
+                os.link(existing_path, temp_path)
+            except OSError:
+                shutil.copyfile(existing_path, temp_path)
+        elif isinstance(data, ImageFile):
+            shutil.move(data.temp_path, temp_path)
+        else:
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+        os.replace(temp_path, full_file_path)
+        self._paths_by_digest.setdefault(digest, full_file_path)
+        return full_file_path
+
+    def write_batch(self, items: list):
+        """
+        Записывает пачку записей и изображений. Ошибка записи одного файла не мешает записи остальных.
+        :param items: Список кортежей (вид, путь к каталогу, имя файла, данные, перезаписать).
+        :return: Список пар (номер незаписанного элемента пачки, исключение).
+        """
+        failures = []
+        for index, (kind, file_path, file_name, data, overwrite) in enumerate(items):
+            try:
+                if kind == StorageWriter.KIND_RECORD:
+                    self.parser.write_data_into_json(file_path, file_name, data, overwrite)
+                else:
+                    self.write_image(file_path, file_name, data, overwrite)
+            except Exception as ex:
+                logger.error('DirectoryStorage - %s - %s', file_path, ex)
+                failures.append((index, ex))
+        return failures
+
+    def iter_records(self):
+        """
+        Перебирает сохраненные данные о разыскиваемых.
+        :return: Генератор пар (путь, словарь данных).
+        """
+        base_dir = self.base_dir or self.parser.BASE_DIR_FOR_DATA
+        if not os.path.exists(base_dir):
+            return
+        for notice_dir in self.parser.iter_notice_dirs(base_dir):
+            for file in os.scandir(notice_dir):
+                if file.name.endswith('.json'):
+                    with open(file.path, encoding='utf-8') as record:
+                        yield file.path, json.load(record)
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage:
+    """
+    Хранилище в одном файле SQLite: таблица записей (json), таблица изображений (ключ, sha256, расширение)
+    и таблица содержимого изображений по sha256, так что одинаковые изображения хранятся один раз.
+    Пачка записывается одной транзакцией.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        :param file_path: Путь к файлу базы данных.
+        """
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, data TEXT NOT NULL)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS images '
+                                 '(key TEXT PRIMARY KEY, digest TEXT NOT NULL, extension TEXT NOT NULL)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, data BLOB NOT NULL)')
+        self._connection.commit()
+
+    @staticmethod
+    def get_key(file_path: str, file_name: str):
+        """
+        :param file_path: Путь к каталогу.
+        :param file_name: Имя файла без расширения.
+        :return: Строка - ключ записи.
+        """
+        return os.path.normpath(os.path.join(file_path, file_name)).replace(os.sep, '/')
+
+    def get_record_location(self, file_path: str, file_name: str):
+        return f'{self.file_path}#records/{self.get_key(file_path, file_name)}'
+
+    def get_image_location(self, file_path: str, file_name: str, extension: str = DEFAULT_IMAGE_EXTENSION):
+        return f'{self.file_path}#images/{self.get_key(file_path, file_name)}.{extension}'
+
+    def write_batch(self, items: list):
+        """
+        Записывает пачку записей и изображений одной транзакцией. При ошибке транзакция откатывается,
+        исключение передается дальше.
+        :param items: Список кортежей (вид, путь к каталогу, имя файла, данные, перезаписать).
+        :return: Пустой список - пачка записана целиком.
+        """
+        with self._lock:
+            try:
+                self._write_batch(items)
+            except Exception:
+                self._connection.rollback()
+                raise
+            self._connection.commit()
+        return []
+
+    def _write_batch(self, items: list):
+        for kind, file_path, file_name, data, overwrite in items:
+            verb = 'INSERT OR REPLACE' if overwrite else 'INSERT OR IGNORE'
+            key = self.get_key(file_path, file_name)
+            if kind == StorageWriter.KIND_RECORD:
+                if not isinstance(data, str):
+                    data = json.dumps(data, ensure_ascii=False)
+                self._connection.execute(f'{verb} INTO records (key, data) VALUES (?, ?)', (key, data))
+                continue
+            content, digest, extension = read_image(data)
+            self._connection.execute('INSERT OR IGNORE INTO blobs (digest, data) VALUES (?, ?)', (digest, content))
+            self._connection.execute(f'{verb} INTO images (key, digest, extension) VALUES (?, ?, ?)',
+                                     (key, digest, extension))
+
+    def iter_records(self):
+        """
+        :return: Генератор пар (ключ, словарь данных).
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT key, data FROM records').fetchall()
+        for key, data in rows:
+            yield key, json.loads(data)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class PackStorage:
+    """
+    Хранилище из нескольких файлов, дописываемых только в конец.
+    Записи распределяются по шардам по хешу ключа: 'records_NN.jsonl' (одна строка json на запись).
+    Содержимое изображений распределяется по шардам по sha256 и пишется в 'images_NN.pack' один раз на sha256,
+    индекс 'images_NN.idx' хранит строки json с ключом, sha256, расширением, смещением и длиной.
+    Перезапись добавляет новую версию, при чтении действует последняя.
+    """
+
+    def __init__(self, directory: str, shards: int = 16):
+        """
+        :param directory: Каталог хранилища.
+        :param shards: Количество шардов.
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shards = shards
+        self._lock = threading.Lock()
+        self._known_keys = None
+        self._blobs = None
+
+    def get_shard(self, key: str):
+        """
+        :param key: Ключ записи.
+        :return: Номер шарда.
+        """
+        return zlib.crc32(key.encode('utf-8')) % self.shards
+
+    def get_record_location(self, file_path: str, file_name: str):
+        key = SQLiteStorage.get_key(file_path, file_name)
+        return f'{self.directory}{os.sep}records_{self.get_shard(key):02}.jsonl#{key}'
+
+    def get_image_location(self, file_path: str, file_name: str, extension: str = DEFAULT_IMAGE_EXTENSION):
+        key = SQLiteStorage.get_key(file_path, file_name)
+        return f'{self.directory}{os.sep}images#{key}.{extension}'
+
+    def _load_known_keys(self):
+        self._known_keys, self._blobs = set(), {}
+        for key, _ in self.iter_records():
+            self._known_keys.add(('record', key))
+        for shard in range(self.shards):
+            index_path = f'{self.directory}{os.sep}images_{shard:02}.idx'
+            if os.path.exists(index_path):
+                with open(index_path, encoding='utf-8') as index:
+                    for line in index:
+                        entry = json.loads(line)
+                        self._known_keys.add(('image', entry['key']))
+                        self._blobs[entry['digest']] = (shard, entry['offset'], entry['length'])
+
+    def write_batch(self, items: list):
+        """
+        Дописывает пачку записей и изображений: каждый затронутый файл шарда открывается один раз на пачку.
+        При ошибке известные ключи перечитываются с диска при следующей пачке, исключение передается дальше.
+        :param items: Список кортежей (вид, путь к каталогу, имя файла, данные, перезаписать).
+        :return: Пустой список - пачка записана целиком.
+        """
+        with self._lock:
+            if self._known_keys is None:
+                self._load_known_keys()
+            try:
+                self._write_batch(items)
+            except Exception:
+                self._known_keys, self._blobs = None, None
+                raise
+        return []
+
+    def _write_batch(self, items: list):
+        records, images = {}, {}
+        for kind, file_path, file_name, data, overwrite in items:
+            key = SQLiteStorage.get_key(file_path, file_name)
+            known_key = ('record' if kind == StorageWriter.KIND_RECORD else 'image', key)
+            if known_key in self._known_keys and not overwrite:
+                discard_image(data)
+                continue
+            self._known_keys.add(known_key)
+            if kind == StorageWriter.KIND_RECORD:
+                if isinstance(data, str):
+                    data = json.loads(data)
+                records.setdefault(self.get_shard(key), []).append(
+                    json.dumps({'key': key, 'data': data}, ensure_ascii=False))
+            else:
+                content, digest, extension = read_image(data)
+                images.setdefault(self.get_shard(digest), []).append((key, content, digest, extension))
+        for shard, lines in records.items():
+            with open(f'{self.directory}{os.sep}records_{shard:02}.jsonl', 'a', encoding='utf-8') as file:
+                file.write('\n'.join(lines) + '\n')
+        for shard, blobs in images.items():
+            pack_path = f'{self.directory}{os.sep}images_{shard:02}.pack'
+            with open(pack_path, 'ab') as pack, \
+                    open(f'{self.directory}{os.sep}images_{shard:02}.idx', 'a', encoding='utf-8') as index:
+                offset = pack.tell()
+                for key, content, digest, extension in blobs:
+                    if digest not in self._blobs:
+                        pack.write(content)
+                        self._blobs[digest] = (shard, offset, len(content))
+                        offset += len(content)
+                    _, blob_offset, blob_length = self._blobs[digest]
+                    index.write(json.dumps({'key': key, 'digest': digest, 'extension': extension,
+                                            'offset': blob_offset, 'length': blob_length}) + '\n')
+
+    def iter_records(self):
+        """
+        :return: Генератор пар (ключ, словарь данных), для каждого ключа - последняя версия.
+        """
+        for shard in range(self.shards):
+            records_path = f'{self.directory}{os.sep}records_{shard:02}.jsonl'
+            if not os.path.exists(records_path):
+                continue
+            latest = {}
+            with open(records_path, encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        latest[record['key']] = record['data']
+            yield from latest.items()
+
+    def close(self):
+        pass
+
+
+class StorageWriter:
+    """
+    Отдельный поток записи. Обработчики передают записи и изображения в очередь и не ждут диска,
+    поток забирает их пачками (до batch_size штук или раз в flush_interval секунд) и записывает в хранилище.
+    Ошибки записи запоминаются по каталогу (пути записи) и забираются через pop_failures() после flush().
+    """
+    KIND_RECORD = 'record'
+    KIND_IMAGE = 'image'
+
+    def __init__(self, storage, batch_size: int = 200, flush_interval: float = 1.0, max_queue_size: int = 10000,
+                 metrics=None):
+        """
+        :param storage: Хранилище (DirectoryStorage, SQLiteStorage, PackStorage).
+        :param batch_size: Максимальный размер пачки.
+        :param flush_interval: Максимальное время ожидания пачки в секундах.
+        :param max_queue_size: Размер очереди, при заполнении обработчики ждут запись.
+        :param metrics: Объект Metrics для учета времени записи пачек (этап write).
+        """
+        self.storage = storage
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._failures = {}
+        self._failures_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='StorageWriter', daemon=True)
+        self._thread.start()
+
+    def put(self, kind: str, file_path: str, file_name: str, data, overwrite: bool = False):
+        """
+        Передает запись или изображение потоку записи.
+        :param kind: KIND_RECORD или KIND_IMAGE.
+        :param file_path: Путь к каталогу.
+        :param file_name: Имя файла без расширения.
+        :param data: Словарь данных, байты изображения или ImageFile.
+        :param overwrite: Перезаписать, если уже существует.
+        :return: Строка - место, куда будут записаны данные.
+        """
+        self._queue.put((kind, file_path, file_name, data, overwrite))
+        if kind == self.KIND_RECORD:
+            return self.storage.get_record_location(file_path, file_name)
+        extension = data.extension if isinstance(data, ImageFile) else get_image_extension(data[:16])
+        return self.storage.get_image_location(file_path, file_name, extension)
+
+    def flush(self):
+        """
+        Ждет записи всего, что уже передано потоку.
+        :return: None.
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def pop_failures(self, file_paths):
+        """
+        Забирает ошибки записи в указанные каталоги. Вызывается после flush(), чтобы учесть все переданное.
+        :param file_paths: Пути к каталогам.
+        :return: Словарь {'Путь к каталогу': исключение} только для каталогов, запись в которые не удалась.
+        """
+        with self._failures_lock:
+            return {file_path: self._failures.pop(file_path) for file_path in set(file_paths)
+                    if file_path in self._failures}
+
+    def close(self):
+        """
+        Записывает оставшееся, останавливает поток и закрывает хранилище.
+        :return: None.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self.storage.close()
+
+    def _write(self, batch: list):
+        started_at = time.monotonic()
+        try:
+            failures = self.storage.write_batch(batch) or []
+        except Exception as ex:
+            logger.error('StorageWriter - %s', ex)
+            failures = [(index, ex) for index in range(len(batch))]
+        if failures:
+            with self._failures_lock:
+                for index, ex in failures:
+                    self._failures[batch[index][1]] = ex
+        if self.metrics is not None:
+            self.metrics.observe('write', time.monotonic() - started_at)
+            self.metrics.inc('written', len(batch) - len(failures))
+            if failures:
+                self.metrics.inc('write_failed', len(failures))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, events, stop = [], [], False
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                else:
+                    batch.append(item)
+                if stop or events or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for event in events:
+                event.set()
+            if stop:
+                return
@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class WorkQueue:
+    """
+    Постоянная очередь задач сбора на SQLite.
+    Каждая задача - ссылка определенного вида (общий запрос по стране, ссылка запроса поиска
+    или ссылка на разыскиваемого)
+    со статусом pending/in_flight/done/failed и количеством попыток.
+    После падения процесса resume() возвращает незавершенные задачи в очередь,
+    и повторный запуск продолжает сбор с места остановки.
+    """
+    PENDING = 'pending'
+    IN_FLIGHT = 'in_flight'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    KIND_COUNTRY = 'country'
+    KIND_PARTITION = 'partition'
+    KIND_NOTICE = 'notice'
+
+    MAX_SQL_VARIABLES = 500
+
+    def __init__(self, file_path: str, max_attempts: int = 3):
+        """
+        :param file_path: Путь к файлу базы данных.
+        :param max_attempts: Максимальное количество попыток на задачу.
+        """
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.file_path = file_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'url TEXT NOT NULL, kind TEXT NOT NULL, status TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, payload TEXT, updated_at REAL NOT NULL, '
+            'PRIMARY KEY (kind, url))')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (kind, status)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def add(self, kind: str, urls, payloads: dict = None):
+        """
+        Добавляет задачи. Уже известные ссылки не сбрасываются, поэтому выполненные не повторяются.
+        :param kind: Вид задачи.
+        :param urls: Список ссылок.
+        :param payloads: Словарь {'Ссылка': строка с данными задачи}.
+        :return: None.
+        """
+        now = time.time()
+        payloads = payloads or {}
+        with self._lock:
+            self._connection.execute('BEGIN')
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO tasks (url, kind, status, payload, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(url, kind, self.PENDING, payloads.get(url), now) for url in urls])
+            self._connection.execute('COMMIT')
+
+    def claim(self, kind: str, limit: int = None):
+        """
+        Забирает ожидающие задачи в работу.
+        :param kind: Вид задачи.
+        :param limit: Максимальное количество задач. None - все.
+        :return: Список пар (ссылка, данные задачи).
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            rows = self._connection.execute(
+                'SELECT url, payload FROM tasks WHERE kind = ? AND status = ? LIMIT ?',
+                (kind, self.PENDING, -1 if limit is None else limit)).fetchall()
+            self._connection.executemany(
+                'UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE kind = ? AND url = ?',
+                [(self.IN_FLIGHT, time.time(), kind, url) for url, _ in rows])
+            self._connection.execute('COMMIT')
+        return rows
+
+    def claim_urls(self, kind: str, urls):
+        """
+        Забирает в работу указанные задачи, если они ожидают выполнения.
+        Выполненные и уже забранные задачи пропускаются.
+        :param kind: Вид задачи.
+        :param urls: Список ссылок.
+        :return: Список пар (ссылка, данные задачи).
+        """
+        urls = list(urls)
+        rows = []
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            for start in range(0, len(urls), self.MAX_SQL_VARIABLES):
+                chunk = urls[start:start + self.MAX_SQL_VARIABLES]
+                rows.extend(self._connection.execute(
+                    f'SELECT url, payload FROM tasks WHERE kind = ? AND status = ? '
+                    f'AND url IN ({", ".join("?" * len(chunk))})', (kind, self.PENDING, *chunk)).fetchall())
+            self._connection.executemany(
+                'UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE kind = ? AND url = ?',
+                [(self.IN_FLIGHT, time.time(), kind, url) for url, _ in rows])
+            self._connection.execute('COMMIT')
+        return rows
+
+    def done(self, kind: str, url: str):
+        """
+        Отмечает задачу выполненной.
+        :param kind: Вид задачи.
+        :param url: Ссылка.
+        :return: None.
+        """
+        self._set_status(kind, url, self.DONE, None)
+
+    def done_many(self, kind: str, urls):
+        """
+        Отмечает выполненными несколько задач одной транзакцией.
+        :param kind: Вид задачи.
+        :param urls: Список ссылок.
+        :return: None.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute('BEGIN')
+            self._connection.executemany(
+                'UPDATE tasks SET status = ?, last_error = NULL, updated_at = ? WHERE kind = ? AND url = ?',
+                [(self.DONE, now, kind, url) for url in urls])
+            self._connection.execute('COMMIT')
+
+    def failed(self, kind: str, url: str, error=None):
+        """
+        Отмечает задачу неудачной.
+        :param kind: Вид задачи.
+        :param url: Ссылка.
+        :param error: Описание ошибки.
+        :return: None.
+        """
+        self._set_status(kind, url, self.FAILED, None if error is None else str(error))
+
+    def _set_status(self, kind: str, url: str, status: str, error):
+        with self._lock:
+            self._connection.execute('UPDATE tasks SET status = ?, last_error = ?, updated_at = ? '
+                                     'WHERE kind = ? AND url = ?', (status, error, time.time(), kind, url))
+
+    def resume(self, kind: str = None):
+        """
+        Возвращает в очередь задачи, прерванные падением процесса (in_flight),
+        и неудачные задачи, у которых еще остались попытки.
+        :param kind: Вид задачи. None - все виды.
+        :return: Количество возвращенных в очередь задач.
+        """
+        kind_filter, params = ('AND kind = ?', (kind,)) if kind else ('', ())
+        with self._lock:
+            cursor = self._connection.execute(
+                f'UPDATE tasks SET status = ?, updated_at = ? WHERE (status = ? OR (status = ? AND attempts < ?)) '
+                f'{kind_filter}',
+                (self.PENDING, time.time(), self.IN_FLIGHT, self.FAILED, self.max_attempts) + params)
+            return cursor.rowcount
+
+    def clear(self):
+        """
+        Удаляет все задачи и служебные значения перед новым сбором.
+        :return: None.
+        """
+        with self._lock:
+            self._connection.execute('DELETE FROM tasks')
+            self._connection.execute('DELETE FROM meta')
+
+    def set_meta(self, key: str, value: str):
+        """
+        Сохраняет служебное значение сбора (например, режим).
+        :param key: Ключ.
+        :param value: Строка.
+        :return: None.
+        """
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def get_meta(self, key: str, default=None):
+        """
+        :param key: Ключ.
+        :param default: Значение, если ключа нет.
+        :return: Строка.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def get_payloads(self, kind: str):
+        """
+        :param kind: Вид задачи.
+        :return: Словарь {'Ссылка': данные задачи} всех задач этого вида.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT url, payload FROM tasks WHERE kind = ?', (kind,)).fetchall()
+        return dict(rows)
+
+    def has_tasks(self, kind: str):
+        """
+        :param kind: Вид задачи.
+        :return: True, если задачи этого вида уже добавлялись.
+        """
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM tasks WHERE kind = ? LIMIT 1', (kind,)).fetchone() \
+                is not None
+
+    def get_stats(self, kind: str = None):
+        """
+        :param kind: Вид задачи. None - все виды.
+        :return: Словарь {'Статус': количество задач}.
+        """
+        kind_filter, params = ('WHERE kind = ?', (kind,)) if kind else ('', ())
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT status, COUNT(*) FROM tasks {kind_filter} GROUP BY status', params).fetchall()
+        return dict(rows)
+
+    def get_urls(self, kind: str, status: str = None):
+        """
+        :param kind: Вид задачи.
+        :param status: Статус. None - все.
+        :return: Список ссылок.
+        """
+        with self._lock:
+            if status is None:
+                rows = self._connection.execute('SELECT url FROM tasks WHERE kind = ?', (kind,)).fetchall()
+            else:
+                rows = self._connection.execute('SELECT url FROM tasks WHERE kind = ? AND status = ?',
+                                                (kind, status)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        """
+        Закрывает соединение с базой данных.
+        :return: None.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeInterpolServer:
+    """
+    Локальная замена сайта интерпола для замеров без обращения к ws-public.interpol.int.
+    Отдает страницу со списком стран (html), выдачу поиска с фильтрами nationality, sexId, ageMin/ageMax,
+    resultPerPage и page (не больше 160 результатов на запрос), данные о разыскиваемом,
+    список изображений и сами изображения.
+    Набор данных генерируется по seed, задержка ответа, доля ошибок 503 и ограничение скорости (429 с Retry-After)
+    настраиваются. Успешные ответы содержат ETag, запрос с совпадающим If-None-Match получает 304 без тела.
+    Кроме красных объявлений можно отдавать желтые и список ООН (notice_types), каждый тип по своему пути.
+    """
+    MAX_SEARCH_RESULT_DISPLAY = 160
+    COUNTRIES_PAGE_PATH = '/How-we-work/Notices/View-Red-Notices'
+    NOTICES_PATH = '/notices/v1/red'
+    NOTICE_TYPE_PATHS = {'red': NOTICES_PATH, 'yellow': '/notices/v1/yellow', 'un': '/notices/v1/un/persons'}
+    # Размер набора данных типа относительно количества разыскиваемых по странам (countries).
+    NOTICE_TYPE_SHARES = {'red': 1.0, 'yellow': 0.5, 'un': 0.1}
+    DEFAULT_COUNTRIES = {'Russia': ('RU', 900), 'Mexico': ('MX', 300), 'France': ('FR', 50), 'Chad': ('TD', 0)}
+
+    def __init__(self, countries: dict = None, notice_number: int = None, latency: float = 0.0,
+                 error_rate: float = 0.0, max_rps: float = 0.0, max_images: int = 3, image_size: int = 20 * 1024,
+                 seed: int = 1, host: str = '127.0.0.1', port: int = 0, etags: bool = True, notice_types=('red',)):
+        """
+        :param countries: Словарь {'Название страны': ('Код', количество разыскиваемых)}.
+        :param notice_number: Общее количество разыскиваемых, распределяемое по странам пропорционально countries.
+        :param latency: Задержка каждого ответа в секундах.
+        :param error_rate: Доля ответов 503 (от 0 до 1).
+        :param max_rps: Максимальное количество запросов в секунду, сверх него - 429. 0 - без ограничения.
+        :param max_images: Максимальное количество изображений у разыскиваемого.
+        :param image_size: Примерный размер изображения в байтах.
+        :param seed: Начальное значение генератора данных.
+        :param host: Адрес.
+        :param port: Порт. 0 - любой свободный.
+        :param etags: Отдавать ETag и отвечать 304 на условные запросы.
+        :param notice_types: Типы объявлений из NOTICE_TYPE_PATHS.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.image_size = image_size
+        self.etags = etags
+        self.countries = dict(countries or self.DEFAULT_COUNTRIES)
+        if notice_number is not None:
+            total = sum(number for _, number in self.countries.values()) or 1
+            self.countries = {name: (code, notice_number * number // total)
+                              for name, (code, number) in self.countries.items()}
+        self._random = random.Random(seed)
+        self.notices_by_type = {}
+        for notice_type in notice_types:
+            # У каждого типа свой генератор, поэтому данные красных объявлений не зависят от набора типов.
+            generator = self._random if notice_type == 'red' else random.Random(f'{seed}/{notice_type}')
+            prefix = '' if notice_type == 'red' else notice_type[0].upper()
+            notices = self.notices_by_type[notice_type] = []
+            for code, number in self.countries.values():
+                for index in range(int(number * self.NOTICE_TYPE_SHARES[notice_type])):
+                    year = generator.randint(1925, 2006)
+                    notices.append({
+                        'entity_id': f'2020/{prefix}{code}{index}', 'name': f'NAME{index}', 'forename': f'FORE {code}',
+                        'sex_id': generator.choice('MMMMFU'), 'nationalities': [code],
+                        'date_of_birth': f'{year}/01/01', 'age': 2023 - year,
+                        'arrest_warrants': [{'charge': generator.choice(['Murder', 'Fraud', 'Drug trafficking']),
+                                             'issuing_country_id': generator.choice(['US', 'RU', 'AR'])}],
+                        'images': generator.randint(0, max_images)})
+        self.notices = [notice for notices in self.notices_by_type.values() for notice in notices]
+        self.notices_by_id = {notice_type: {notice['entity_id'].replace('/', '-'): notice for notice in notices}
+                              for notice_type, notices in self.notices_by_type.items()}
+        self.request_count = 0
+        self.error_count = 0
+        self.throttled_count = 0
+        self.not_modified_count = 0
+        self._lock = threading.Lock()
+        self._window = []
+        self._server = ThreadingHTTPServer((host, port), self._get_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        :return: Строка - адрес сервера, например 'http://127.0.0.1:8000'.
+        """
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def countries_page_url(self):
+        return f'{self.url}{self.COUNTRIES_PAGE_PATH}'
+
+    @property
+    def notices_url(self):
+        return f'{self.url}{self.NOTICES_PATH}'
+
+    def get_notices_url(self, notice_type: str = 'red'):
+        return f'{self.url}{self.NOTICE_TYPE_PATHS[notice_type]}'
+
+    def start(self):
+        """
+        Запускает сервер в отдельном потоке.
+        :return: self.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name='FakeInterpolServer')
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Запускает сервер в текущем потоке.
+        :return: None.
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Останавливает сервер.
+        :return: None.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _is_throttled(self):
+        if not self.max_rps:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._window and self._window[0] < now - 1.0:
+                self._window.pop(0)
+            if len(self._window) >= self.max_rps:
+                self.throttled_count += 1
+                return True
+            self._window.append(now)
+            return False
+
+    def get_countries_page(self):
+        options = ''.join(f'<option value="{code}">{name}</option>' for name, (code, _) in self.countries.items())
+        return (f'<html><body><div class="twoColumns__leftColumn"><select id="nationality">'
+                f'<option value="">--</option>{options}</select></div></body></html>').encode('utf-8')
+
+    def get_search_page(self, query: dict, self_url: str, notice_type: str = 'red'):
+        notices = self.notices_by_type[notice_type]
+        if query.get('nationality'):
+            notices = [notice for notice in notices if query['nationality'] in notice['nationalities']]
+        if query.get('sexId'):
+            notices = [notice for notice in notices if notice['sex_id'] == query['sexId']]
+        if query.get('ageMin'):
+            notices = [notice for notice in notices if notice['age'] >= int(query['ageMin'])]
+        if query.get('ageMax'):
+            notices = [notice for notice in notices if notice['age'] <= int(query['ageMax'])]
+        per_page = min(int(query.get('resultPerPage') or 20), self.MAX_SEARCH_RESULT_DISPLAY)
+        page = max(int(query.get('page') or 1), 1)
+        start = min((page - 1) * per_page, self.MAX_SEARCH_RESULT_DISPLAY)
+        end = min(start + per_page, self.MAX_SEARCH_RESULT_DISPLAY)
+        items = []
+        for notice in notices[start:end]:
+            notice_url = f'{self.get_notices_url(notice_type)}/{notice["entity_id"].replace("/", "-")}'
+            items.append({'entity_id': notice['entity_id'], 'name': notice['name'], 'forename': notice['forename'],
+                          'date_of_birth': notice['date_of_birth'], 'nationalities': notice['nationalities'],
+                          '_links': {'self': {'href': notice_url}, 'images': {'href': f'{notice_url}/images'}}})
+        return {'total': len(notices), 'query': query, '_embedded': {'notices': items},
+                '_links': {'self': {'href': self_url}}}
+
+    def get_notice_page(self, notice_id: str, notice_type: str = 'red'):
+        notice = self.notices_by_id[notice_type].get(notice_id)
+        if notice is None:
+            return None
+        notice_url = f'{self.get_notices_url(notice_type)}/{notice_id}'
+        data = {key: value for key, value in notice.items() if key not in ('age', 'images')}
+        data.update({'weight': 0, 'height': None, 'place_of_birth': None, '_embedded': {'links': []},
+                     '_links': {'self': {'href': notice_url}, 'images': {'href': f'{notice_url}/images'}}})
+        return data
+
+    def get_images_page(self, notice_id: str, notice_type: str = 'red'):
+        notice = self.notices_by_id[notice_type].get(notice_id)
+        if notice is None:
+            return None
+        notice_url = f'{self.get_notices_url(notice_type)}/{notice_id}'
+        images = [{'picture_id': str(index), '_links': {'self': {'href': f'{notice_url}/images/{index}'}}}
+                  for index in range(notice['images'])]
+        return {'_embedded': {'images': images}, '_links': {'self': {'href': f'{notice_url}/images'}}}
+
+    def get_image(self, notice_id: str, index: str):
+        seed = f'{notice_id}/{index}'.encode('utf-8')
+        return b'\xff\xd8\xff\xe0' + seed * (self.image_size // len(seed))
+
+    def handle(self, path: str):
+        """
+        Обрабатывает запрос.
+        :param path: Путь с параметрами запроса.
+        :return: Кортеж (код ответа, Content-Type, тело, дополнительные заголовки).
+        """
+        with self._lock:
+            self.request_count += 1
+        if self._is_throttled():
+            return 429, 'application/json', b'{"message": "Too many requests"}', {'Retry-After': '1'}
+        if self.error_rate and self._random.random() < self.error_rate:
+            with self._lock:
+                self.error_count += 1
+            return 503, 'application/json', b'{"message": "Service unavailable"}', {}
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(path)
+        parts = parsed.path.rstrip('/').split('/')
+        if parsed.path == self.COUNTRIES_PAGE_PATH:
+            return 200, 'text/html; charset=utf-8', self.get_countries_page(), {}
+        for notice_type in self.notices_by_type:
+            notices_path = self.NOTICE_TYPE_PATHS[notice_type]
+            if parsed.path == notices_path:
+                query = {key: value[0] for key, value in parse_qs(parsed.query, keep_blank_values=True).items()}
+                data = self.get_search_page(query, f'{self.url}{path}', notice_type)
+                return 200, 'application/json', json.dumps(data).encode(), {}
+            if not parsed.path.startswith(f'{notices_path}/'):
+                continue
+            tail = parts[len(notices_path.split('/')):]
+            if len(tail) == 1:
+                data = self.get_notice_page(tail[0], notice_type)
+            elif len(tail) == 2 and tail[1] == 'images':
+                data = self.get_images_page(tail[0], notice_type)
+            elif len(tail) == 3 and tail[1] == 'images' and tail[0] in self.notices_by_id[notice_type]:
+                return 200, 'image/jpeg', self.get_image(tail[0], tail[2]), {}
+            else:
+                data = None
+            if data is not None:
+                return 200, 'application/json', json.dumps(data).encode(), {}
+        return 404, 'application/json', b'{"message": "Not found"}', {}
+
+    def _get_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело уходят одним пакетом, иначе задержанное подтверждение TCP добавляет к ответу ~40 мс.
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, content_type, body, headers = server.handle(self.path)
+                if status == 200 and server.etags:
+                    headers = {**headers, 'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+                    if self.headers.get('If-None-Match') == headers['ETag']:
+                        with server._lock:
+                            server.not_modified_count += 1
+                        status, body = 304, b''
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def main():
+    arguments = argparse.ArgumentParser(description='Локальная замена сайта интерпола.')
+    arguments.add_argument('--port', type=int, default=8000)
+    arguments.add_argument('--notices', type=int, default=None, help='Общее количество разыскиваемых.')
+    arguments.add_argument('--latency', type=float, default=0.0, help='Задержка ответа в секундах.')
+    arguments.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503.')
+    arguments.add_argument('--max-rps', type=float, default=0.0, help='Ограничение запросов в секунду (429).')
+    arguments.add_argument('--notice-types', nargs='+', default=['red'],
+                           choices=list(FakeInterpolServer.NOTICE_TYPE_PATHS), help='Типы объявлений.')
+    options = arguments.parse_args()
+    server = FakeInterpolServer(notice_number=options.notices, latency=options.latency,
+                                error_rate=options.error_rate, max_rps=options.max_rps, port=options.port,
+                                notice_types=options.notice_types)
+    print(f'{server.countries_page_url}\n{server.notices_url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
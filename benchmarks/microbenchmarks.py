@@ -0,0 +1,143 @@
+"""
+Замеры отдельных этапов: разделение запроса по стране (separate_url), разбор страниц поиска
+(get_rednotice_urls, get_rednotice_listing) и запись в хранилища (DirectoryStorage, SQLiteStorage, PackStorage).
+
+Пример:
+    python benchmarks/microbenchmarks.py --records 2000
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+from InterpolParser import InterpolParser  # noqa: E402
+from Storage import DirectoryStorage, PackStorage, SQLiteStorage, StorageWriter  # noqa: E402
+
+
+def measure(function, repeat: int = 5):
+    """
+    :param function: Функция без аргументов.
+    :param repeat: Количество повторов.
+    :return: Лучшее время одного выполнения в секундах.
+    """
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def get_parser_class(server: FakeInterpolServer, directory: str):
+    class BenchmarkParser(InterpolParser):
+        BASE_DIR_FOR_DATA = f'{directory}{os.sep}'
+        BASE_URL = server.countries_page_url
+        BASE_JSON_RESPONSE_URL = server.notices_url
+    return BenchmarkParser
+
+
+def benchmark_separate_url(server: FakeInterpolServer, directory: str):
+    """
+    Разделение самого большого запроса по стране: без выученных диапазонов, с ними и по сохраненному плану.
+    :return: Список строк результата.
+    """
+    parser_class = get_parser_class(server, directory)
+    code = max(server.countries.values(), key=lambda country: country[1])[0]
+    country_url = f'{server.notices_url}?&nationality={code}'
+    results = []
+    for name in ('cold', 'hints', 'plan'):
+        parser = parser_class(max_threads=1)
+        requests_before = server.request_count
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started_at = time.perf_counter()
+            pages = parser.separate_url_with_pages(country_url)
+            elapsed = time.perf_counter() - started_at
+            parser.save_partition_hints()
+            if name == 'hints':
+                parser.save_partition_plan()
+        parser.close()
+        results.append(f'separate_url ({name}): {elapsed * 1000:.1f} ms, '
+                       f'{server.request_count - requests_before} probes, {len(pages)} partitions')
+    return results
+
+
+def benchmark_listing(server: FakeInterpolServer, directory: str):
+    """
+    Разбор полной (160 результатов) страницы поиска.
+    :return: Список строк результата.
+    """
+    parser = get_parser_class(server, directory)(max_threads=1)
+    page = server.get_search_page({'resultPerPage': '160'}, server.notices_url)
+    results = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name, function in (('get_rednotice_urls', parser.get_rednotice_urls),
+                               ('get_rednotice_listing', parser.get_rednotice_listing)):
+            elapsed = measure(lambda: [function(page) for _ in range(100)])
+            results.append(f'{name}: {elapsed * 1000 / 100:.3f} ms per page of {len(page["_embedded"]["notices"])}')
+    parser.close()
+    return results
+
+
+def benchmark_writers(server: FakeInterpolServer, directory: str, record_number: int):
+    """
+    Запись record_number записей и изображений напрямую (write_batch) и через поток записи (StorageWriter).
+    :return: Список строк результата.
+    """
+    parser = get_parser_class(server, directory)(max_threads=1)
+    notices = (server.notices * (record_number // max(len(server.notices), 1) + 1))[:record_number]
+    results = []
+    storages = (('DirectoryStorage', lambda path: DirectoryStorage(parser, path)),
+                ('SQLiteStorage', lambda path: SQLiteStorage(os.path.join(path, 'notices.sqlite3'))),
+                ('PackStorage', lambda path: PackStorage(path)))
+    for name, create_storage in storages:
+        for mode in ('write_batch', 'StorageWriter'):
+            path = tempfile.mkdtemp(dir=directory)
+            storage = create_storage(path)
+            items = []
+            for index, notice in enumerate(notices):
+                file_path = f'{path}{os.sep}{notice["nationalities"][0]}{os.sep}{index}{os.sep}'
+                items.append((StorageWriter.KIND_RECORD, file_path, str(index), notice, True))
+                items.append((StorageWriter.KIND_IMAGE, file_path, f'{index}_1',
+                              server.get_image(str(index % 50), '0'), True))
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                started_at = time.perf_counter()
+                if mode == 'write_batch':
+                    for start in range(0, len(items), 200):
+                        storage.write_batch(items[start:start + 200])
+                    storage.close()
+                else:
+                    writer = StorageWriter(storage)
+                    for item in items:
+                        writer.put(*item)
+                    writer.close()
+                elapsed = time.perf_counter() - started_at
+            results.append(f'{name} {mode}: {elapsed:.2f} s, {len(items) / elapsed:.0f} items/s')
+            shutil.rmtree(path, ignore_errors=True)
+    parser.close()
+    return results
+
+
+def main():
+    arguments = argparse.ArgumentParser(description='Замеры отдельных этапов сбора.')
+    arguments.add_argument('--notices', type=int, default=None, help='Общее количество разыскиваемых.')
+    arguments.add_argument('--records', type=int, default=1000, help='Количество записей для замера записи.')
+    options = arguments.parse_args()
+    directory = tempfile.mkdtemp(prefix='interpol_microbenchmarks_')
+    try:
+        with FakeInterpolServer(notice_number=options.notices) as server:
+            for line in (benchmark_separate_url(server, directory) + benchmark_listing(server, directory)
+                         + benchmark_writers(server, directory, options.records)):
+                print(line)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Замер полного сбора InterpolParser на локальной замене сайта (FakeInterpolServer).
+Каждый вариант настроек запускается в отдельном процессе, поэтому пиковая память считается отдельно.
+
+Пример:
+    python benchmarks/run_benchmark.py --threads 5 10 20 --notices 2000 --latency 0.02
+    python benchmarks/run_benchmark.py --notice-types red yellow un
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REQUEST_STAGES = ('country', 'probe', 'listing', 'detail', 'image_index', 'image', 'request')
+
+
+def get_peak_memory_mb():
+    """
+    :return: Пиковый объем памяти процесса в мегабайтах или None, если узнать его нельзя.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def get_storage(kind: str, directory: str):
+    from Storage import PackStorage, SQLiteStorage
+    if kind == 'sqlite':
+        return SQLiteStorage(os.path.join(directory, 'notices.sqlite3'))
+    if kind == 'pack':
+        return PackStorage(os.path.join(directory, 'pack'))
+    return None
+
+
+def run_crawl(config: dict):
+    """
+    Выполняет один полный сбор (вызывается в дочернем процессе).
+    :param config: Словарь настроек: url, engine, threads, storage, notice_types.
+    :return: Словарь с результатами замера.
+    """
+    from InterpolParser import InterpolParser
+    directory = tempfile.mkdtemp(prefix='interpol_benchmark_')
+    base_class = InterpolParser
+    if config['engine'] == 'async':
+        from AsyncInterpolParser import AsyncInterpolParser
+        base_class = AsyncInterpolParser
+
+    class BenchmarkParser(base_class):
+        BASE_DIR_FOR_DATA = f'{directory}{os.sep}'
+        BASE_URL = f"{config['url']}{FakeInterpolServer.COUNTRIES_PAGE_PATH}"
+        BASE_JSON_RESPONSE_URL = f"{config['url']}{FakeInterpolServer.NOTICES_PATH}"
+
+    storage = get_storage(config['storage'], directory)
+    if config['engine'] == 'async':
+        parser = BenchmarkParser(max_in_flight=config['threads'], storage=storage, notice_types=config['notice_types'])
+    else:
+        parser = BenchmarkParser(max_threads=config['threads'], storage=storage, notice_types=config['notice_types'])
+    try:
+        started_at = time.monotonic()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            parser.get_all_rednotice_data()
+            parser.close()
+        wall = time.monotonic() - started_at
+        metrics = parser.metrics
+        return {'engine': config['engine'], 'threads': config['threads'], 'storage': config['storage'],
+                'notice_types': ','.join(config['notice_types']),
+                'requests': parser.URL_REQUEST_COUNTER, 'wall': round(wall, 3),
+                'requests_per_second': round(parser.URL_REQUEST_COUNTER / wall, 1),
+                'p50': metrics.get_latency(0.5, REQUEST_STAGES), 'p99': metrics.get_latency(0.99, REQUEST_STAGES),
+                'records': sum(1 for _ in parser.storage.iter_records()),
+                'peak_memory_mb': get_peak_memory_mb(), 'stages': metrics.snapshot()['stages']}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_in_process(config: dict):
+    """
+    Запускает run_crawl в отдельном процессе.
+    :param config: Словарь настроек.
+    :return: Словарь с результатами замера.
+    """
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+                               capture_output=True, text=True)
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip())
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_results(results: list):
+    columns = ('engine', 'threads', 'storage', 'notice_types', 'requests', 'wall', 'requests_per_second', 'p50',
+               'p99', 'records', 'peak_memory_mb')
+    print(' | '.join(columns))
+    for result in results:
+        print(' | '.join(str(result.get(column)) for column in columns))
+
+
+def main():
+    arguments = argparse.ArgumentParser(description='Замер полного сбора на локальной замене сайта интерпола.')
+    arguments.add_argument('--threads', type=int, nargs='+', default=[5],
+                           help='Варианты max_threads (max_in_flight для async).')
+    arguments.add_argument('--engine', choices=('sync', 'async'), default='sync')
+    arguments.add_argument('--storage', choices=('dir', 'sqlite', 'pack'), default='dir')
+    arguments.add_argument('--notices', type=int, default=None, help='Общее количество разыскиваемых.')
+    arguments.add_argument('--latency', type=float, default=0.01, help='Задержка ответа сервера в секундах.')
+    arguments.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503.')
+    arguments.add_argument('--max-rps', type=float, default=0.0, help='Ограничение сервера (429), запросов в секунду.')
+    arguments.add_argument('--notice-types', nargs='+', default=['red'],
+                           choices=list(FakeInterpolServer.NOTICE_TYPE_PATHS),
+                           help='Типы объявлений, собираемые одним запуском.')
+    arguments.add_argument('--output', default=None, help='Json файл для результатов.')
+    arguments.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    options = arguments.parse_args()
+
+    if options.child:
+        print(json.dumps(run_crawl(json.loads(options.child))))
+        return
+
+    results = []
+    for threads in options.threads:
+        # Сервер создается заново, чтобы счетчики и ограничение скорости не переходили между замерами.
+        with FakeInterpolServer(notice_number=options.notices, latency=options.latency,
+                                error_rate=options.error_rate, max_rps=options.max_rps,
+                                notice_types=options.notice_types) as server:
+            result = run_in_process({'url': server.url, 'engine': options.engine, 'threads': threads,
+                                     'storage': options.storage, 'notice_types': options.notice_types})
+            result['server_requests'] = server.request_count
+            results.append(result)
+    print_results(results)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,16 @@
 import datetime
 from datetime import datetime
+from CrawlLogging import setup_logging
 from InterpolParser import InterpolParser
 
 
 def main():
+    setup_logging()
     pI = InterpolParser(max_threads=5)
+    pI.metrics.start_reporter(pI.BASE_DIR_FOR_DATA, interval=10)
     ts = datetime.now()
     pI.get_all_rednotice_data()
+    pI.close()
     print(pI.URL_REQUEST_COUNTER, 'requests')
     te = datetime.now()
     print(te - ts, '*'*50)
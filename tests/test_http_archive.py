@@ -0,0 +1,96 @@
+"""
+Запись сбора в архив ответов (HttpArchive) и воспроизведение без сети на локальной замене сайта.
+
+Пример:
+    python -m unittest tests.test_http_archive
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+from HttpArchive import HttpArchive  # noqa: E402
+from InterpolParser import InterpolParser  # noqa: E402
+
+
+class HttpArchiveTest(unittest.TestCase):
+    # Больше 160 разыскиваемых по одной стране, чтобы запрос делился проверочными запросами.
+    NOTICE_NUMBER = 400
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive_dir = os.path.join(self.directory, 'archive')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @staticmethod
+    def get_parser_class(server: FakeInterpolServer):
+        class ArchiveTestParser(InterpolParser):
+            BASE_URL = server.countries_page_url
+            BASE_JSON_RESPONSE_URL = server.notices_url
+        return ArchiveTestParser
+
+    def crawl(self, parser_class, data_dir: str, archive: HttpArchive = None):
+        """
+        Полный сбор в каталог данных.
+        :return: Путь к каталогу данных.
+        """
+        base_dir = os.path.join(self.directory, data_dir)
+        parser = parser_class(4, base_dir=base_dir, archive=archive)
+        try:
+            parser.get_all_rednotice_data()
+        finally:
+            parser.close()
+            if archive is not None:
+                archive.close()
+        return base_dir
+
+    @staticmethod
+    def read_output(base_dir: str):
+        """
+        :return: Словарь {'Путь относительно каталога данных': содержимое} всех записей и изображений.
+        """
+        output = {}
+        for notice_dir in InterpolParser.iter_notice_dirs(base_dir):
+            for file in os.scandir(notice_dir):
+                with open(file.path, 'rb') as content:
+                    output[os.path.relpath(file.path, base_dir)] = content.read()
+        return output
+
+    def record(self, data_dir: str):
+        """
+        Записывает сбор в архив. Каталог записи уже содержит состояние прошлого сбора
+        (справочник стран, план разделения, выученные диапазоны), которое не должно скрыть запросы от архива.
+        :return: Содержимое каталога данных после записи.
+        """
+        with FakeInterpolServer(notice_number=self.NOTICE_NUMBER, image_size=512) as server:
+            parser_class = self.get_parser_class(server)
+            self.crawl(parser_class, data_dir)
+            base_dir = self.crawl(parser_class, data_dir, HttpArchive(self.archive_dir, HttpArchive.MODE_RECORD))
+        return parser_class, self.read_output(base_dir)
+
+    def test_replay_into_empty_directory(self):
+        parser_class, recorded = self.record('recorded')
+        self.assertEqual(sum(1 for path in recorded if path.endswith('.json')), self.NOTICE_NUMBER)
+        # Сервер остановлен: все ответы, включая страницу стран и проверочные запросы, берутся из архива.
+        base_dir = self.crawl(parser_class, 'replayed', HttpArchive(self.archive_dir, HttpArchive.MODE_REPLAY))
+        self.assertEqual(self.read_output(base_dir), recorded)
+
+    def test_replay_overwrites_existing_data(self):
+        parser_class, recorded = self.record('recorded')
+        base_dir = os.path.join(self.directory, 'recorded')
+        changed_paths = sorted(path for path in recorded if path.endswith('.json'))[:10]
+        for path in changed_paths:
+            with open(os.path.join(base_dir, path), 'w', encoding='utf-8') as file:
+                file.write('{}')
+        self.crawl(parser_class, 'recorded', HttpArchive(self.archive_dir, HttpArchive.MODE_REPLAY))
+        self.assertEqual(self.read_output(base_dir), recorded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Повторное использование плана разделения (PartitionPlan) в следующих запусках на локальной замене сайта.
+
+Пример:
+    python -m unittest tests.test_partition_plan
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+from InterpolParser import InterpolParser  # noqa: E402
+
+
+class PartitionPlanTest(unittest.TestCase):
+    # Больше 160 разыскиваемых по стране, чтобы запрос делился по полу и возрасту.
+    COUNTRIES = {'Russia': ('RU', 900)}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.base_dir = os.path.join(self.directory, 'data')
+        self.server = FakeInterpolServer(countries=self.COUNTRIES, image_size=64).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def crawl(self):
+        """
+        Полный сбор в каталог данных новым объектом сборщика (как отдельный запуск).
+        :return: Объект сборщика после сбора.
+        """
+        server = self.server
+
+        class PlanTestParser(InterpolParser):
+            BASE_URL = server.countries_page_url
+            BASE_JSON_RESPONSE_URL = server.notices_url
+
+        parser = PlanTestParser(4, base_dir=self.base_dir)
+        try:
+            parser.get_all_rednotice_data()
+        finally:
+            parser.close()
+        return parser
+
+    def get_collected_names(self):
+        """
+        :return: Множество названий каталогов собранных разыскиваемых.
+        """
+        return {os.path.basename(os.path.normpath(notice_dir))
+                for notice_dir in InterpolParser.iter_notice_dirs(self.base_dir)}
+
+    def remove_notice(self, notice: dict):
+        self.server.notices_by_type['red'].remove(notice)
+        del self.server.notices_by_id['red'][notice['entity_id'].replace('/', '-')]
+
+    def add_notice(self, entity_id: str, name: str, sex_id: str, age: int):
+        notice = {'entity_id': entity_id, 'name': name, 'forename': 'FORE RU', 'sex_id': sex_id,
+                  'nationalities': ['RU'], 'date_of_birth': f'{2023 - age}/01/01', 'age': age,
+                  'arrest_warrants': [], 'images': 0}
+        self.server.notices_by_type['red'].append(notice)
+        self.server.notices_by_id['red'][entity_id.replace('/', '-')] = notice
+
+    def test_notice_moved_into_empty_gender_is_collected(self):
+        # Без разыскиваемых пола U ссылка этого пола в первом запуске пуста.
+        for notice in self.server.notices_by_type['red']:
+            if notice['sex_id'] == 'U':
+                notice['sex_id'] = 'M'
+        parser = self.crawl()
+        empty_url = parser.get_probe_url(f'{self.server.notices_url}?=&nationality=RU&sexId=U')
+        country = parser.partition_plan.countries[f'{self.server.notices_url}?=&nationality=RU']
+        self.assertEqual(country['partitions'][empty_url]['total'], 0)
+        self.assertEqual(len(self.get_collected_names()), 900)
+
+        # Один разыскиваемый пропадает, другой появляется в пустой ссылке: количество по стране не меняется,
+        # и план используется без проверочных запросов.
+        self.remove_notice(next(notice for notice in self.server.notices_by_type['red'] if notice['sex_id'] == 'M'))
+        self.add_notice('2020/RUNEW', 'NEWNAME', 'U', 40)
+        parser = self.crawl()
+        self.assertEqual(sum(parser.partition_probe_counts.values()), 1)
+        self.assertIn('NEWNAME_FORE_RU_2020_RUNEW', self.get_collected_names())
+        self.assertEqual(parser.partition_plan.countries[f'{self.server.notices_url}?=&nationality=RU']
+                         ['partitions'][empty_url]['total'], 1)
+
+    def test_notice_moved_into_empty_age_range_is_collected(self):
+        # Без разыскиваемых пола M старше 58 лет первая половина диапазона возрастов (59..100) пуста.
+        for notice in self.server.notices_by_type['red']:
+            if notice['sex_id'] == 'M' and notice['age'] > 58:
+                notice['age'] = 30
+        parser = self.crawl()
+        empty_url = parser.get_probe_url(f'{self.server.notices_url}?=&nationality=RU&sexId=M&ageMin=59&ageMax=100')
+        country = parser.partition_plan.countries[f'{self.server.notices_url}?=&nationality=RU']
+        self.assertEqual(country['partitions'][empty_url]['total'], 0)
+
+        self.remove_notice(next(notice for notice in self.server.notices_by_type['red'] if notice['sex_id'] == 'M'))
+        self.add_notice('2020/RUNEW', 'NEWNAME', 'M', 70)
+        parser = self.crawl()
+        self.assertEqual(sum(parser.partition_probe_counts.values()), 1)
+        self.assertIn('NEWNAME_FORE_RU_2020_RUNEW', self.get_collected_names())
+
+    def test_overflowing_partition_is_resplit(self):
+        parser = self.crawl()
+        partitions = parser.partition_plan.countries[f'{self.server.notices_url}?=&nationality=RU']['partitions']
+        url, age_min, age_max = next((url, int(query['ageMin'][0]), int(query['ageMax'][0]))
+                                     for url, query in ((url, parse_qs(urlparse(url).query)) for url in partitions)
+                                     if query.get('sexId') == ['M'] and 'ageMin' in query
+                                     and query['ageMin'] != query['ageMax'])
+
+        # Разыскиваемые пола M переходят в диапазон одной ссылки, пока выдача по ней не превысит 160:
+        # количество по стране не меняется, и план используется, пока страница поиска не покажет переполнение.
+        total = partitions[url]['total']
+        moved = (notice for notice in self.server.notices_by_type['red']
+                 if notice['sex_id'] == 'M' and not age_min <= notice['age'] <= age_max)
+        for index, notice in zip(range(InterpolParser.MAX_SEARCH_RESULT_DISPLAY + 10 - total), moved):
+            notice['age'] = age_min if index % 2 else age_max
+        parser = self.crawl()
+        self.assertGreater(sum(parser.partition_probe_counts.values()), 1)
+        self.assertNotIn(url, parser.partition_plan.countries[f'{self.server.notices_url}?=&nationality=RU']
+                         ['partitions'])
+        self.assertEqual(parser.partition_plan.get_truncated(), {})
+        self.assertEqual(len(self.get_collected_names()), 900)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Разделение запросов по странам (InterpolParser.partition_url) на локальной замене сайта.
+
+Пример:
+    python -m unittest tests.test_partitioner
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+from InterpolParser import InterpolParser  # noqa: E402
+
+
+class PartitionerTest(unittest.TestCase):
+    # Россия - больше 160 разыскиваемых, Франция - меньше.
+    COUNTRIES = {'Russia': ('RU', 900), 'France': ('FR', 50)}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.base_dir = os.path.join(self.directory, 'data')
+        self.server = FakeInterpolServer(countries=self.COUNTRIES, image_size=64).start()
+        server = self.server
+
+        class PartitionerTestParser(InterpolParser):
+            BASE_URL = server.countries_page_url
+            BASE_JSON_RESPONSE_URL = server.notices_url
+
+        self.parser = PartitionerTestParser(4, base_dir=self.base_dir)
+
+    def tearDown(self):
+        self.parser.close()
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_country_url(self, code: str):
+        return f'{self.server.notices_url}?=&nationality={code}'
+
+    def test_country_over_limit_is_split(self):
+        pages = self.parser.separate_url_with_pages(self.get_country_url('RU'))
+        self.assertGreater(len(pages), 1)
+        totals = [page['total'] for page in pages.values()]
+        self.assertTrue(all(total <= InterpolParser.MAX_SEARCH_RESULT_DISPLAY for total in totals))
+        self.assertEqual(sum(totals), 900)
+        # Ссылки не пересекаются: каждый разыскиваемый попадает ровно в одну.
+        listing = {}
+        for page in pages.values():
+            listing.update(self.parser.get_rednotice_listing(page))
+        self.assertEqual(len(listing), 900)
+
+    def test_country_under_limit_is_not_split(self):
+        pages = self.parser.separate_url_with_pages(self.get_country_url('FR'))
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(next(iter(pages.values()))['total'], 50)
+
+    def test_all_notices_are_collected(self):
+        self.parser.get_all_rednotice_data()
+        collected_names = {os.path.basename(os.path.normpath(notice_dir))
+                           for notice_dir in InterpolParser.iter_notice_dirs(self.base_dir)}
+        expected_names = {f'{notice["name"]}_{notice["forename"]}_{notice["entity_id"]}'
+                          .replace(' ', '_').replace('/', '_') for notice in self.server.notices_by_type['red']}
+        self.assertEqual(collected_names, expected_names)
+
+
+if __name__ == '__main__':
+    unittest.main()
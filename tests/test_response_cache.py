@@ -0,0 +1,60 @@
+"""
+Кеш ответов (ResponseCache) в Parser.fetch_response на локальной замене сайта.
+
+Пример:
+    python -m unittest tests.test_response_cache
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+from InterpolParser import InterpolParser  # noqa: E402
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = FakeInterpolServer(countries={'France': ('FR', 5)}).start()
+        server = self.server
+
+        class CacheTestParser(InterpolParser):
+            BASE_URL = server.countries_page_url
+            BASE_JSON_RESPONSE_URL = server.notices_url
+
+        # Без повторов: запрос после пропажи тела из кеша не должен расходовать попытку.
+        self.parser = CacheTestParser(1, max_retries=0, base_dir=self.directory, cache=True)
+        self.url = f'{server.notices_url}/2020-FR0'
+
+    def tearDown(self):
+        self.parser.close()
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_revalidated_response_is_served_from_cache(self):
+        data = self.parser.get_json_page(self.url, stage='detail')
+        self.parser.cache.wait()
+        self.assertEqual(self.parser.get_json_page(self.url, stage='detail'), data)
+        self.assertEqual(self.server.not_modified_count, 1)
+
+    def test_evicted_body_is_fetched_again(self):
+        data = self.parser.get_json_page(self.url, stage='detail')
+        self.assertEqual(data['entity_id'], '2020/FR0')
+        self.parser.cache.wait()
+        os.remove(self.parser.cache.get_body_path(self.url))
+        # Сервер отвечает 304 на условный запрос, а тела для него уже нет.
+        requests_before = self.server.request_count
+        self.assertEqual(self.parser.get_json_page(self.url, stage='detail'), data)
+        self.assertEqual(self.server.not_modified_count, 1)
+        self.assertEqual(self.server.request_count - requests_before, 2)
+        self.parser.cache.wait()
+        self.assertTrue(os.path.exists(self.parser.cache.get_body_path(self.url)))
+
+
+if __name__ == '__main__':
+    unittest.main()
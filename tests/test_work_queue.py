@@ -0,0 +1,152 @@
+"""
+Очередь задач сбора (WorkQueue) и продолжение прерванного сбора (resume) на локальной замене сайта.
+
+Пример:
+    python -m unittest tests.test_work_queue
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.FakeInterpolServer import FakeInterpolServer  # noqa: E402
+from InterpolParser import InterpolParser  # noqa: E402
+from WorkQueue import WorkQueue  # noqa: E402
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'work_queue.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_claim_and_resume_after_crash(self):
+        queue = WorkQueue(self.file_path, max_attempts=2)
+        queue.add(WorkQueue.KIND_NOTICE, ['a', 'b', 'c'])
+        claimed = [url for url, _ in queue.claim(WorkQueue.KIND_NOTICE, 2)]
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(len(queue.claim(WorkQueue.KIND_NOTICE)), 1)
+        queue.done(WorkQueue.KIND_NOTICE, claimed[0])
+        queue.close()
+
+        # Процесс упал: задачи остались in_flight, новая очередь на том же файле возвращает их.
+        queue = WorkQueue(self.file_path, max_attempts=2)
+        self.assertEqual(queue.resume(), 2)
+        self.assertEqual(queue.get_stats(WorkQueue.KIND_NOTICE), {WorkQueue.DONE: 1, WorkQueue.PENDING: 2})
+        self.assertNotIn(claimed[0], [url for url, _ in queue.claim(WorkQueue.KIND_NOTICE)])
+        queue.close()
+
+    def test_failed_task_is_retried_until_max_attempts(self):
+        queue = WorkQueue(self.file_path, max_attempts=2)
+        queue.add(WorkQueue.KIND_NOTICE, ['a'])
+        for attempt in range(2):
+            self.assertEqual(queue.claim(WorkQueue.KIND_NOTICE), [('a', None)])
+            queue.failed(WorkQueue.KIND_NOTICE, 'a', 'error')
+            self.assertEqual(queue.resume(), 1 if attempt == 0 else 0)
+        self.assertEqual(queue.get_stats(WorkQueue.KIND_NOTICE), {WorkQueue.FAILED: 1})
+        queue.close()
+
+
+class ResumeTest(unittest.TestCase):
+    COUNTRIES = {'Russia': ('RU', 300), 'France': ('FR', 50)}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.base_dir = os.path.join(self.directory, 'data')
+        self.server = FakeInterpolServer(countries=self.COUNTRIES, image_size=64).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_parser_class(self, stop_after: int = None, failed_ids: set = frozenset()):
+        """
+        :param stop_after: Прервать сбор (истечением общего срока) после стольких собранных разыскиваемых.
+        :param failed_ids: entity_id разыскиваемых, сбор которых завершается ошибкой.
+        :return: Класс сборщика для локальной замены сайта.
+        """
+        server = self.server
+
+        class ResumeTestParser(InterpolParser):
+            BASE_URL = server.countries_page_url
+            BASE_JSON_RESPONSE_URL = server.notices_url
+            collected_number = 0
+            collected_lock = threading.Lock()
+
+            def collect_rednotice(self, rednotice_url: str, payload=None):
+                if rednotice_url.rsplit('/', 1)[-1].replace('-', '/') in failed_ids:
+                    raise ValueError('Ошибка сбора.')
+                red_notice_data = super().collect_rednotice(rednotice_url, payload)
+                with self.collected_lock:
+                    ResumeTestParser.collected_number += 1
+                    if stop_after is not None and ResumeTestParser.collected_number >= stop_after:
+                        # Общий срок сбора истекает: оставшиеся задачи ждут resume(), как после падения процесса.
+                        self.request_policy.run_timeout = 0
+                        self.request_policy.start()
+                return red_notice_data
+
+        return ResumeTestParser
+
+    def get_collected_names(self):
+        """
+        :return: Множество названий каталогов собранных разыскиваемых.
+        """
+        return {os.path.basename(os.path.normpath(notice_dir))
+                for notice_dir in InterpolParser.iter_notice_dirs(self.base_dir)}
+
+    def get_expected_names(self):
+        """
+        :return: Множество названий каталогов всех разыскиваемых сайта.
+        """
+        return {f'{notice["name"]}_{notice["forename"]}_{notice["entity_id"]}'.replace(' ', '_').replace('/', '_')
+                for notice in self.server.notices_by_type['red']}
+
+    def test_interrupted_crawl_is_resumed(self):
+        parser = self.get_parser_class(stop_after=100)(4, base_dir=self.base_dir)
+        try:
+            parser.get_all_rednotice_data()
+        finally:
+            parser.close()
+        self.assertLess(len(self.get_collected_names()), 350)
+
+        parser = self.get_parser_class()(4, base_dir=self.base_dir)
+        try:
+            requests_before = self.server.request_count
+            parser.resume()
+            stats = parser.work_queue.get_stats(WorkQueue.KIND_NOTICE)
+        finally:
+            parser.close()
+        self.assertEqual(stats, {WorkQueue.DONE: 350})
+        self.assertEqual(self.get_collected_names(), self.get_expected_names())
+        # Выполненные до остановки разыскиваемые повторно не запрашиваются.
+        self.assertLess(self.server.request_count - requests_before, 350 * 3)
+
+    def test_failed_notices_are_retried_on_resume(self):
+        failed_ids = {'2020/RU1', '2020/FR2'}
+        parser = self.get_parser_class(failed_ids=failed_ids)(4, base_dir=self.base_dir)
+        try:
+            parser.get_all_rednotice_data()
+            stats = parser.work_queue.get_stats(WorkQueue.KIND_NOTICE)
+        finally:
+            parser.close()
+        self.assertEqual(stats, {WorkQueue.DONE: 348, WorkQueue.FAILED: 2})
+
+        parser = self.get_parser_class()(4, base_dir=self.base_dir)
+        try:
+            parser.resume()
+            stats = parser.work_queue.get_stats(WorkQueue.KIND_NOTICE)
+        finally:
+            parser.close()
+        self.assertEqual(stats, {WorkQueue.DONE: 350})
+        self.assertEqual(self.get_collected_names(), self.get_expected_names())
+
+
+if __name__ == '__main__':
+    unittest.main()